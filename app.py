@@ -2,18 +2,28 @@ from flask import Flask, render_template, request, redirect, url_for, jsonify, s
 from flask_login import LoginManager, login_user, login_required, logout_user, current_user
 from dotenv import load_dotenv
 import os
-from models import User, Admin, IngredientAnalysis as Analysis
+from models import User, Admin, AdminStats, IngredientAnalysis as Analysis, SUMMARY_FIELDS, CHOICE_FIELDS
 from services.ocr_service import OCRService
 from services.ingredient_service import IngredientService
+from services.job_queue import JobQueue, MongoJobStore, InMemoryJobStore, QueueFullError, DONE, FAILED
+from services.fair_scheduler import (FairScheduler, InMemoryQuotaStore, MongoQuotaStore, QuotaExceededError,
+                                     PRIORITY_INTERACTIVE, PRIORITY_BULK, PRIORITY_BACKGROUND)
+from services.config import Config
+from services.circuit_breaker import CLOSED
+from services.ingredient_parser import parse_ingredients, flatten_ingredients
+from services.ingredient_lexicon import get_default_matcher
+from services.spell_correction import get_default_corrector
+from services.ingredient_registry import get_default_registry
+from services.index_manager import IndexManager
 from pymongo import MongoClient
 from bson import ObjectId
 import base64
 from datetime import datetime
 import logging
+import threading
 from functools import wraps
 import pytesseract
 import traceback
-import re
 
 # Load environment variables
 load_dotenv()
@@ -27,25 +37,68 @@ client = MongoClient(MONGO_URI)
 db = client.ingredient_analyzer
 
 # Initialize models with database connection
-user_model = User(db)
+# Counters behind the admin views, kept up to date by the models and logins
+site_stats = AdminStats(db)
+if site_stats.ensure_totals():
+    print("Counted users and analyses for the admin stats")
+user_model = User(db, site_stats)
 admin_model = Admin(db)
-analysis_model = Analysis(db)
+# Ingredient ids shared by the analysis service and stored analyses
+ingredient_registry = get_default_registry()
+ingredient_registry.bind(db)
+analysis_model = Analysis(db, ingredient_registry, site_stats)
+
+# Create missing indexes, then check in the background that the main queries use them
+index_manager = IndexManager(db)
+created = [f"{entry['collection']}.{entry['name']}" for entry in index_manager.ensure() if entry['status'] == 'created']
+if created:
+    print(f"Created indexes: {', '.join(created)}")
+threading.Thread(target=index_manager.check_coverage, name="index-coverage", daemon=True).start()
+
+# Initialize services; a service that fails is disabled instead of stopping the app
+ocr_service = None
+ingredient_service = None
 
-# Initialize services
 try:
     print("Initializing OCR service...")
     ocr_service = OCRService()
     print("OCR service initialized successfully")
-    
+except Exception as e:
+    print(f"Error initializing OCR service: {str(e)}")
+    print("Image analysis is disabled until Tesseract is installed")
+
+try:
     print("\nInitializing Ingredient service...")
     ingredient_service = IngredientService()
     print("Ingredient service initialized successfully")
-    print("Services initialization complete")
+    
+    # Load the models in the background so startup does not wait on Ollama
+    if Config.OLLAMA_WARM_UP:
+        threading.Thread(target=ingredient_service.warm_up, name="model-warm-up", daemon=True).start()
+    
+    # Index recent stored analyses so near-duplicate products can reuse them
+    def load_similarity_index():
+        try:
+            recent = analysis_model.collection.find(
+                {"$or": [{"ingredient_ids.0": {"$exists": True}}, {"ingredients.0": {"$exists": True}}]},
+                {"ingredient_ids": 1, "category_codes": 1, "ingredients": 1, "fingerprint": 1}
+            ).sort("created_at", -1).limit(Config.SIMILARITY_INDEX_SIZE)
+            # Oldest first, so the most recent analyses are the last to be evicted
+            indexed = ingredient_service.load_similarity_index(
+                analysis_model.hydrate(analysis) for analysis in reversed(list(recent))
+            )
+            print(f"Indexed {indexed} stored analyses for reuse")
+        except Exception as e:
+            print(f"Error loading similarity index: {str(e)}")
+    
+    if Config.SIMILARITY_ENABLED:
+        threading.Thread(target=load_similarity_index, name="similarity-index", daemon=True).start()
     
 except Exception as e:
-    print(f"Error initializing services: {str(e)}")
-    print("Please make sure Ollama is running and the deepseek-llm model is installed")
-    raise
+    print(f"Error initializing Ingredient service: {str(e)}")
+    print("Ingredient analysis is disabled; please check the Ollama configuration")
+
+print("Services initialization complete")
 
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
@@ -102,6 +155,7 @@ def login():
                 if user:
                     session['user_id'] = str(user['_id'])
                     session['is_admin'] = False
+                    site_stats.record_login(user['_id'])
                     print(f"User login successful: {username}")
                     return jsonify({'success': True, 'is_admin': False})
             except Exception as e:
@@ -113,6 +167,7 @@ def login():
                 if admin:
                     session['user_id'] = str(admin['_id'])
                     session['is_admin'] = True
+                    site_stats.record_login(admin['_id'], is_admin=True)
                     print(f"Admin login successful: {username}")
                     return jsonify({'success': True, 'is_admin': True})
             except Exception as e:
@@ -136,29 +191,20 @@ def dashboard():
     try:
         # Get user analyses
         if is_admin:
-            # For admin, get all analyses
-            analyses = []
-            users = list(user_model.collection.find())
-            for user in users:
-                user_analyses = analysis_model.get_user_analyses(str(user['_id']))
-                for analysis in user_analyses:
-                    if analysis:
-                        serialized = serialize_analysis(analysis)
-                        if serialized:
-                            serialized['username'] = user.get('username', 'Unknown')
-                            analyses.append(serialized)
+            # For admin, the most recent analyses of all users, joined with usernames in one query
+            page = analysis_model.get_admin_overview(limit=Config.ADMIN_PAGE_SIZE,
+                                                     page_token=request.args.get('cursor'),
+                                                     fields=SUMMARY_FIELDS)
         else:
-            # For regular users, get only their analyses
-            user_analyses = analysis_model.get_user_analyses(user_id)
-            analyses = []
-            for analysis in user_analyses:
-                if analysis:
-                    serialized = serialize_analysis(analysis)
-                    if serialized:
-                        analyses.append(serialized)
+            # For regular users, only the list fields of their own analyses
+            page = analysis_model.get_user_analysis_summaries(user_id, page_token=request.args.get('cursor'))
+        summaries = page['analyses']
         
-        # Sort analyses by creation date
-        analyses.sort(key=lambda x: x.get('created_at', ''), reverse=True)
+        analyses = []
+        for summary in summaries:
+            serialized = serialize_analysis(summary)
+            if serialized:
+                analyses.append(serialized)
         
         # Store in session for use in compare view
         session['analysis_history'] = analyses
@@ -204,105 +250,22 @@ def analyze():
         if not product_name:
             product_name = 'Unnamed Product'
 
-        # Extract text based on content type
-        if content_type == 'text':
-            print("Processing text input...")
-            extracted_text = content.strip()
-        elif content_type == 'image':
-            print("Processing image input...")
-            try:
-                # Remove header of base64 image
-                if 'base64,' in content:
-                    print("Found base64 header, removing it...")
-                    content = content.split('base64,')[1]
-                
-                print("Calling OCR service...")
-                extracted_text = ocr_service.extract_text_from_base64(content)
-                print(f"OCR Result: {extracted_text[:100]}...")
-                
-            except Exception as e:
-                print(f"Image processing error: {str(e)}")
-                import traceback
-                traceback.print_exc()
-                return jsonify({
-                    'success': False, 
-                    'error': f'Image processing failed: {str(e)}',
-                    'traceback': traceback.format_exc()
-                })
-        else:
+        if content_type not in ('text', 'image'):
             print(f"Invalid content type: {content_type}")
             return jsonify({'success': False, 'error': 'Invalid content type'})
 
-        if not extracted_text or len(extracted_text.strip()) < 3:
-            print("No text extracted")
-            return jsonify({'success': False, 'error': 'No text could be extracted from the input'})
-
-        # Analyze ingredients
-        try:
-            print("Analyzing ingredients...")
-            print(f"Input text: {extracted_text[:100]}...")
-            
-            # Process ingredients
-            ingredients = process_ingredients(extracted_text)
-            if not ingredients:
-                print("No ingredients found")
-                return jsonify({'success': False, 'error': 'No ingredients could be identified'})
-            
-            print(f"Found ingredients: {ingredients[:5]}...")
-            
-            # Analyze with OpenAI
-            analysis_result = analyze_with_ai(ingredients)
-            if not analysis_result:
-                error_msg = "Failed to analyze ingredients"
-                if "quota exceeded" in str(e).lower() or "insufficient_quota" in str(e).lower():
-                    error_msg = (
-                        "The AI service is currently unavailable due to API quota limits. "
-                        "Please try again later or contact support for assistance."
-                    )
-                print("AI analysis failed:", error_msg)
-                return jsonify({'success': False, 'error': error_msg})
-            
-            print("Analysis successful")
-            print(f"Health score: {analysis_result.get('health_score')}")
-            print(f"Categories: {list(analysis_result.get('ingredient_percentages', {}).keys())}")
-            
-            # Add product name to the result
-            analysis_result['product_name'] = product_name
-            
-            # Save to database
-            try:
-                print("Saving to database...")
-                user_id = session.get('user_id')
-                analysis_id = analysis_model.save_analysis(user_id, extracted_text, analysis_result)
-                
-                if not analysis_id:
-                    print("Failed to save to database")
-                    return jsonify({'success': False, 'error': 'Failed to save analysis'})
-                    
-                print("Successfully saved to database")
-                
-            except Exception as e:
-                print(f"Database error: {str(e)}")
-                return jsonify({'success': False, 'error': 'Failed to save analysis'})
+        user_id = session.get('user_id')
 
-            return jsonify({
-                'success': True,
-                'product_name': product_name,
-                'health_score': analysis_result['health_score'],
-                'ingredients': analysis_result['ingredients'],
-                'ingredient_percentages': analysis_result['ingredient_percentages']
-            })
+        # Scripts submitting many products mark them bulk so they yield to interactive use
+        return queue_analysis(user_id, {
+            'type': content_type,
+            'content': content,
+            'product_name': product_name
+        }, priority=PRIORITY_BULK if data.get('bulk') else PRIORITY_INTERACTIVE,
+            wait=data.get('mode', ANALYSIS_MODE) != 'async')
 
-        except Exception as e:
-            print(f"Analysis error: {str(e)}")
-            import traceback
-            traceback.print_exc()
-            return jsonify({
-                'success': False, 
-                'error': 'Failed to analyze ingredients',
-                'details': str(e),
-                'traceback': traceback.format_exc()
-            })
+    except (QuotaExceededError, QueueFullError) as e:
+        return throttled_response(e)
 
     except Exception as e:
         print(f"General error: {str(e)}")
@@ -315,6 +278,227 @@ def analyze():
             'traceback': traceback.format_exc()
         })
 
+def queue_analysis(user_id, payload, priority, wait):
+    """Queue an analysis job and build the response.
+
+    Every analysis goes through the job queue so the scheduler's quotas,
+    priorities and fair sharing apply to it. With ``wait`` the request is
+    held until the job finishes; otherwise, or if it takes longer than
+    OLLAMA_TIMEOUT, the client polls /analyze/jobs/<job_id> for the result.
+    """
+    job_id = job_queue.enqueue(user_id, payload, priority=priority)
+    print(f"Queued analysis job {job_id}")
+
+    status = 'queued'
+    if wait:
+        job = job_queue.wait(job_id, timeout=Config.OLLAMA_TIMEOUT)
+        status = job['status']
+        if status == DONE:
+            return jsonify(job['result'])
+        if status == FAILED:
+            return jsonify({
+                'success': False,
+                'error': 'Failed to analyze ingredients',
+                'details': job.get('error')
+            })
+
+    return jsonify({
+        'success': True,
+        'job_id': job_id,
+        'status': status,
+        'status_url': url_for('analysis_job', job_id=job_id)
+    }), 202
+
+def throttled_response(error):
+    """429 for a user over quota, 503 when the analysis queue is full; both say when to retry."""
+    if isinstance(error, QuotaExceededError):
+        print(f"Analysis quota exceeded for user {session.get('user_id')}")
+        message, status = 'You are submitting analyses too quickly. Please try again shortly.', 429
+    else:
+        # Shed load instead of letting requests wait behind a backlog
+        print(f"Analysis queue full, retry after {error.retry_after}s")
+        message, status = 'The analysis service is busy. Please try again shortly.', 503
+    response = jsonify({'success': False, 'error': message, 'retry_after': error.retry_after})
+    return response, status, {'Retry-After': str(error.retry_after)}
+
+@app.route('/analyze/jobs/<job_id>')
+@login_required
+def analysis_job(job_id):
+    job = job_queue.get(job_id)
+    if not job or job.get('user_id') != session.get('user_id'):
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+
+    # Optional long-poll: hold the request until the job finishes or `wait` seconds pass
+    wait = min(request.args.get('wait', 0, type=float), 30)
+    if wait > 0:
+        job = job_queue.wait(job_id, timeout=wait)
+
+    return jsonify({
+        'success': True,
+        'job_id': job_id,
+        'status': job['status'],
+        'result': job.get('result'),
+        'error': job.get('error')
+    })
+
+def extract_ingredients_text(content_type, content):
+    """Return (extracted_text, error_response) for a text or base64 image input."""
+    if content_type == 'text':
+        print("Processing text input...")
+        extracted_text = content.strip()
+    else:
+        print("Processing image input...")
+        if ocr_service is None:
+            return None, {'success': False, 'error': 'Image analysis is currently unavailable'}
+        try:
+            # Remove header of base64 image
+            if 'base64,' in content:
+                print("Found base64 header, removing it...")
+                content = content.split('base64,')[1]
+            
+            print("Calling OCR service...")
+            extracted_text, confidences = ocr_service.extract_text_and_confidences_from_base64(content)
+            print(f"OCR Result: {extracted_text[:100]}...")
+            
+            if Config.OCR_SPELL_CORRECTION:
+                # Fix misreads like "sodlum" before they reach the caches and the model
+                extracted_text = get_default_corrector().correct(extracted_text, confidences)
+                print(f"Corrected OCR Result: {extracted_text[:100]}...")
+            
+        except Exception as e:
+            print(f"Image processing error: {str(e)}")
+            import traceback
+            traceback.print_exc()
+            return None, {
+                'success': False, 
+                'error': f'Image processing failed: {str(e)}',
+                'traceback': traceback.format_exc()
+            }
+
+    if not extracted_text or len(extracted_text.strip()) < 3:
+        print("No text extracted")
+        return None, {'success': False, 'error': 'No text could be extracted from the input'}
+
+    return extracted_text, None
+
+def save_analysis_result(user_id, extracted_text, analysis_result, product_name):
+    """Save a finished analysis and build the response returned to the client."""
+    if not analysis_result:
+        print("AI analysis failed")
+        return {'success': False, 'error': 'Failed to analyze ingredients'}
+
+    print("Analysis successful")
+    print(f"Health score: {analysis_result.get('health_score')}")
+    print(f"Categories: {list(analysis_result.get('ingredient_percentages', {}).keys())}")
+    
+    # Add product name to the result
+    analysis_result['product_name'] = product_name
+    
+    # Save to database
+    try:
+        print("Saving to database...")
+        analysis_id = analysis_model.save_analysis(user_id, extracted_text, analysis_result)
+        
+        if not analysis_id:
+            print("Failed to save to database")
+            return {'success': False, 'error': 'Failed to save analysis'}
+            
+        print("Successfully saved to database")
+        
+    except Exception as e:
+        print(f"Database error: {str(e)}")
+        return {'success': False, 'error': 'Failed to save analysis'}
+
+    return {
+        'success': True,
+        'product_name': product_name,
+        'health_score': analysis_result['health_score'],
+        'ingredients': analysis_result['ingredients'],
+        'ingredient_percentages': analysis_result['ingredient_percentages'],
+        # Rule-based result served while the model is down; re-analyzed once it recovers
+        'provisional': analysis_result.get('provisional', False)
+    }
+
+def process_analysis_jobs(jobs):
+    """Job queue handler: extract text per job, then analyze the batch with shared model calls."""
+    responses = [None] * len(jobs)
+    pending = []
+
+    for i, job in enumerate(jobs):
+        payload = job['payload']
+        if payload['type'] == 'reanalyze':
+            analysis = analysis_model.get_analysis_by_id(payload['analysis_id'])
+            if not analysis or not (analysis.get('provisional') or ingredient_service.is_stale(analysis)):
+                responses[i] = {'success': True, 'analysis_id': payload['analysis_id'], 'skipped': True}
+                continue
+            extracted_text = analysis['ingredients_text']
+        else:
+            extracted_text, error = extract_ingredients_text(payload['type'], payload['content'])
+            if error:
+                responses[i] = error
+                continue
+        ingredients = process_ingredients(extracted_text, from_ocr=payload['type'] == 'image')
+        if not ingredients:
+            responses[i] = {'success': False, 'error': 'No ingredients could be identified'}
+            continue
+        pending.append((i, job, extracted_text, ', '.join(ingredients)))
+
+    if pending:
+        if ingredient_service is None:
+            raise RuntimeError("Ingredient service is not available")
+        results = ingredient_service.analyze_batch([text for _, _, _, text in pending])
+        for (i, job, extracted_text, _), result in zip(pending, results):
+            if job['payload']['type'] == 'reanalyze':
+                responses[i] = update_reanalyzed_analysis(job['payload']['analysis_id'], result)
+            else:
+                responses[i] = save_analysis_result(job['user_id'], extracted_text, result, job['payload']['product_name'])
+
+    return responses
+
+def update_reanalyzed_analysis(analysis_id, analysis_result):
+    """Replace a stored provisional or stale result with the model's analysis."""
+    if not analysis_result:
+        return {'success': False, 'error': 'Failed to analyze ingredients'}
+    if analysis_result.get('provisional'):
+        # The model went down again; a later recovery queues this analysis again
+        return {'success': False, 'error': 'Model is still unavailable'}
+
+    analysis_model.update_analysis_result(analysis_id, analysis_result)
+    print(f"Replaced analysis {analysis_id} with a fresh model analysis")
+    return {'success': True, 'analysis_id': analysis_id, 'health_score': analysis_result['health_score']}
+
+def refresh_stored_analysis(analysis):
+    """Lazily bring an analysis read from the database up to the current model, prompt and scorer versions."""
+    if ingredient_service is None or analysis.get('provisional'):
+        return
+    try:
+        rescored, stale = ingredient_service.refresh_analysis(analysis)
+        if rescored:
+            analysis_model.update_analysis_result(analysis['_id'], analysis)
+        # Re-analysis runs as background work, and only while the model is healthy;
+        # the key keeps one pending job per analysis however often it is read
+        if stale and ingredient_service.breaker.state == CLOSED:
+            job_queue.enqueue(str(analysis['user_id']), {
+                'type': 'reanalyze',
+                'analysis_id': str(analysis['_id'])
+            }, priority=PRIORITY_BACKGROUND, key=f"reanalyze:{analysis['_id']}")
+    except Exception as e:
+        print(f"Error refreshing analysis {analysis.get('_id')}: {str(e)}")
+
+def requeue_provisional_analyses():
+    """Queue re-analysis of every provisional result, run when the model circuit closes."""
+    try:
+        provisional = analysis_model.get_provisional_analyses(limit=0)
+        for analysis in provisional:
+            # Below user-submitted work so recovery does not delay new analyses
+            job_queue.enqueue(str(analysis['user_id']), {
+                'type': 'reanalyze',
+                'analysis_id': str(analysis['_id'])
+            }, priority=PRIORITY_BACKGROUND, key=f"reanalyze:{analysis['_id']}")
+        print(f"Queued {len(provisional)} provisional analyses for re-analysis")
+    except Exception as e:
+        print(f"Error queueing provisional analyses: {str(e)}")
+
 @app.route('/analyze_with_ai', methods=['POST'])
 @login_required
 def analyze_with_ai():
@@ -327,28 +511,15 @@ def analyze_with_ai():
         if not ingredients_text:
             return jsonify({'error': 'Empty ingredients text'}), 400
             
-        # Here we'll add OpenAI integration later
-        # For now, just use our basic analyzer
-        analyzer = IngredientService()
-        result = analyzer.analyze_ingredients(ingredients_text)
-        
-        if not result.get('success', False):
-            return jsonify({'error': f'Analysis failed: {result.get("error", "Unknown error")}'})
-            
-        # Save to database
-        user_id = session.get('user_id')
-        analysis_id = analysis_model.save_analysis(
-            user_id=user_id,
-            ingredients_text=ingredients_text,
-            analysis_result=result
-        )
-        
-        if not analysis_id:
-            return jsonify({'error': 'Failed to save analysis'}), 500
-            
-        result['analysis_id'] = str(analysis_id)
-        return jsonify(result)
-            
+        # Queued like /analyze so quotas and load shedding apply; the job saves the analysis
+        return queue_analysis(session.get('user_id'), {
+            'type': 'text',
+            'content': ingredients_text,
+            'product_name': data.get('product_name') or 'Unnamed Product'
+        }, priority=PRIORITY_INTERACTIVE, wait=True)
+
+    except (QuotaExceededError, QueueFullError) as e:
+        return throttled_response(e)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -357,61 +528,29 @@ def analyze_with_ai():
 def history():
     try:
         user_id = session.get('user_id')
-        page = request.args.get('page', 1, type=int)
         per_page = 10
-        skip = (page - 1) * per_page
         
-        # Get analyses from database
-        analyses = analysis_model.get_user_analyses(user_id, skip=skip, limit=per_page)
+        # Only the fields the list shows, with a short preview of the ingredients
+        try:
+            page = analysis_model.get_user_analysis_summaries(user_id, limit=per_page,
+                                                              page_token=request.args.get('cursor'),
+                                                              preview_length=200)
+        except ValueError:
+            # Tampered or truncated page link; start over from the newest analyses
+            return redirect(url_for('history'))
         
         # Process analyses for display
         processed_analyses = []
-        for analysis in analyses:
+        for analysis in page['analyses']:
             # Format created_at date
-            if 'created_at' in analysis:
-                created_at = analysis['created_at']
-                if isinstance(created_at, str):
-                    try:
-                        created_at = datetime.strptime(created_at, '%Y-%m-%d %H:%M:%S')
-                    except:
-                        try:
-                            created_at = datetime.strptime(created_at, '%Y-%m-%dT%H:%M:%S')
-                        except:
-                            created_at = datetime.now()
-                analysis['created_at'] = created_at.strftime('%B %d, %Y %I:%M %p')
-            
-            # Ensure we have ingredient percentages
-            if 'ingredient_percentages' not in analysis:
-                analysis['ingredient_percentages'] = {
-                    'Natural': 0,
-                    'Additives': 0,
-                    'Preservatives': 0,
-                    'Artificial Colors': 0,
-                    'Highly Processed': 0
-                }
-            
-            if 'health_score' not in analysis:
-                analysis['health_score'] = 0
-                
-            if 'product_name' not in analysis:
-                analysis['product_name'] = 'Unnamed Product'
-                
-            if 'ingredients_text' not in analysis:
-                analysis['ingredients_text'] = 'No ingredients listed'
-                
+            if analysis.get('created_at'):
+                analysis['created_at'] = analysis['created_at'].strftime('%B %d, %Y %I:%M %p')
             processed_analyses.append(analysis)
         
-        # Sort by created_at date
-        processed_analyses.sort(key=lambda x: x.get('created_at', ''), reverse=True)
-        
-        # Check if there are more pages
-        total_analyses = len(processed_analyses)
-        has_next = total_analyses == per_page
-        
         return render_template('history_new.html', 
                              analyses=processed_analyses,
-                             page=page,
-                             has_next=has_next)
+                             next_token=page['next_token'],
+                             prev_token=page['prev_token'])
                              
     except Exception as e:
         logger.error(f"Error loading history: {str(e)}")
@@ -423,45 +562,13 @@ def history():
 def compare_page():
     try:
         user_id = session.get('user_id')
-        analyses = analysis_model.get_user_analyses(user_id, skip=0, limit=100)
+        # The picker only needs names and dates; full documents are loaded by compare_analyses
+        analyses = analysis_model.get_user_analysis_summaries(user_id, limit=100, fields=CHOICE_FIELDS)
         
         # Process analyses for display
         processed_analyses = []
-        for analysis in analyses:
-            # Format created_at date
-            if 'created_at' in analysis:
-                created_at = analysis['created_at']
-                if isinstance(created_at, str):
-                    try:
-                        created_at = datetime.strptime(created_at, '%Y-%m-%d %H:%M:%S')
-                    except:
-                        try:
-                            created_at = datetime.strptime(created_at, '%Y-%m-%dT%H:%M:%S')
-                        except:
-                            created_at = datetime.now()
-                analysis['date'] = created_at.strftime('%Y-%m-%d %H:%M')
-            else:
-                analysis['date'] = datetime.now().strftime('%Y-%m-%d %H:%M')
-            
-            # Ensure we have ingredient percentages
-            if 'ingredient_percentages' not in analysis:
-                analysis['ingredient_percentages'] = {
-                    'Natural': 0,
-                    'Additives': 0,
-                    'Preservatives': 0,
-                    'Artificial Colors': 0,
-                    'Highly Processed': 0
-                }
-                
-            if 'health_score' not in analysis:
-                analysis['health_score'] = 0
-                
-            if 'product_name' not in analysis:
-                analysis['product_name'] = 'Unnamed Product'
-                
-            if 'ingredients_text' not in analysis:
-                analysis['ingredients_text'] = 'No ingredients listed'
-                
+        for analysis in analyses['analyses']:
+            analysis['date'] = (analysis['created_at'] or datetime.now()).strftime('%Y-%m-%d %H:%M')
             processed_analyses.append(analysis)
         
         return render_template('compare.html', analyses=processed_analyses)
@@ -487,7 +594,7 @@ def compare_analyses():
         analyses = []
         for analysis_id in analysis_ids:
             try:
-                analysis = analysis_model.collection.find_one({'_id': ObjectId(analysis_id)})
+                analysis = analysis_model.get_analysis_by_id(analysis_id)
                 if analysis:
                     # Convert ObjectId to string for JSON serialization
                     analysis['_id'] = str(analysis['_id'])
@@ -547,27 +654,30 @@ def admin():
         return redirect(url_for('dashboard'))
     
     try:
-        # Get all users
-        users = list(user_model.collection.find())
-        
-        # Get analyses for each user
-        for user in users:
-            # Get raw analyses
-            analyses = list(analysis_model.collection.find({"user_id": str(user['_id'])}).sort("created_at", -1))
-            
-            # Serialize each analysis
-            serialized_analyses = []
-            for analysis in analyses:
-                serialized = serialize_analysis(analysis)
-                if serialized:
-                    serialized_analyses.append(serialized)
-            
-            # Add to user object
-            user['analyses'] = serialized_analyses
-            user['analysis_count'] = len(serialized_analyses)
-            user['_id'] = str(user['_id'])  # Convert ObjectId to string
-        
-        return render_template('admin.html', users=users)
+        # Recent analyses, usernames and per-user counts come from a single aggregation
+        try:
+            overview = analysis_model.get_admin_overview(limit=Config.ADMIN_PAGE_SIZE,
+                                                         page_token=request.args.get('cursor'))
+        except ValueError:
+            return redirect(url_for('admin'))
+        
+        users = []
+        users_by_id = {}
+        for user in overview['users']:
+            user['_id'] = str(user.pop('user_id'))  # Convert ObjectId to string
+            user['analyses'] = []
+            users.append(user)
+            users_by_id[user['_id']] = user
+        
+        # Attach this page's analyses to their users
+        for analysis in overview['analyses']:
+            serialized = serialize_analysis(analysis)
+            if serialized and serialized['user_id'] in users_by_id:
+                users_by_id[serialized['user_id']]['analyses'].append(serialized)
+        
+        return render_template('admin.html', users=users,
+                               next_token=overview['next_token'],
+                               prev_token=overview['prev_token'])
         
     except Exception as e:
         print(f"Admin page error: {str(e)}")
@@ -593,15 +703,9 @@ def admin_stats():
     if not session.get('is_admin', False):
         return jsonify({'error': 'Unauthorized'}), 401
     
-    # Get stats from database
+    # Counters are maintained as users sign up, log in and analyze, so this reads two documents
     try:
-        # Placeholder data - replace with actual database queries
-        stats = {
-            'totalUsers': 10,
-            'totalAnalyses': 50,
-            'activeToday': 5
-        }
-        return jsonify(stats)
+        return jsonify(site_stats.totals())
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -611,17 +715,16 @@ def admin_activity():
     if not session.get('is_admin', False):
         return jsonify({'error': 'Unauthorized'}), 401
     
-    # Get activity log from database
+    # Latest entries of the capped activity log
     try:
-        # Placeholder data - replace with actual database queries
-        activities = [
-            {
-                'timestamp': '2024-12-25T10:30:00',
-                'username': 'user1',
-                'action': 'Analysis',
-                'details': 'Analyzed product ingredients'
-            }
-        ]
+        activities = []
+        for entry in site_stats.recent_activity(limit=request.args.get('limit', 50, type=int)):
+            activities.append({
+                'timestamp': entry['timestamp'].isoformat(),
+                'username': entry['username'],
+                'action': entry['action'],
+                'details': entry['details']
+            })
         return jsonify({'activities': activities})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -632,18 +735,18 @@ def admin_users():
     if not session.get('is_admin', False):
         return jsonify({'error': 'Unauthorized'}), 401
     
-    # Get user list from database
+    # Most recently active users first
     try:
-        # Placeholder data - replace with actual database queries
-        users = [
-            {
-                '_id': '1',
-                'username': 'user1',
-                'email': 'user1@example.com',
-                'lastActive': '2024-12-25T10:30:00',
-                'active': True
-            }
-        ]
+        users = []
+        for user in site_stats.recent_users(limit=request.args.get('limit', 50, type=int)):
+            last_active = user.get('last_active')
+            users.append({
+                '_id': str(user['_id']),
+                'username': user.get('username'),
+                'email': user.get('email'),
+                'lastActive': last_active.isoformat() if last_active else None,
+                'active': user.get('is_active', True)
+            })
         return jsonify({'users': users})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -661,6 +764,22 @@ def delete_user(user_id):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/admin/metrics')
+@login_required
+def admin_metrics():
+    if not session.get('is_admin', False):
+        return jsonify({'error': 'Unauthorized'}), 401
+
+    try:
+        metrics = ingredient_service.get_metrics()
+        metrics['scheduler'] = job_queue.scheduler.stats()
+        metrics['lexicon'] = get_default_matcher().stats
+        metrics['indexes'] = index_manager.report()
+        metrics['spell_correction'] = {**get_default_corrector().stats, 'cache': get_default_corrector().cache_info()}
+        return jsonify(metrics)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/test_ocr', methods=['POST'])
 def test_ocr():
     try:
@@ -709,55 +828,15 @@ def test_ocr():
         traceback.print_exc()
         return jsonify({'success': False, 'error': str(e), 'traceback': traceback.format_exc()})
 
-def process_ingredients(text):
-    """Process and clean ingredients text."""
-    if not text:
-        return []
-        
-    # Remove common prefixes
-    text = re.sub(r'^ingredients:?\s*', '', text.lower(), flags=re.IGNORECASE)
-    
-    # Split ingredients by common delimiters
-    ingredients = re.split(r'[,;.]', text)
-    
-    # Clean and filter ingredients
-    cleaned_ingredients = []
-    for ingredient in ingredients:
-        # Clean the ingredient
-        ingredient = ingredient.strip()
-        ingredient = re.sub(r'\([^)]*\)', '', ingredient)  # Remove parentheses and their contents
-        ingredient = re.sub(r'\s+', ' ', ingredient)  # Normalize whitespace
-        
-        # Skip if too short or empty
-        if len(ingredient) < 2:
-            continue
-            
-        # Skip if it's just numbers or symbols
-        if re.match(r'^[\d\W]+$', ingredient):
-            continue
-            
-        cleaned_ingredients.append(ingredient)
-    
-    return cleaned_ingredients
+def process_ingredients(text, from_ocr=False):
+    """Process and clean ingredients text into a flat list, sub-ingredients after their parent.
 
-def analyze_with_ai(ingredients):
-    """Analyze ingredients using the ingredient service."""
-    try:
-        # Join ingredients into a text string
-        ingredients_text = ', '.join(ingredients)
-        
-        # Use the ingredient service to analyze
-        result = ingredient_service.analyze_ingredients(ingredients_text)
-        
-        if not result:
-            print("No result from ingredient service")
-            return None
-            
-        return result
-        
-    except Exception as e:
-        print(f"Error in analyze_with_ai: {str(e)}")
-        return None
+    OCR text is cleaned up against the ingredient lexicon so OCR debris and
+    lost separators do not reach the model.
+    """
+    if from_ocr and Config.OCR_LEXICON_EXTRACTION:
+        return get_default_matcher().extract(text)
+    return flatten_ingredients(parse_ingredients(text))
 
 def serialize_mongo_doc(doc):
     """Convert MongoDB document to JSON-serializable format"""
@@ -779,10 +858,11 @@ def serialize_analysis(analysis):
     try:
         # Convert ObjectId to string
         analysis['_id'] = str(analysis['_id'])
-        analysis['user_id'] = str(analysis['user_id'])
+        if 'user_id' in analysis:
+            analysis['user_id'] = str(analysis['user_id'])
         
         # Convert datetime to string
-        if 'created_at' in analysis:
+        if analysis.get('created_at'):
             analysis['created_at'] = analysis['created_at'].strftime('%Y-%m-%d %H:%M:%S')
             
         # Ensure we have product name
@@ -803,20 +883,32 @@ def serialize_analysis(analysis):
         print(f"Error serializing analysis: {str(e)}")
         return None
 
-def calculate_health_score(percentages):
-    """Calculate health score based on ingredient percentages"""
-    weights = {
-        'Natural': 1.0,
-        'Additives': -0.3,
-        'Preservatives': -0.3,
-        'Artificial Colors': -0.2,
-        'Highly Processed': -0.4
-    }
-    
-    score = sum(percentages[cat] * weights[cat] for cat in percentages)
-    # Normalize to 0-100 range
-    normalized_score = min(max(50 + score/2, 0), 100)
-    return round(normalized_score, 1)
+# Background analysis workers; jobs live in MongoDB unless JOB_STORE=memory
+ANALYSIS_MODE = os.getenv('ANALYSIS_MODE', 'async')
+job_store = InMemoryJobStore() if os.getenv('JOB_STORE') == 'memory' else MongoJobStore(db.analysis_jobs)
+# Quotas are shared by every app process through the same database as the jobs
+quota_store = InMemoryQuotaStore() if os.getenv('JOB_STORE') == 'memory' else MongoQuotaStore(db.analysis_quotas)
+job_queue = JobQueue(
+    job_store,
+    process_analysis_jobs,
+    # Enough workers to keep every endpoint in the Ollama pool busy
+    workers=int(os.getenv('ANALYSIS_WORKERS', max(2, len(Config.OLLAMA_URLS) * Config.OLLAMA_MAX_CONCURRENCY))),
+    batch_size=ingredient_service.batch_size if ingredient_service else 5,
+    scheduler=FairScheduler(
+        rate_per_minute=Config.USER_RATE_PER_MINUTE,
+        burst=Config.USER_BURST,
+        user_weights=Config.USER_WEIGHTS,
+        quota_store=quota_store
+    ),
+    interactive_workers=Config.INTERACTIVE_WORKERS,
+    lease_seconds=Config.JOB_LEASE_SECONDS,
+    max_attempts=Config.JOB_MAX_ATTEMPTS,
+    max_queued=Config.MAX_QUEUED_JOBS
+)
+job_queue.start()
+if ingredient_service is not None:
+    ingredient_service.breaker.on_recover(requeue_provisional_analyses)
+    analysis_model.on_read = refresh_stored_analysis
 
 if __name__ == '__main__':
     # Check MongoDB connection and list users
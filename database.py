@@ -2,6 +2,7 @@ from datetime import datetime
 import bcrypt
 from pymongo import MongoClient
 from pymongo.errors import DuplicateKeyError
+from services.index_manager import IndexManager
 
 class Database:
     def __init__(self, db_name="ingredient_analyzer"):
@@ -12,11 +13,8 @@ class Database:
             self.users = self.db.users
             self.admins = self.db.admins
             
-            # Create unique indexes
-            self.users.create_index("username", unique=True)
-            self.users.create_index("email", unique=True)
-            self.admins.create_index("username", unique=True)
-            self.admins.create_index("email", unique=True)
+            # Create every index the application declares, including the unique ones here
+            IndexManager(self.db).ensure()
             
             print("Successfully connected to MongoDB")
         except Exception as e:
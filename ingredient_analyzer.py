@@ -1,12 +1,14 @@
 import os
 import json
-import requests
 from dotenv import load_dotenv
 import numpy as np
 import cv2
 from PIL import Image
 import pytesseract
 import re
+from services.schema import CATEGORIES
+from services.ingredient_parser import parse_ingredients, flatten_ingredients
+from services.ingredient_service import IngredientService
 
 # Load environment variables
 load_dotenv()
@@ -21,21 +23,8 @@ else:
 class IngredientAnalyzer:
     def __init__(self):
         self.categories = ["Natural", "Additives", "Preservatives", "Artificial Colors", "Highly Processed"]
-        self.ollama_url = "http://localhost:11434/api/generate"
-        
-        # Set up the system instruction
-        self.system_instruction = """Return a JSON object analyzing the ingredients. Format:
-{
-  "ingredients": [{"name": "string", "category": "string", "processing_score": 1-5, "health_impact_score": 1-5, "nutrient_density_score": 1-5}],
-  "classification_summary": {"Natural": [], "Additives": [], "Preservatives": [], "Artificial Colors": [], "Highly Processed": []},
-  "ingredient_percentages": {"category": 0-100},
-  "health_score": 0-10
-}
-
-Categories: Natural (whole foods), Additives (flavor/texture), Preservatives, Artificial Colors, Highly Processed
-Scores: Processing (1=least), Health (1=best), Nutrient (1=least), Overall (0-10, higher=better)
-
-Return ONLY valid JSON."""
+        # Same routed models, caches and scoring as the app; shares its endpoint pool
+        self.ingredient_service = IngredientService()
     
     def preprocess_image_for_ocr(self, image):
         """Apply preprocessing steps to improve OCR accuracy"""
@@ -172,10 +161,10 @@ Return ONLY valid JSON."""
             }
 
     def analyze_ingredients(self, ingredients_text):
-        """Analyze ingredients using Ollama"""
+        """Analyze ingredients with the app's ingredient service"""
         try:
-            # Clean up ingredients text
-            ingredients_text = ingredients_text.strip()
+            # Parse the label so the model sees one clean name per ingredient
+            ingredients_text = ", ".join(flatten_ingredients(parse_ingredients(ingredients_text)))
             if not ingredients_text:
                 return {
                     'success': False,
@@ -183,100 +172,35 @@ Return ONLY valid JSON."""
                     'error': "No ingredients provided"
                 }
             
-            # Create the Ollama API request
-            payload = {
-                "model": "llama3.2:3b",
-                "prompt": f"{self.system_instruction}\n\nIngredients to analyze:\n{ingredients_text}\n\nResponse (JSON only):",
-                "stream": False
-            }
-            
-            response = requests.post(self.ollama_url, json=payload)
-            
-            if response.status_code != 200:
-                return {
-                    'success': False,
-                    'result': None,
-                    'error': f"Ollama API error: {response.status_code}"
-                }
-            
-            result = response.json()
-            if 'response' not in result:
-                return {
-                    'success': False,
-                    'result': None,
-                    'error': "Invalid response from Ollama"
-                }
-            
-            # Try to extract JSON from the response
-            json_str = result['response']
-            json_str = json_str.strip()
-            
-            # Remove any text before the first { and after the last }
-            start_idx = json_str.find('{')
-            end_idx = json_str.rfind('}')
-            
-            if start_idx == -1 or end_idx == -1:
+            try:
+                # Routed through the model tiers like app analyses; waits for a model slot
+                analysis = self.ingredient_service.analyze_ingredients(ingredients_text, fail_fast=False)
+            except ValueError as e:
                 return {
                     'success': False,
                     'result': None,
-                    'error': "No JSON object found in response"
+                    'error': str(e)
                 }
             
-            json_str = json_str[start_idx:end_idx + 1]
-            
-            # Remove any markdown code block markers
-            json_str = json_str.replace('```json', '').replace('```', '')
-            
-            # Remove any line comments
-            json_str = '\n'.join(line for line in json_str.split('\n') if not line.strip().startswith('//'))
+            analysis["classification_summary"] = {
+                category: [item["name"] for item in analysis["ingredients"] if item["category"] == category]
+                for category in CATEGORIES
+            }
             
-            # Remove any trailing commas before closing braces
-            json_str = re.sub(r',(\s*[}\]])', r'\1', json_str)
+            # Add summary statistics
+            analysis["summary"] = {
+                "total_ingredients": len(analysis["ingredients"]),
+                "natural_ingredients": len(analysis["classification_summary"].get("Natural", [])),
+                "artificial_ingredients": len(analysis["classification_summary"].get("Artificial Colors", [])) + 
+                                      len(analysis["classification_summary"].get("Preservatives", [])),
+                "additives": len(analysis["classification_summary"].get("Additives", [])),
+            }
             
-            try:
-                analysis = json.loads(json_str)
-                
-                # Validate required fields
-                required_fields = ["ingredients", "classification_summary", "ingredient_percentages", "health_score"]
-                missing_fields = [field for field in required_fields if field not in analysis]
-                
-                if missing_fields:
-                    return {
-                        'success': False,
-                        'result': None,
-                        'error': f"Missing required fields: {', '.join(missing_fields)}"
-                    }
-                
-                # Format percentages to 2 decimal places
-                for category, percentage in analysis["ingredient_percentages"].items():
-                    analysis["ingredient_percentages"][category] = round(percentage, 2)
-                
-                # Ensure health score is between 0-10
-                if "health_score" in analysis:
-                    analysis["health_score"] = min(10, max(0, analysis["health_score"] / 10))
-                    analysis["health_score"] = round(analysis["health_score"], 1)
-                
-                # Add summary statistics
-                analysis["summary"] = {
-                    "total_ingredients": len(analysis["ingredients"]),
-                    "natural_ingredients": len(analysis["classification_summary"].get("Natural", [])),
-                    "artificial_ingredients": len(analysis["classification_summary"].get("Artificial Colors", [])) + 
-                                          len(analysis["classification_summary"].get("Preservatives", [])),
-                    "additives": len(analysis["classification_summary"].get("Additives", [])),
-                }
-                
-                return {
-                    'success': True,
-                    'result': analysis,
-                    'error': None
-                }
-                
-            except json.JSONDecodeError as e:
-                return {
-                    'success': False,
-                    'result': None,
-                    'error': f"Failed to parse JSON: {str(e)}"
-                }
+            return {
+                'success': True,
+                'result': analysis,
+                'error': None
+            }
                 
         except Exception as e:
             return {
@@ -285,29 +209,6 @@ Return ONLY valid JSON."""
                 'error': str(e)
             }
 
-    def calculate_health_score(self, ingredients_data):
-        weights = {
-            "processing": 0.5,
-            "health_impact": 0.3,
-            "nutrient_density": 0.2
-        }
-        
-        total_scores = {"processing": 0, "health_impact": 0, "nutrient_density": 0}
-        total_percentage = 0
-
-        for ingredient in ingredients_data["ingredients"]:
-            total_scores["processing"] += ingredient["processing_score"] * ingredient["percentage"] / 100
-            total_scores["health_impact"] += ingredient["health_impact_score"] * ingredient["percentage"] / 100
-            total_scores["nutrient_density"] += ingredient["nutrient_density_score"] * ingredient["percentage"] / 100
-            total_percentage += ingredient["percentage"]
-
-        final_score = (
-            total_scores["processing"] * weights["processing"] +
-            total_scores["health_impact"] * weights["health_impact"] +
-            total_scores["nutrient_density"] * weights["nutrient_density"]
-        )
-        return round(final_score, 2)
-
 def main():
     analyzer = IngredientAnalyzer()
     
@@ -0,0 +1 @@
+"""Load testing against a local Ollama stand-in; see scripts/load_test.py."""
@@ -0,0 +1,198 @@
+import os
+import re
+import sys
+import json
+import time
+import random
+import asyncio
+import threading
+from collections import deque
+from aiohttp import web
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from services.ingredient_rules import classify_ingredient
+from services.prompt_builder import CODE_FOR_CATEGORY
+
+_INGREDIENT_LINE_RE = re.compile(r'^(\d+) (.+)$')
+_PRODUCT_LINE_RE = re.compile(r'^Product (\d+):$')
+
+class LatencyModel:
+    """Generation latency distribution, in seconds.
+
+    ``kind`` is "fixed" (always ``median``), "uniform" (between ``low`` and
+    ``high``) or "lognormal" (around ``median`` with spread ``sigma``, which
+    gives the long tail real model servers show). ``per_item`` seconds are
+    added for every classified ingredient, like output token time.
+    """
+
+    def __init__(self, kind="lognormal", median=0.5, sigma=0.4, low=0.1, high=1.0, per_item=0.0):
+        self.kind = kind
+        self.median = median
+        self.sigma = sigma
+        self.low = low
+        self.high = high
+        self.per_item = per_item
+
+    @classmethod
+    def parse(cls, spec):
+        """Build from a string such as "lognormal:0.5:0.4", "uniform:0.1:1" or "fixed:0.2"."""
+        kind, *params = spec.split(":")
+        params = [float(p) for p in params]
+        if kind == "fixed":
+            return cls("fixed", median=params[0] if params else 0.5)
+        if kind == "uniform":
+            return cls("uniform", low=params[0], high=params[1])
+        return cls("lognormal", *params[:2])
+
+    def sample(self, items=0):
+        if self.kind == "fixed":
+            base = self.median
+        elif self.kind == "uniform":
+            base = random.uniform(self.low, self.high)
+        else:
+            base = random.lognormvariate(0, self.sigma) * self.median
+        return base + self.per_item * items
+
+class FakeOllama:
+    """Local stand-in for the Ollama HTTP API used by load tests.
+
+    Answers /api/generate with compact classifications built from the
+    numbered ingredients in the prompt (categories come from the local
+    rules, unknown names count as natural), honours ``stream``, runs at most
+    ``max_concurrency`` generations at once like a single GPU, and can be
+    told to return malformed output or HTTP errors at given rates.
+    ``models`` is what /api/tags reports as installed.
+    """
+
+    def __init__(self, latency=None, malformed_rate=0.0, error_rate=0.0, max_concurrency=2, seed=None,
+                 models=("llama3.2:3b", "deepseek-llm:latest")):
+        self.latency = latency or LatencyModel()
+        self.malformed_rate = malformed_rate
+        self.error_rate = error_rate
+        self.max_concurrency = max_concurrency
+        self.random = random.Random(seed)
+        self.models = list(models)
+        self.stats = {"generate": 0, "warm_up": 0, "malformed": 0, "errors": 0}
+        # The latest request bodies, oldest first, for tests to inspect
+        self.requests = deque(maxlen=100)
+        self.url = None
+        self._loop = None
+        self._runner = None
+
+    def _classify(self, prompt):
+        """Return one item list per product section of the prompt."""
+        products = {}
+        current = 1
+        for line in prompt.splitlines():
+            product = _PRODUCT_LINE_RE.match(line)
+            if product:
+                current = int(product.group(1))
+                continue
+            match = _INGREDIENT_LINE_RE.match(line)
+            if match:
+                category = classify_ingredient(match.group(2)) or "Natural"
+                products.setdefault(current, []).append({"i": int(match.group(1)), "c": CODE_FOR_CATEGORY[category]})
+        return products
+
+    def _answer(self, prompt):
+        products = self._classify(prompt)
+        if "Product " in prompt:
+            body = {"products": [{"id": product_id, "items": items} for product_id, items in products.items()]}
+        else:
+            body = {"items": products.get(1, [])}
+        text = json.dumps(body)
+
+        if self.random.random() < self.malformed_rate:
+            self.stats["malformed"] += 1
+            # The failure shapes seen from real models: cut off, wrapped in prose, or not JSON at all
+            text = self.random.choice([
+                text[:max(1, len(text) // 2)],
+                f"Sure! Here is the analysis:\n```json\n{text}\n```",
+                "I cannot classify these ingredients."
+            ])
+        return text, sum(len(items) for items in products.values())
+
+    async def _generate(self, request):
+        payload = await request.json()
+        self.requests.append(payload)
+        if not payload.get("prompt"):
+            # A request without a prompt only loads the model
+            self.stats["warm_up"] += 1
+            return web.json_response({"model": payload.get("model"), "response": "", "done": True})
+
+        async with self._semaphore:
+            self.stats["generate"] += 1
+            if self.random.random() < self.error_rate:
+                self.stats["errors"] += 1
+                return web.Response(status=500, text="model runner has unexpectedly stopped")
+
+            text, items = self._answer(payload["prompt"])
+            started = time.monotonic()
+            await asyncio.sleep(self.latency.sample(items))
+            final = {
+                "model": payload.get("model"),
+                "done": True,
+                "prompt_eval_count": len(payload["prompt"]) // 4,
+                "eval_count": len(text) // 4,
+                "total_duration": int((time.monotonic() - started) * 1e9)
+            }
+
+            if not payload.get("stream", True):
+                return web.json_response({**final, "response": text})
+
+            response = web.StreamResponse(headers={"Content-Type": "application/x-ndjson"})
+            await response.prepare(request)
+            for start in range(0, len(text), 16):
+                chunk = {"model": payload.get("model"), "response": text[start:start + 16], "done": False}
+                await response.write((json.dumps(chunk) + "\n").encode())
+            await response.write((json.dumps({**final, "response": ""}) + "\n").encode())
+            await response.write_eof()
+            return response
+
+    async def _tags(self, request):
+        return web.json_response({"models": [{"name": name} for name in self.models]})
+
+    async def _start(self, host, port):
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        app = web.Application()
+        app.router.add_post("/api/generate", self._generate)
+        app.router.add_get("/api/tags", self._tags)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://{host}:{port}"
+
+    def start(self, host="127.0.0.1", port=0):
+        """Serve on a background thread; ``port=0`` picks a free port. Returns the base URL."""
+        self._loop = asyncio.new_event_loop()
+        threading.Thread(target=self._loop.run_forever, name="fake-ollama", daemon=True).start()
+        asyncio.run_coroutine_threadsafe(self._start(host, port), self._loop).result()
+        return self.url
+
+    def stop(self):
+        asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+
+def main():
+    """Run the fake server in the foreground, e.g. to point a development app at it"""
+    import argparse
+    parser = argparse.ArgumentParser(description="Local stand-in for the Ollama API")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--latency", default="lognormal:0.5:0.4")
+    parser.add_argument("--malformed-rate", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--max-concurrency", type=int, default=2)
+    args = parser.parse_args()
+
+    server = FakeOllama(LatencyModel.parse(args.latency), args.malformed_rate, args.error_rate, args.max_concurrency)
+    print(f"Fake Ollama listening on {server.start(port=args.port)}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
+
+if __name__ == "__main__":
+    main()
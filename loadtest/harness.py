@@ -0,0 +1,220 @@
+import os
+import sys
+import time
+import random
+import asyncio
+import threading
+import logging
+import contextlib
+import numpy as np
+import aiohttp
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from services.ingredient_rules import CATEGORY_KEYWORDS
+
+# Share of requests sent to each endpoint
+DEFAULT_MIX = {
+    "/analyze": 0.4,
+    "/history": 0.2,
+    "/dashboard": 0.2,
+    "/compare": 0.2
+}
+
+LOADTEST_PASSWORD = "loadtest"
+
+def random_ingredients(rng, vocabulary, low=4, high=14):
+    """A random ingredient list; drawing from a shared vocabulary produces realistic near-duplicates."""
+    return ", ".join(rng.sample(vocabulary, rng.randint(low, high)))
+
+def start_app(ollama_url, mongo_uri=None, users=5, quiet=True):
+    """Import the Flask app against ``ollama_url`` and serve it on a background thread.
+
+    ``ollama_url`` may be a list of URLs to run the app against a pool.
+
+    Without ``mongo_uri`` MongoDB is replaced by mongomock, so nothing but
+    this process is needed. Returns ``(base_url, app_module)``.
+    """
+    # Config is read when the services package is first imported, so set it directly
+    from services.config import Config
+    urls = [ollama_url] if isinstance(ollama_url, str) else list(ollama_url)
+    Config.OLLAMA_URL = urls[0]
+    Config.OLLAMA_URLS = urls
+    # Load tests measure throughput, not the per-user quota
+    if "USER_RATE_PER_MINUTE" not in os.environ:
+        Config.USER_RATE_PER_MINUTE = Config.USER_BURST = 100000
+    if mongo_uri:
+        os.environ["MONGO_URI"] = mongo_uri
+    else:
+        import mongomock
+        import pymongo
+        pymongo.MongoClient = mongomock.MongoClient
+
+    output = open(os.devnull, "w") if quiet else sys.stdout
+    with contextlib.redirect_stdout(output):
+        import app as app_module
+    from werkzeug.serving import make_server
+    if quiet:
+        # app.py configures DEBUG logging for every module, werkzeug logs every request
+        logging.getLogger().setLevel(logging.WARNING)
+        logging.getLogger("werkzeug").setLevel(logging.WARNING)
+
+    for i in range(users):
+        try:
+            app_module.user_model.create_user(f"loadtest{i}", f"loadtest{i}@example.com", LOADTEST_PASSWORD)
+        except ValueError:
+            pass  # Left over from an earlier run against the same database
+
+    server = make_server("127.0.0.1", 0, app_module.app, threaded=True)
+    threading.Thread(target=server.serve_forever, name="loadtest-app", daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}", app_module
+
+class EndpointStats:
+    def __init__(self):
+        self.latencies = []
+        self.errors = 0
+        self.statuses = {}
+
+    def record(self, seconds, status, ok):
+        self.latencies.append(seconds)
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+        if not ok:
+            self.errors += 1
+
+    def summary(self, duration):
+        count = len(self.latencies)
+        p50, p95, p99 = np.percentile(self.latencies, [50, 95, 99]) if count else (0, 0, 0)
+        return {
+            "requests": count,
+            "rps": round(count / duration, 2) if duration else 0,
+            "errors": self.errors,
+            "error_rate": round(self.errors / count, 4) if count else 0,
+            "p50_ms": round(p50 * 1000, 1),
+            "p95_ms": round(p95 * 1000, 1),
+            "p99_ms": round(p99 * 1000, 1),
+            "statuses": {str(status): n for status, n in sorted(self.statuses.items())}
+        }
+
+class LoadTest:
+    """Drive the app's endpoints at a fixed request rate and collect latencies.
+
+    Requests are started on a fixed schedule (an open-loop load), so a slow
+    server builds up concurrent requests instead of quietly lowering the
+    offered rate. With ``wait_for_jobs`` each queued /analyze job is polled
+    until it finishes and its submit-to-result time is reported as
+    "/analyze (job)".
+    """
+
+    def __init__(self, base_url, users=5, rps=10, duration=30, mix=None, analyze_mode="async",
+                 wait_for_jobs=True, seed=1):
+        self.base_url = base_url.rstrip("/")
+        self.users = users
+        self.rps = rps
+        self.duration = duration
+        self.mix = mix or DEFAULT_MIX
+        self.analyze_mode = analyze_mode
+        self.wait_for_jobs = wait_for_jobs
+        self.rng = random.Random(seed)
+        self.vocabulary = sorted({keyword for _, keywords in CATEGORY_KEYWORDS for keyword in keywords})
+        self.stats = {}
+
+    def _stats(self, name):
+        return self.stats.setdefault(name, EndpointStats())
+
+    async def _login(self, session, i):
+        async with session.post(f"{self.base_url}/login",
+                                json={"username": f"loadtest{i}", "password": LOADTEST_PASSWORD}) as response:
+            body = await response.json(content_type=None)
+            if not body.get("success"):
+                raise RuntimeError(f"Could not log in as loadtest{i}: {body}")
+
+    async def _request(self, session, endpoint):
+        started = time.monotonic()
+        status = "error"
+        ok = False
+        body = None
+        try:
+            if endpoint == "/analyze":
+                payload = {
+                    "type": "text",
+                    "content": random_ingredients(self.rng, self.vocabulary),
+                    "product_name": "Load test product",
+                    "mode": self.analyze_mode
+                }
+                request = session.post(f"{self.base_url}/analyze", json=payload)
+            else:
+                request = session.get(f"{self.base_url}{endpoint}", allow_redirects=False)
+            async with request as response:
+                status = response.status
+                if endpoint == "/analyze":
+                    body = await response.json(content_type=None)
+                    ok = status in (200, 202) and body.get("success", False)
+                else:
+                    await response.read()
+                    ok = status == 200
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            pass
+        self._stats(endpoint).record(time.monotonic() - started, status, ok)
+
+        if ok and endpoint == "/analyze" and self.wait_for_jobs and body.get("job_id"):
+            await self._wait_for_job(session, body["status_url"], started)
+
+    async def _wait_for_job(self, session, status_url, started):
+        status, ok = "error", False
+        try:
+            while True:
+                async with session.get(f"{self.base_url}{status_url}?wait=10") as response:
+                    status = response.status
+                    job = await response.json(content_type=None)
+                if job.get("status") in ("done", "failed") or status != 200:
+                    ok = job.get("status") == "done" and (job.get("result") or {}).get("success", False)
+                    break
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            pass
+        self._stats("/analyze (job)").record(time.monotonic() - started, status, ok)
+
+    async def run_async(self):
+        timeout = aiohttp.ClientTimeout(total=120)
+        sessions = [aiohttp.ClientSession(timeout=timeout, cookie_jar=aiohttp.CookieJar(unsafe=True))
+                    for _ in range(self.users)]
+        try:
+            for i, session in enumerate(sessions):
+                await self._login(session, i)
+
+            endpoints = list(self.mix)
+            weights = [self.mix[endpoint] for endpoint in endpoints]
+            total = int(self.rps * self.duration)
+            started = time.monotonic()
+            tasks = []
+            for i in range(total):
+                # Keep to the schedule regardless of how fast earlier requests complete
+                delay = started + i / self.rps - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                endpoint = self.rng.choices(endpoints, weights)[0]
+                tasks.append(asyncio.ensure_future(self._request(sessions[i % self.users], endpoint)))
+            await asyncio.gather(*tasks)
+            elapsed = time.monotonic() - started
+        finally:
+            for session in sessions:
+                await session.close()
+
+        return {
+            "target_rps": self.rps,
+            "duration": round(elapsed, 2),
+            "endpoints": {name: stats.summary(elapsed) for name, stats in sorted(self.stats.items())}
+        }
+
+    def run(self):
+        return asyncio.run(self.run_async())
+
+def format_report(report):
+    lines = [
+        f"Target {report['target_rps']} req/s over {report['duration']}s",
+        f"{'endpoint':<18}{'requests':>9}{'rps':>8}{'errors':>8}{'err %':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+    ]
+    for name, summary in report["endpoints"].items():
+        lines.append(
+            f"{name:<18}{summary['requests']:>9}{summary['rps']:>8}{summary['errors']:>8}"
+            f"{summary['error_rate'] * 100:>8.1f}{summary['p50_ms']:>10}{summary['p95_ms']:>10}{summary['p99_ms']:>10}"
+        )
+    return "\n".join(lines)
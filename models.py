@@ -1,10 +1,229 @@
+import base64
 import datetime
+import logging
 import bcrypt
 from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import ReturnDocument
+from pymongo.errors import CollectionInvalid, PyMongoError
+from services.ingredient_registry import IngredientRegistry
+from services.prompt_builder import CATEGORY_CODES, CODE_FOR_CATEGORY
+
+# Fields the analysis list views show; full documents are only loaded for detail and compare calls
+SUMMARY_FIELDS = {"product_name": 1, "health_score": 1, "ingredient_percentages": 1, "created_at": 1}
+# Just enough to pick an analysis, e.g. in the compare view
+CHOICE_FIELDS = {"product_name": 1, "created_at": 1}
+# Also read for summaries that show scores, so on_read can rescore stale rows before they are listed
+REFRESH_FIELDS = {"user_id": 1, "provisional": 1, "fingerprint": 1, "ingredient_ids": 1, "category_codes": 1, "ingredients": 1}
+# Summary fields computed by the scorer
+SCORE_FIELDS = ("health_score", "ingredient_percentages")
+
+EMPTY_PERCENTAGES = {
+    "Natural": 0,
+    "Additives": 0,
+    "Preservatives": 0,
+    "Artificial Colors": 0,
+    "Highly Processed": 0
+}
+
+# Stored in category_codes for an ingredient left unclassified, so positions line up with ingredient_ids
+UNCLASSIFIED_CODE = "-"
+
+# Analysis lists are ordered newest first on (created_at, _id) and paged by keyset
+NEWEST_FIRST = [("created_at", -1), ("_id", -1)]
+_EPOCH = datetime.datetime(1970, 1, 1)
+
+def encode_page_token(direction, analysis):
+    """
+    Opaque token for the page of analyses after (">") or before ("<") ``analysis``, newest first
+
+    Returns None for analyses without a creation date, which sort last and end the list.
+    """
+    if not analysis.get("created_at"):
+        return None
+    # MongoDB stores dates in milliseconds, so the key round-trips exactly
+    millis = (analysis["created_at"].replace(tzinfo=None) - _EPOCH) // datetime.timedelta(milliseconds=1)
+    raw = f"{direction}{millis}:{analysis['_id']}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_page_token(token):
+    """Return ``(direction, created_at, _id)`` of a page token; raises ValueError for anything else."""
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)).decode()
+        millis, analysis_id = raw[1:].split(":")
+        if raw[0] not in "<>":
+            raise ValueError(raw[0])
+        return raw[0], _EPOCH + datetime.timedelta(milliseconds=int(millis)), ObjectId(analysis_id)
+    except (ValueError, InvalidId):
+        raise ValueError("Invalid page token")
+
+def keyset_query(query, page_token):
+    """
+    Filter and sort for the page a token points at; returns ``(filter, sort, backwards)``
+
+    A page after the token continues below its (created_at, _id) key. A page before it
+    is read upwards from the key (``backwards``) and has to be reversed for display.
+    """
+    if not page_token:
+        return query, NEWEST_FIRST, False
+    direction, created_at, analysis_id = decode_page_token(page_token)
+    below = direction == ">"
+    keyset = {
+        **query,
+        # The range bound lets the server seek straight to the key in the index
+        "created_at": {"$lte" if below else "$gte": created_at},
+        "$or": [
+            {"created_at": {"$lt" if below else "$gt": created_at}},
+            {"_id": {"$lt" if below else "$gt": analysis_id}}
+        ]
+    }
+    order = -1 if below else 1
+    return keyset, [("created_at", order), ("_id", order)], not below
+
+def keyset_page(rows, limit, backwards, page_token):
+    """
+    Turn a ``limit + 1`` fetch into a page: the rows in display order and tokens for its neighbours
+
+    The extra row only tells whether there is more in the direction read.
+    """
+    more = len(rows) > limit
+    rows = rows[:limit]
+    if backwards:
+        rows.reverse()
+        has_next, has_prev = True, more
+    else:
+        has_next, has_prev = more, bool(page_token)
+    next_token = encode_page_token(">", rows[-1]) if has_next and rows else None
+    prev_token = encode_page_token("<", rows[0]) if has_prev and rows else None
+    return {
+        "analyses": rows,
+        "next_token": next_token,
+        "prev_token": prev_token,
+        "has_next": next_token is not None,
+        "has_prev": prev_token is not None
+    }
+
+logger = logging.getLogger(__name__)
+
+# Entries kept in the capped activity log behind the admin activity feed
+ACTIVITY_LOG_SIZE = 1000
+
+class AdminStats:
+    """Site-wide counters and recent activity for the admin views, maintained as things happen.
+
+    Every signup, login and saved analysis updates small counter documents
+    in ``admin_stats`` with atomic ``$inc`` upserts and appends to the
+    capped ``activity_log`` collection, so the admin endpoints read a few
+    documents instead of counting whole collections. Who was active on a
+    day is tracked with one marker document per user and day in
+    ``active_users``; only the first marker of the day bumps the count.
+    """
 
-class User:
     def __init__(self, db):
+        self.counters = db.admin_stats
+        self.active_users = db.active_users
+        self.users = db.users
+        if "activity_log" not in db.list_collection_names():
+            try:
+                db.create_collection("activity_log", capped=True, size=ACTIVITY_LOG_SIZE * 512, max=ACTIVITY_LOG_SIZE)
+            except CollectionInvalid:
+                pass  # Created by another process in the meantime
+            except NotImplementedError:
+                pass  # In-memory test databases such as mongomock have no capped collections
+        self.activity = db.activity_log
+
+    @staticmethod
+    def _day(at):
+        return at.strftime("%Y-%m-%d")
+
+    def _log(self, action, user_id, details, at):
+        self.activity.insert_one({"timestamp": at, "user_id": user_id, "action": action, "details": details})
+
+    def _mark_active(self, user_id, at):
+        self.users.update_one({"_id": user_id}, {"$set": {"last_active": at}})
+        marker = self.active_users.update_one(
+            {"_id": f"{self._day(at)}:{user_id}"},
+            {"$setOnInsert": {"user_id": user_id, "created_at": at}},
+            upsert=True
+        )
+        if marker.upserted_id is not None:
+            self.counters.update_one({"_id": f"day:{self._day(at)}"}, {"$inc": {"active_users": 1}}, upsert=True)
+
+    def record_user_created(self, user_id, username):
+        try:
+            at = datetime.datetime.utcnow()
+            self.counters.update_one({"_id": "totals"}, {"$inc": {"users": 1}}, upsert=True)
+            self._log("Signup", user_id, f"Created account {username}", at)
+        except PyMongoError as e:
+            logger.error(f"Could not record new user {username}: {str(e)}")
+
+    def record_login(self, user_id, is_admin=False):
+        try:
+            at = datetime.datetime.utcnow()
+            if not is_admin:
+                self._mark_active(user_id, at)
+            self._log("Admin login" if is_admin else "Login", user_id, "Logged in", at)
+        except PyMongoError as e:
+            logger.error(f"Could not record login of {user_id}: {str(e)}")
+
+    def record_analysis(self, user_id, product_name, at=None):
+        try:
+            at = at or datetime.datetime.utcnow()
+            self.counters.update_one({"_id": "totals"}, {"$inc": {"analyses": 1}}, upsert=True)
+            self.counters.update_one({"_id": f"day:{self._day(at)}"}, {"$inc": {"analyses": 1}}, upsert=True)
+            self._mark_active(user_id, at)
+            self._log("Analysis", user_id, f"Analyzed {product_name}", at)
+        except PyMongoError as e:
+            logger.error(f"Could not record analysis of {user_id}: {str(e)}")
+
+    def totals(self):
+        """Total users and analyses, and today's active users and analyses, from two counter documents."""
+        today = f"day:{self._day(datetime.datetime.utcnow())}"
+        docs = {doc["_id"]: doc for doc in self.counters.find({"_id": {"$in": ["totals", today]}})}
+        totals = docs.get("totals", {})
+        return {
+            "totalUsers": totals.get("users", 0),
+            "totalAnalyses": totals.get("analyses", 0),
+            "activeToday": docs.get(today, {}).get("active_users", 0),
+            "analysesToday": docs.get(today, {}).get("analyses", 0)
+        }
+
+    def recent_activity(self, limit=50):
+        """Latest activity log entries, newest first, with usernames from one batched lookup."""
+        entries = list(self.activity.find({}, {"_id": 0}).sort("$natural", -1).limit(limit))
+        user_ids = list({entry["user_id"] for entry in entries})
+        usernames = {user["_id"]: user["username"] for user in self.users.find({"_id": {"$in": user_ids}}, {"username": 1})}
+        for entry in entries:
+            entry["username"] = usernames.get(entry["user_id"], "admin" if entry["action"] == "Admin login" else "Unknown")
+        return entries
+
+    def recent_users(self, limit=50):
+        """Most recently active users."""
+        return list(self.users.find(
+            {},
+            {"username": 1, "email": 1, "last_active": 1, "is_active": 1}
+        ).sort("last_active", -1).limit(limit))
+
+    def recount(self):
+        """Rebuild the totals from the collections, e.g. after data was loaded around the models."""
+        totals = {
+            "users": self.users.count_documents({}),
+            "analyses": self.users.database.ingredient_analyses.count_documents({})
+        }
+        self.counters.update_one({"_id": "totals"}, {"$set": totals}, upsert=True)
+        return totals
+
+    def ensure_totals(self):
+        """Count the collections once if the totals have never been kept, as in databases from before them."""
+        if self.counters.find_one({"_id": "totals"}) is None:
+            return self.recount()
+        return None
+
+class User:
+    def __init__(self, db, admin_stats=None):
         self.collection = db.users
+        # Signups are counted for the admin views
+        self.admin_stats = admin_stats or AdminStats(db)
 
     def create_user(self, username, email, password):
         # Check if user already exists
@@ -24,6 +243,7 @@ class User:
         }
         
         result = self.collection.insert_one(user_doc)
+        self.admin_stats.record_user_created(result.inserted_id, username)
         return str(result.inserted_id)
 
     def verify_user(self, username, password):
@@ -63,8 +283,97 @@ class Admin:
         return None
 
 class IngredientAnalysis:
-    def __init__(self, db):
+    def __init__(self, db, registry=None, admin_stats=None):
         self.collection = db.ingredient_analyses
+        # Ingredients are stored as registry ids plus one-letter category codes
+        self.registry = registry or IngredientRegistry(db)
+        # Saved analyses are counted for the admin views
+        self.admin_stats = admin_stats or AdminStats(db)
+        # Running per-user aggregates and daily buckets, kept in step with every write
+        self.user_stats = db.user_stats
+        self.user_daily_stats = db.user_daily_stats
+        self.users = db.users
+        # Optional callback run on every analysis read, e.g. to refresh results from older versions
+        self.on_read = None
+
+    def _read(self, analysis):
+        if analysis:
+            self.hydrate(analysis)
+            if self.on_read:
+                self.on_read(analysis)
+        return analysis
+
+    def compact_ingredients(self, ingredients):
+        """Return the ``ingredient_ids`` and ``category_codes`` fields stored for a list of ingredients.
+
+        Unclassified ingredients are kept in their label position with UNCLASSIFIED_CODE,
+        since the position decides how much every later ingredient weighs in the score.
+        """
+        ids = []
+        codes = []
+        for item in ingredients:
+            ingredient_id = self.registry.register(item.get("name") or "")
+            if ingredient_id is None:
+                continue
+            ids.append(ingredient_id)
+            codes.append(CODE_FOR_CATEGORY.get(item.get("category"), UNCLASSIFIED_CODE))
+        return {"ingredient_ids": ids, "category_codes": "".join(codes)}
+
+    def hydrate(self, analysis):
+        """Rebuild ``ingredients`` (name and category) of a stored analysis from its ids, in place.
+
+        Analyses stored before ids were introduced already carry ``ingredients`` and are left as they are.
+        """
+        if "ingredient_ids" in analysis and "ingredients" not in analysis:
+            analysis["ingredients"] = [
+                {"name": self.registry.name(ingredient_id), "category": CATEGORY_CODES.get(code)}
+                for ingredient_id, code in zip(analysis["ingredient_ids"], analysis.get("category_codes", ""))
+            ]
+        return analysis
+
+    @staticmethod
+    def _stats_inc(analysis, sign=1):
+        """Increments that add (sign 1) or remove (sign -1) one analysis from its user's running stats."""
+        inc = {"count": sign, "score_sum": sign * (analysis.get("health_score") or 0)}
+        for category, percentage in (analysis.get("ingredient_percentages") or {}).items():
+            if category in CODE_FOR_CATEGORY:
+                inc[f"category_sums.{category}"] = sign * (percentage or 0)
+        return inc
+
+    def _update_user_stats(self, user_id, created_at, inc, score=None):
+        """Apply ``inc`` to a user's running stats and the day bucket of ``created_at``; ``score`` widens min/max."""
+        update = {"$inc": inc}
+        if score is not None:
+            update["$min"] = {"score_min": score}
+            update["$max"] = {"score_max": score}
+            if created_at is not None:
+                update["$min"]["first_analysis"] = created_at
+                update["$max"]["last_analysis"] = created_at
+        self.user_stats.update_one({"_id": user_id}, update, upsert=True)
+        if created_at is None:
+            return
+        day = created_at.strftime("%Y-%m-%d")
+        self.user_daily_stats.update_one(
+            {"_id": f"{user_id}:{day}"},
+            {"$inc": {"count": inc["count"], "score_sum": inc["score_sum"]},
+             "$setOnInsert": {"user_id": user_id, "day": day}},
+            upsert=True
+        )
+
+    def _refresh_score_extremes(self, user_id, old_score):
+        """Recompute a user's score min/max once the analysis holding one of them changed or went away."""
+        stats = self.user_stats.find_one({"_id": user_id}, {"score_min": 1, "score_max": 1})
+        if not stats or old_score not in (stats.get("score_min"), stats.get("score_max")):
+            return
+        extremes = list(self.collection.aggregate([
+            {"$match": {"user_id": user_id}},
+            {"$group": {"_id": None, "score_min": {"$min": "$health_score"}, "score_max": {"$max": "$health_score"}}}
+        ]))
+        extremes = extremes[0] if extremes else {"score_min": None, "score_max": None}
+        self.user_stats.update_one({"_id": user_id}, {"$set": {
+            "score_min": extremes["score_min"],
+            "score_max": extremes["score_max"]
+        }})
 
     def save_analysis(self, user_id, ingredients_text, analysis_result):
         """
@@ -78,32 +387,221 @@ class IngredientAnalysis:
         analysis_doc = {
             "user_id": ObjectId(user_id) if isinstance(user_id, str) else user_id,
             "ingredients_text": ingredients_text,
-            "ingredients": analysis_result.get("ingredients", []),
+            **self.compact_ingredients(analysis_result.get("ingredients", [])),
             "ingredient_percentages": analysis_result.get("ingredient_percentages", {}),
             "health_score": analysis_result.get("health_score", 0),
             "product_name": analysis_result.get("product_name", "Unnamed Product"),
+            "provisional": analysis_result.get("provisional", False),
+            # Model, prompt and scorer versions that produced the result
+            "fingerprint": analysis_result.get("fingerprint"),
             "created_at": datetime.datetime.utcnow()
         }
         
         result = self.collection.insert_one(analysis_doc)
+        self.admin_stats.record_analysis(analysis_doc["user_id"], analysis_doc["product_name"], analysis_doc["created_at"])
+        try:
+            self._update_user_stats(analysis_doc["user_id"], analysis_doc["created_at"],
+                                    self._stats_inc(analysis_doc), analysis_doc["health_score"])
+        except PyMongoError as e:
+            logger.error(f"Could not update stats of user {analysis_doc['user_id']}: {str(e)}")
         return str(result.inserted_id)
 
-    def get_user_analyses(self, user_id, skip=0, limit=10):
+    def get_provisional_analyses(self, limit=100):
         """
-        Get all analyses for a specific user, with pagination
+        Get analyses saved with provisional rule-based results, oldest first
         
         Parameters:
-        - user_id: ObjectId or str of the user
-        - skip: Number of results to skip (for pagination)
-        - limit: Maximum number of results to return
+        - limit: Maximum number of results to return (0 for all)
         """
-        user_id_obj = ObjectId(user_id) if isinstance(user_id, str) else user_id
         cursor = self.collection.find(
-            {"user_id": user_id_obj}
-        ).sort("created_at", -1).skip(skip).limit(limit)
+            {"provisional": True},
+            {"user_id": 1}
+        ).sort("created_at", 1).limit(limit)
         
         return list(cursor)
 
+    def update_analysis_result(self, analysis_id, analysis_result):
+        """
+        Replace the result of a stored analysis, e.g. once a provisional one is re-analyzed
+        
+        Parameters:
+        - analysis_id: ObjectId or str of the analysis
+        - analysis_result: Dictionary containing the new analysis results
+        """
+        analysis_id_obj = ObjectId(analysis_id) if isinstance(analysis_id, str) else analysis_id
+        new_result = {
+            "ingredient_percentages": analysis_result.get("ingredient_percentages", {}),
+            "health_score": analysis_result.get("health_score", 0)
+        }
+        before = self.collection.find_one_and_update(
+            {"_id": analysis_id_obj},
+            {
+                "$set": {
+                    **self.compact_ingredients(analysis_result.get("ingredients", [])),
+                    **new_result,
+                    "provisional": analysis_result.get("provisional", False),
+                    "fingerprint": analysis_result.get("fingerprint")
+                },
+                # Analyses stored before ingredient ids keep their names here
+                "$unset": {"ingredients": ""}
+            },
+            projection={"user_id": 1, "created_at": 1, "health_score": 1, "ingredient_percentages": 1},
+            return_document=ReturnDocument.BEFORE
+        )
+        if before is None:
+            return False
+        try:
+            # Swap the old result for the new one in the user's running stats
+            inc = self._stats_inc(new_result)
+            for field, value in self._stats_inc(before, -1).items():
+                inc[field] = inc.get(field, 0) + value
+            self._update_user_stats(before["user_id"], before.get("created_at"), inc, new_result["health_score"])
+            if before.get("health_score") != new_result["health_score"]:
+                self._refresh_score_extremes(before["user_id"], before.get("health_score"))
+        except PyMongoError as e:
+            logger.error(f"Could not update stats of user {before['user_id']}: {str(e)}")
+        return True
+
+    def _find_page(self, query, projection, limit, page_token):
+        query, sort, backwards = keyset_query(query, page_token)
+        rows = list(self.collection.find(query, projection).sort(sort).limit(limit + 1))
+        return keyset_page(rows, limit, backwards, page_token)
+
+    def get_user_analyses(self, user_id, limit=10, page_token=None):
+        """
+        Get a page of a user's analyses, newest first
+        
+        Parameters:
+        - user_id: ObjectId or str of the user
+        - limit: Maximum number of results to return
+        - page_token: next_token or prev_token of a previous page, None for the first page
+        
+        Returns a dict with "analyses", "next_token", "prev_token", "has_next" and "has_prev".
+        Every page costs one index seek, however deep it is.
+        """
+        user_id_obj = ObjectId(user_id) if isinstance(user_id, str) else user_id
+        page = self._find_page({"user_id": user_id_obj}, None, limit, page_token)
+        page["analyses"] = [self._read(analysis) for analysis in page["analyses"]]
+        return page
+
+    def summarize(self, analysis, fields=SUMMARY_FIELDS, preview_length=0):
+        """
+        Slim list-view copy of an analysis: the projected fields with defaults filled in
+
+        Parameters:
+        - analysis: Analysis document read with a projection of ``fields``
+        - fields: Projection the document was read with
+        - preview_length: Also include the first characters of ingredients_text as ``ingredients_preview``
+        """
+        summary = {"_id": analysis["_id"]}
+        if "user_id" in fields:
+            summary["user_id"] = analysis.get("user_id")
+        if "username" in analysis:
+            summary["username"] = analysis["username"]
+        if "product_name" in fields:
+            summary["product_name"] = analysis.get("product_name") or "Unnamed Product"
+        if "health_score" in fields:
+            summary["health_score"] = analysis.get("health_score", 0)
+        if "ingredient_percentages" in fields:
+            summary["ingredient_percentages"] = analysis.get("ingredient_percentages") or dict(EMPTY_PERCENTAGES)
+        if "created_at" in fields:
+            summary["created_at"] = analysis.get("created_at")
+        if preview_length:
+            text = analysis.get("ingredients_text") or ""
+            if len(text) > preview_length:
+                text = text[:preview_length] + "..."
+            summary["ingredients_preview"] = text or "No ingredients listed"
+        return summary
+
+    def _summary_projection(self, fields):
+        """Projection for summaries of ``fields``; adds REFRESH_FIELDS when scores are listed and on_read is set."""
+        projection = {**fields, "created_at": 1}
+        if self.on_read and any(field in fields for field in SCORE_FIELDS):
+            projection.update(REFRESH_FIELDS)
+        return projection
+
+    def _summaries(self, analyses, fields, preview_length=0):
+        refresh = self.on_read and any(field in fields for field in SCORE_FIELDS)
+        return [self.summarize(self._read(analysis) if refresh else analysis, fields, preview_length)
+                for analysis in analyses]
+
+    def get_user_analysis_summaries(self, user_id, limit=10, page_token=None, fields=SUMMARY_FIELDS, preview_length=0):
+        """
+        Get a page of slim summaries of a user's analyses, newest first, reading only the fields list views show
+
+        Parameters:
+        - user_id: ObjectId or str of the user
+        - limit: Maximum number of results to return
+        - page_token: next_token or prev_token of a previous page, None for the first page
+        - fields: Projection to read, e.g. SUMMARY_FIELDS or CHOICE_FIELDS
+        - preview_length: Also read ingredients_text and keep this many characters of it
+
+        Returns a page like get_user_analyses. When the fields include scores,
+        every row goes through on_read first, so stale scores are refreshed here too.
+        """
+        user_id_obj = ObjectId(user_id) if isinstance(user_id, str) else user_id
+        # created_at is always read: page tokens are built from it
+        projection = self._summary_projection(fields)
+        if preview_length:
+            projection["ingredients_text"] = 1
+        page = self._find_page({"user_id": user_id_obj}, projection, limit, page_token)
+        page["analyses"] = self._summaries(page["analyses"], fields, preview_length)
+        return page
+
+    def get_admin_overview(self, limit=20, page_token=None, users_limit=100, fields=None):
+        """
+        Get a page of the most recent analyses of all users with usernames, and users with their analysis counts
+
+        Parameters:
+        - limit: Maximum number of analyses to return
+        - page_token: next_token or prev_token of a previous overview, None for the most recent analyses
+        - users_limit: Maximum number of users to list, most recently active first
+        - fields: Return analyses as summaries of these fields (e.g. SUMMARY_FIELDS) instead of full documents
+
+        Returns a dict with "analyses" (each with a "username"), "users" (user_id,
+        username, email, analysis_count, last_analysis), "total" analyses and the
+        page tokens and flags of get_user_analyses. Users without analyses are
+        listed too, and so is the owner of every analysis on the page. The page
+        is one keyset seek on the recent analyses index; counts and the total
+        come from the running stats, so nothing scans the analyses.
+        """
+        if fields:
+            fields = {**fields, "user_id": 1}
+        projection = self._summary_projection(fields) if fields else None
+        page = self._find_page({}, projection, limit, page_token)
+        if fields:
+            analyses = self._summaries(page["analyses"], fields)
+        else:
+            analyses = [self._read(analysis) for analysis in page["analyses"]]
+
+        user_fields = {"username": 1, "email": 1}
+        users = list(self.users.find({}, user_fields).sort("last_active", -1).limit(users_limit))
+        listed = {user["_id"] for user in users}
+        owners = list({analysis["user_id"] for analysis in analyses if analysis.get("user_id") not in listed})
+        if owners:
+            users += self.users.find({"_id": {"$in": owners}}, user_fields)
+
+        usernames = {user["_id"]: user.get("username") for user in users}
+        for analysis in analyses:
+            analysis["username"] = usernames.get(analysis.get("user_id")) or "Unknown"
+
+        stats = {
+            doc["_id"]: doc
+            for doc in self.user_stats.find({"_id": {"$in": list(usernames)}}, {"count": 1, "last_analysis": 1})
+        }
+        users = [
+            {
+                "user_id": user["_id"],
+                "username": user.get("username") or "Unknown",
+                "email": user.get("email"),
+                "analysis_count": stats.get(user["_id"], {}).get("count", 0),
+                "last_analysis": stats.get(user["_id"], {}).get("last_analysis")
+            }
+            for user in users
+        ]
+        total = self.admin_stats.totals()["totalAnalyses"]
+        return {**page, "analyses": analyses, "users": users, "total": total}
+
     def get_analysis_by_id(self, analysis_id):
         """
         Get a specific analysis by its ID
@@ -112,7 +610,7 @@ class IngredientAnalysis:
         - analysis_id: ObjectId or str of the analysis
         """
         analysis_id_obj = ObjectId(analysis_id) if isinstance(analysis_id, str) else analysis_id
-        return self.collection.find_one({"_id": analysis_id_obj})
+        return self._read(self.collection.find_one({"_id": analysis_id_obj}))
 
     def get_user_analysis_stats(self, user_id):
         """
@@ -122,43 +620,91 @@ class IngredientAnalysis:
         - user_id: ObjectId or str of the user
         """
         user_id_obj = ObjectId(user_id) if isinstance(user_id, str) else user_id
-        pipeline = [
-            {"$match": {"user_id": user_id_obj}},
-            {"$group": {
-                "_id": None,
-                "total_analyses": {"$sum": 1},
-                "avg_health_score": {"$avg": "$health_score"},
-                "category_counts": {
-                    "$push": "$ingredient_percentages"
-                }
-            }}
-        ]
-        
-        result = list(self.collection.aggregate(pipeline))
-        if not result:
+        stats = self.user_stats.find_one({"_id": user_id_obj})
+        if not stats or not stats.get("count"):
             return {
                 "total_analyses": 0,
                 "avg_health_score": 0,
                 "category_averages": {}
             }
-            
-        stats = result[0]
         
-        # Calculate average percentages for each category
-        category_counts = stats["category_counts"]
-        category_averages = {}
+        count = stats["count"]
+        return {
+            "total_analyses": count,
+            "avg_health_score": round(stats.get("score_sum", 0) / count, 2),
+            "category_averages": {
+                category: round(stats.get("category_sums", {}).get(category, 0) / count, 2)
+                for category in CATEGORY_CODES.values()
+            },
+            "min_health_score": stats.get("score_min"),
+            "max_health_score": stats.get("score_max"),
+            "first_analysis": stats.get("first_analysis"),
+            "last_analysis": stats.get("last_analysis")
+        }
+
+    def get_user_daily_stats(self, user_id, days=30):
+        """
+        Get a user's analysis count and average health score per day, oldest first
         
-        if category_counts:
-            categories = category_counts[0].keys()
-            for category in categories:
-                total = sum(count.get(category, 0) for count in category_counts)
-                category_averages[category] = round(total / len(category_counts), 2)
+        Parameters:
+        - user_id: ObjectId or str of the user
+        - days: Number of days to look back, today included
+        """
+        user_id_obj = ObjectId(user_id) if isinstance(user_id, str) else user_id
+        since = (datetime.datetime.utcnow() - datetime.timedelta(days=days - 1)).strftime("%Y-%m-%d")
+        cursor = self.user_daily_stats.find(
+            {"user_id": user_id_obj, "day": {"$gte": since}, "count": {"$gt": 0}}
+        ).sort("day", 1)
         
-        return {
-            "total_analyses": stats["total_analyses"],
-            "avg_health_score": round(stats["avg_health_score"], 2),
-            "category_averages": category_averages
+        return [
+            {"day": bucket["day"], "count": bucket["count"],
+             "avg_health_score": round(bucket["score_sum"] / bucket["count"], 2)}
+            for bucket in cursor
+        ]
+
+    def rebuild_user_stats(self):
+        """
+        Recompute every user's running stats and daily buckets from the stored analyses
+        
+        For databases from before the running stats, or to repair them. Writes
+        that happen while it runs may be counted twice, so run it while the
+        app is stopped. Returns the number of users rebuilt.
+        """
+        totals = {
+            "_id": "$user_id",
+            "count": {"$sum": 1},
+            "score_sum": {"$sum": "$health_score"},
+            "score_min": {"$min": "$health_score"},
+            "score_max": {"$max": "$health_score"},
+            "first_analysis": {"$min": "$created_at"},
+            "last_analysis": {"$max": "$created_at"}
         }
+        # $group output fields cannot be nested, so category sums go under their codes first
+        for code, category in CATEGORY_CODES.items():
+            totals[f"category_{code}"] = {"$sum": f"$ingredient_percentages.{category}"}
+        
+        user_ids = []
+        for stats in self.collection.aggregate([{"$group": totals}]):
+            stats["category_sums"] = {category: stats.pop(f"category_{code}") for code, category in CATEGORY_CODES.items()}
+            self.user_stats.replace_one({"_id": stats["_id"]}, stats, upsert=True)
+            user_ids.append(stats["_id"])
+        self.user_stats.delete_many({"_id": {"$nin": user_ids}})
+        
+        self.user_daily_stats.delete_many({})
+        for bucket in self.collection.aggregate([
+            {"$group": {
+                "_id": {"user_id": "$user_id", "day": {"$dateToString": {"format": "%Y-%m-%d", "date": "$created_at"}}},
+                "count": {"$sum": 1},
+                "score_sum": {"$sum": "$health_score"}
+            }}
+        ]):
+            user_id, day = bucket["_id"]["user_id"], bucket["_id"]["day"]
+            self.user_daily_stats.replace_one(
+                {"_id": f"{user_id}:{day}"},
+                {"user_id": user_id, "day": day, "count": bucket["count"], "score_sum": bucket["score_sum"]},
+                upsert=True
+            )
+        return len(user_ids)
 
     def delete_analysis(self, analysis_id):
         """
@@ -168,5 +714,15 @@ class IngredientAnalysis:
         - analysis_id: ObjectId or str of the analysis to delete
         """
         analysis_id_obj = ObjectId(analysis_id) if isinstance(analysis_id, str) else analysis_id
-        result = self.collection.delete_one({"_id": analysis_id_obj})
-        return result.deleted_count > 0
\ No newline at end of file
+        deleted = self.collection.find_one_and_delete(
+            {"_id": analysis_id_obj},
+            projection={"user_id": 1, "created_at": 1, "health_score": 1, "ingredient_percentages": 1}
+        )
+        if deleted is None:
+            return False
+        try:
+            self._update_user_stats(deleted["user_id"], deleted.get("created_at"), self._stats_inc(deleted, -1))
+            self._refresh_score_extremes(deleted["user_id"], deleted.get("health_score"))
+        except PyMongoError as e:
+            logger.error(f"Could not update stats of user {deleted['user_id']}: {str(e)}")
+        return True
\ No newline at end of file
@@ -0,0 +1,22 @@
+import sys
+import os
+
+# Add parent directory to path to import from services
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from db_config import DatabaseConfig
+from models import IngredientAnalysis, AdminStats
+
+def main():
+    """Rebuild per-user running stats and the admin totals from the stored analyses; run while the app is stopped"""
+    db = DatabaseConfig().get_db()
+    analysis_model = IngredientAnalysis(db)
+
+    print("Rebuilding per-user stats...")
+    users = analysis_model.rebuild_user_stats()
+    print(f"Rebuilt stats of {users} users")
+
+    totals = AdminStats(db).recount()
+    print(f"Admin totals: {totals['users']} users, {totals['analyses']} analyses")
+
+if __name__ == "__main__":
+    main()
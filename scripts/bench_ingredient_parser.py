@@ -0,0 +1,60 @@
+import sys
+import os
+import re
+import random
+import timeit
+
+# Add parent directory to path to import from services
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from services.ingredient_parser import parse_ingredients, flatten_ingredients
+from services.ingredient_rules import CATEGORY_KEYWORDS
+
+def legacy_process_ingredients(text):
+    """The splitter app.py used before the structured parser, kept for comparison."""
+    if not text:
+        return []
+    text = re.sub(r'^ingredients:?\s*', '', text.lower(), flags=re.IGNORECASE)
+    cleaned_ingredients = []
+    for ingredient in re.split(r'[,;.]', text):
+        ingredient = ingredient.strip()
+        ingredient = re.sub(r'\([^)]*\)', '', ingredient)
+        ingredient = re.sub(r'\s+', ' ', ingredient)
+        if len(ingredient) < 2:
+            continue
+        if re.match(r'^[\d\W]+$', ingredient):
+            continue
+        cleaned_ingredients.append(ingredient)
+    return cleaned_ingredients
+
+def ocr_label(rng, vocabulary, items):
+    """A long upper-case label with nested blends, percentages and OCR spacing noise."""
+    parts = []
+    for _ in range(items):
+        name = rng.choice(vocabulary).upper()
+        roll = rng.random()
+        if roll < 0.15:
+            name = f"{name} ({', '.join(rng.sample(vocabulary, 3)).upper()})"
+        elif roll < 0.3:
+            name = f"{name} {rng.randint(1, 40)}.{rng.randint(0, 9)}%"
+        parts.append(name.replace(" ", "  ") if rng.random() < 0.2 else name)
+    return "INGREDIENTS: " + ", ".join(parts) + ". CONTAINS 2% OR LESS OF: SALT, CITRIC ACID."
+
+def main():
+    """Time the structured parser against the legacy splitter on long OCR strings"""
+    items = int(sys.argv[1]) if len(sys.argv) > 1 else 400
+    rng = random.Random(7)
+    vocabulary = sorted({keyword for _, keywords in CATEGORY_KEYWORDS for keyword in keywords})
+    labels = [ocr_label(rng, vocabulary, items) for _ in range(20)]
+    characters = sum(len(label) for label in labels)
+
+    for name, function in [
+        ("legacy process_ingredients", legacy_process_ingredients),
+        ("parse_ingredients + flatten", lambda text: flatten_ingredients(parse_ingredients(text)))
+    ]:
+        runs = 20
+        seconds = min(timeit.repeat(lambda: [function(label) for label in labels], number=runs, repeat=3))
+        per_label = seconds / runs / len(labels)
+        print(f"{name:<30}{per_label * 1e6:>10.1f} us/label{characters * runs / seconds / 1e6:>10.2f} MB/s")
+
+if __name__ == "__main__":
+    main()
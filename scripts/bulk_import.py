@@ -0,0 +1,59 @@
+import sys
+import os
+import csv
+
+# Add parent directory to path to import from models
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from models import IngredientAnalysis
+from db_config import DatabaseConfig
+from services.ingredient_service import IngredientService
+
+def read_products(csv_path):
+    """Read products from a CSV file with product_name and ingredients_text columns"""
+    with open(csv_path, newline='', encoding='utf-8') as f:
+        return [
+            {
+                "product_name": (row.get("product_name") or "").strip() or "Unnamed Product",
+                "ingredients_text": (row.get("ingredients_text") or "").strip()
+            }
+            for row in csv.DictReader(f)
+        ]
+
+def main():
+    if len(sys.argv) != 3:
+        print("Usage: python scripts/bulk_import.py <products.csv> <username>")
+        sys.exit(1)
+
+    csv_path, username = sys.argv[1], sys.argv[2]
+
+    # Initialize database
+    db = DatabaseConfig().get_db()
+    analysis_model = IngredientAnalysis(db)
+
+    user = db.users.find_one({"username": username})
+    if not user:
+        print(f"User {username} not found")
+        sys.exit(1)
+
+    products = read_products(csv_path)
+    print(f"Analyzing {len(products)} products...")
+
+    # Several products share each model generation
+    service = IngredientService()
+    analyses = service.analyze_batch([product["ingredients_text"] for product in products])
+
+    saved = 0
+    for product, analysis in zip(products, analyses):
+        if analysis is None:
+            print(f"Failed to analyze: {product['product_name']}")
+            continue
+        analysis["product_name"] = product["product_name"]
+        analysis_model.save_analysis(user["_id"], product["ingredients_text"], analysis)
+        saved += 1
+        print(f"Saved analysis: {product['product_name']}")
+
+    print(f"\nImported {saved}/{len(products)} products")
+    print("Batch stats:", service.get_metrics()["batch"])
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+import sys
+import os
+
+# Add parent directory to path to import from services
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from db_config import DatabaseConfig
+from services.index_manager import IndexManager
+
+def print_index(entry):
+    keys = ", ".join(f"{field} {direction}" for field, direction in entry["keys"])
+    line = f"  {entry['collection']}.{entry['name']:<14} ({keys}): {entry['status']}"
+    if entry.get("error"):
+        line += f" - {entry['error']}"
+    print(line)
+
+def main():
+    """Create any missing indexes, drop superseded ones and report which application queries lack index coverage"""
+    manager = IndexManager(DatabaseConfig().get_db())
+
+    print("Indexes:")
+    for entry in manager.ensure():
+        print_index(entry)
+
+    print("\nSuperseded indexes:")
+    for entry in manager.drop_superseded():
+        print_index(entry)
+
+    print("\nQuery coverage:")
+    for entry in manager.check_coverage():
+        if entry["covered"]:
+            print(f"  {entry['query']:<22} uses {', '.join(entry['indexes'])}")
+        else:
+            print(f"  {entry['query']:<22} NOT COVERED: {', '.join(entry['problems'])}")
+
+if __name__ == "__main__":
+    main()
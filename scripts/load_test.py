@@ -0,0 +1,58 @@
+import sys
+import os
+import json
+import argparse
+import contextlib
+
+# Add parent directory to path to import from loadtest
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from loadtest.fake_ollama import FakeOllama, LatencyModel
+from loadtest.harness import LoadTest, start_app, format_report
+
+def main():
+    """Run the app against a fake Ollama and report per-endpoint latency percentiles and error rates"""
+    parser = argparse.ArgumentParser(description="End-to-end load test with a local Ollama stand-in")
+    parser.add_argument("--rps", type=float, default=10, help="Requests started per second")
+    parser.add_argument("--duration", type=float, default=30, help="Seconds to generate load for")
+    parser.add_argument("--users", type=int, default=5, help="Logged-in users sharing the load")
+    parser.add_argument("--mode", choices=["async", "sync"], default="async", help="/analyze mode")
+    parser.add_argument("--no-wait", action="store_true", help="Do not poll queued analyses to completion")
+    parser.add_argument("--latency", default="lognormal:0.5:0.4",
+                        help='Model latency: "fixed:S", "uniform:LOW:HIGH" or "lognormal:MEDIAN:SIGMA"')
+    parser.add_argument("--malformed-rate", type=float, default=0.0, help="Share of malformed model answers")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of model calls failing with HTTP 500")
+    parser.add_argument("--model-concurrency", type=int, default=2, help="Generations each fake model server runs at once")
+    parser.add_argument("--nodes", type=int, default=1, help="Fake model servers in the app's endpoint pool")
+    parser.add_argument("--mongo-uri", help="Use this MongoDB instead of mongomock")
+    parser.add_argument("--json", help="Also write the report to this file")
+    parser.add_argument("--verbose", action="store_true", help="Show the app's own output")
+    args = parser.parse_args()
+
+    nodes = [
+        FakeOllama(
+            LatencyModel.parse(args.latency),
+            malformed_rate=args.malformed_rate,
+            error_rate=args.error_rate,
+            max_concurrency=args.model_concurrency
+        )
+        for _ in range(args.nodes)
+    ]
+    ollama_urls = [node.start() for node in nodes]
+    base_url, _ = start_app(ollama_urls, args.mongo_uri, users=args.users, quiet=not args.verbose)
+
+    test = LoadTest(base_url, users=args.users, rps=args.rps, duration=args.duration,
+                    analyze_mode=args.mode, wait_for_jobs=not args.no_wait)
+    output = sys.stdout if args.verbose else open(os.devnull, "w")
+    with contextlib.redirect_stdout(output):
+        report = test.run()
+    report["fake_ollama"] = [dict(node.stats) for node in nodes]
+
+    print(format_report(report))
+    for url, stats in zip(ollama_urls, report["fake_ollama"]):
+        print(f"Fake Ollama {url}: {stats}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == "__main__":
+    main()
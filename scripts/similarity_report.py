@@ -0,0 +1,55 @@
+import sys
+import os
+
+# Add parent directory to path to import from services
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from db_config import DatabaseConfig
+from models import IngredientAnalysis
+from services.config import Config
+from services.ingredient_parser import canonicalize_ingredient
+from services.similarity_index import MinHashLSHIndex
+
+def main():
+    """Replay stored analyses in order and report how many model calls near-duplicate reuse avoids"""
+    threshold = float(sys.argv[1]) if len(sys.argv) > 1 else Config.SIMILARITY_THRESHOLD
+
+    db = DatabaseConfig().get_db()
+    analysis_model = IngredientAnalysis(db)
+    analyses = db.ingredient_analyses.find(
+        {"$or": [{"ingredient_ids.0": {"$exists": True}}, {"ingredients.0": {"$exists": True}}]},
+        {"ingredient_ids": 1, "category_codes": 1, "ingredients": 1}
+    ).sort("created_at", 1)
+
+    index = MinHashLSHIndex(threshold=threshold, num_perm=Config.SIMILARITY_NUM_PERM)
+    total = full_reuse = partial_reuse = ingredients_total = ingredients_sent = 0
+
+    for analysis in map(analysis_model.hydrate, analyses):
+        names = {canonicalize_ingredient(item["name"]) for item in analysis["ingredients"] if item.get("name")}
+        if not names:
+            continue
+        total += 1
+        ingredients_total += len(names)
+
+        match = index.query(names)
+        if match is None:
+            ingredients_sent += len(names)
+        else:
+            differing = names - match.data
+            ingredients_sent += len(differing)
+            if differing:
+                partial_reuse += 1
+            else:
+                full_reuse += 1
+
+        index.add(str(analysis["_id"]), names, names)
+
+    print(f"Similarity threshold: {threshold}")
+    print(f"Analyses replayed: {total}")
+    print(f"Model calls avoided (identical sets): {full_reuse}")
+    print(f"Reduced analyses (only new ingredients sent): {partial_reuse}")
+    if ingredients_total:
+        print(f"Ingredients sent to the model: {ingredients_sent}/{ingredients_total} "
+              f"({ingredients_sent / ingredients_total:.1%})")
+
+if __name__ == "__main__":
+    main()
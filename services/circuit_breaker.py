@@ -0,0 +1,100 @@
+import time
+import threading
+import logging
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+
+class CircuitBreaker:
+    """Stop calling the model while it is failing or too slow.
+
+    The outcomes of the last ``window`` calls are kept; once at least
+    ``min_calls`` have been seen and the share of failed or slow calls
+    reaches ``failure_rate``, the circuit opens and callers serve degraded
+    answers instead of waiting on a dead connection. While open, a
+    background thread runs ``probe`` every ``probe_interval`` seconds and
+    closes the circuit on the first success, then runs the recovery
+    callbacks.
+    """
+
+    def __init__(self, probe, failure_rate=0.5, min_calls=4, window=20,
+                 slow_call_seconds=60, probe_interval=15):
+        self.probe = probe
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.slow_call_seconds = slow_call_seconds
+        self.probe_interval = probe_interval
+        self.state = CLOSED
+        self._outcomes = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self._recovery_callbacks = []
+        self._opened_at = None
+        self._stats = {"trips": 0, "rejected": 0, "probes": 0}
+
+    def allow_request(self):
+        """Return False while the circuit is open; the caller should degrade."""
+        with self._lock:
+            if self.state == OPEN:
+                self._stats["rejected"] += 1
+                return False
+            return True
+
+    def record_success(self, seconds):
+        self._record(seconds <= self.slow_call_seconds)
+
+    def record_failure(self):
+        self._record(False)
+
+    def on_recover(self, callback):
+        """Register a function to run each time the circuit closes again."""
+        self._recovery_callbacks.append(callback)
+
+    def _record(self, ok):
+        with self._lock:
+            if self.state == OPEN:
+                return
+            self._outcomes.append(ok)
+            failures = self._outcomes.count(False)
+            if len(self._outcomes) < self.min_calls or failures / len(self._outcomes) < self.failure_rate:
+                return
+            self.state = OPEN
+            self._opened_at = time.time()
+            self._stats["trips"] += 1
+            self._outcomes.clear()
+
+        logger.error(f"Model circuit opened after {failures} failed or slow calls; serving provisional results")
+        threading.Thread(target=self._probe_until_healthy, name="model-circuit-probe", daemon=True).start()
+
+    def _probe_until_healthy(self):
+        while True:
+            time.sleep(self.probe_interval)
+            self._stats["probes"] += 1
+            try:
+                self.probe()
+            except Exception as e:
+                logger.warning(f"Model still unavailable: {str(e)}")
+                continue
+            break
+
+        with self._lock:
+            self.state = CLOSED
+            self._opened_at = None
+        logger.info("Model circuit closed, model is healthy again")
+
+        for callback in self._recovery_callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logger.error(f"Error in circuit recovery callback: {str(e)}")
+
+    def stats(self):
+        with self._lock:
+            return {
+                "state": self.state,
+                "opened_at": self._opened_at,
+                "recent_failure_rate": round(self._outcomes.count(False) / len(self._outcomes), 3) if self._outcomes else 0,
+                **self._stats
+            }
@@ -1,4 +1,5 @@
 import os
+import json
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -29,6 +30,73 @@ class Config:
     CACHE_TIMEOUT = 3600  # 1 hour
     MAX_RETRIES = 3
     
+    # Ollama Configuration
+    OLLAMA_URL = os.getenv('OLLAMA_URL', 'http://localhost:11434')
+    OLLAMA_MAX_CONCURRENCY = int(os.getenv('OLLAMA_MAX_CONCURRENCY', 2))  # Generations running at once per endpoint
+    OLLAMA_MAX_QUEUE = int(os.getenv('OLLAMA_MAX_QUEUE', 8))  # Callers allowed to wait for a slot
+    OLLAMA_TIMEOUT = int(os.getenv('OLLAMA_TIMEOUT', 120))  # Seconds per generation
+    # Comma-separated pool of Ollama servers; defaults to OLLAMA_URL alone
+    OLLAMA_URLS = [u.strip() for u in os.getenv('OLLAMA_URLS', '').split(',') if u.strip()]
+    # Models each endpoint may serve as JSON, e.g. {"http://gpu2:11434": ["deepseek-llm"]}; unlisted endpoints serve any
+    OLLAMA_ENDPOINT_MODELS = json.loads(os.getenv('OLLAMA_ENDPOINT_MODELS', '{}'))
+    # Options for every request to a server, by URL, e.g. {"http://gpu1:11434": {"num_thread": 16}}
+    OLLAMA_ENDPOINT_OPTIONS = json.loads(os.getenv('OLLAMA_ENDPOINT_OPTIONS', '{}'))
+    OLLAMA_HEALTH_INTERVAL = float(os.getenv('OLLAMA_HEALTH_INTERVAL', 10))  # Seconds between endpoint health checks
+    
+    # Model Routing: comma-separated tiers, smallest first
+    OLLAMA_MODELS = [m.strip() for m in os.getenv('OLLAMA_MODELS', 'llama3.2:3b,deepseek-llm').split(',') if m.strip()]
+    ROUTER_MAX_REPAIRS = int(os.getenv('ROUTER_MAX_REPAIRS', 2))  # Schema repairs tolerated before escalating
+    ROUTER_MIN_COVERAGE = float(os.getenv('ROUTER_MIN_COVERAGE', 0.8))  # Share of input ingredients classified
+    ROUTER_MIN_AGREEMENT = float(os.getenv('ROUTER_MIN_AGREEMENT', 0.6))  # Agreement with local rules
+    
+    # Model Residency and Generation Options
+    OLLAMA_WARM_UP = os.getenv('OLLAMA_WARM_UP', 'True').lower() == 'true'  # Preload models at startup
+    OLLAMA_KEEP_ALIVE = os.getenv('OLLAMA_KEEP_ALIVE', '30m')  # How long Ollama keeps a model loaded
+    DEFAULT_MODEL_OPTIONS = {
+        "num_ctx": 4096,      # Fits a full batch prompt and answer; keep constant to avoid model reloads
+        "num_predict": 512,   # Caps runaway generations, per product
+        "temperature": 0
+    }
+    # Per-model overrides as JSON, e.g. {"deepseek-llm": {"num_ctx": 4096}}. num_thread is only sent
+    # when set here or in OLLAMA_ENDPOINT_OPTIONS: the app's own CPU count says nothing about the
+    # Ollama server's, and Ollama picks a good value itself
+    MODEL_OPTIONS = json.loads(os.getenv('OLLAMA_MODEL_OPTIONS', '{}'))
+    
+    PROMPT_TOKEN_BUDGET = int(os.getenv('PROMPT_TOKEN_BUDGET', 1024))  # Approximate prompt tokens per request
+    SCORE_POSITION_DECAY = float(os.getenv('SCORE_POSITION_DECAY', 0.85))  # Weight of each label position relative to the one before
+    OCR_LEXICON_EXTRACTION = os.getenv('OCR_LEXICON_EXTRACTION', 'True').lower() == 'true'  # Clean OCR ingredient lists with the lexicon
+    OCR_SPELL_CORRECTION = os.getenv('OCR_SPELL_CORRECTION', 'True').lower() == 'true'  # Correct OCR misreads against the lexicon
+    SPELL_DICTIONARY = os.getenv('SPELL_DICTIONARY', '/usr/share/dict/words')  # Word list of valid words never corrected
+    
+    # Near-Duplicate Reuse
+    SIMILARITY_ENABLED = os.getenv('SIMILARITY_ENABLED', 'True').lower() == 'true'
+    SIMILARITY_THRESHOLD = float(os.getenv('SIMILARITY_THRESHOLD', 0.9))  # Jaccard similarity of ingredient sets
+    SIMILARITY_NUM_PERM = int(os.getenv('SIMILARITY_NUM_PERM', 64))  # MinHash signature length
+    SIMILARITY_INDEX_SIZE = int(os.getenv('SIMILARITY_INDEX_SIZE', 10000))  # Analyses kept in the similarity index, least recently used evicted first
+    
+    # Circuit Breaker: serve provisional rule-based results while the model is failing
+    BREAKER_FAILURE_RATE = float(os.getenv('BREAKER_FAILURE_RATE', 0.5))  # Share of failed or slow recent calls
+    BREAKER_MIN_CALLS = int(os.getenv('BREAKER_MIN_CALLS', 4))  # Calls seen before the circuit may open
+    BREAKER_SLOW_CALL_SECONDS = float(os.getenv('BREAKER_SLOW_CALL_SECONDS', 60))  # Slower calls count as failures
+    BREAKER_PROBE_INTERVAL = float(os.getenv('BREAKER_PROBE_INTERVAL', 15))  # Seconds between recovery probes
+    
+    # Fair Scheduling of analysis jobs
+    USER_RATE_PER_MINUTE = float(os.getenv('USER_RATE_PER_MINUTE', 20))  # Sustained analyses per user
+    USER_BURST = int(os.getenv('USER_BURST', 10))  # Analyses a user may submit at once
+    USER_WEIGHTS = json.loads(os.getenv('USER_WEIGHTS', '{}'))  # Fair-share weight by user id, default 1
+    INTERACTIVE_WORKERS = int(os.getenv('INTERACTIVE_WORKERS', 1))  # Workers reserved for interactive jobs
+    JOB_LEASE_SECONDS = int(os.getenv('JOB_LEASE_SECONDS', 300))  # Running jobs of a dead worker are requeued after this
+    JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', 3))  # Runs of a job whose worker keeps dying before it fails
+    MAX_QUEUED_JOBS = int(os.getenv('MAX_QUEUED_JOBS', 50))  # Waiting interactive or bulk jobs before new ones get a 503
+    
+    # Admin Views
+    ADMIN_PAGE_SIZE = int(os.getenv('ADMIN_PAGE_SIZE', 20))  # Recent analyses per admin dashboard page
+    
+    @classmethod
+    def model_options(cls, model):
+        """Generation options for a model: defaults merged with its profile overrides."""
+        return {**cls.DEFAULT_MODEL_OPTIONS, **cls.MODEL_OPTIONS.get(model, {})}
+    
     @classmethod
     def validate(cls):
         """Validate required configuration"""
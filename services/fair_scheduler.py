@@ -0,0 +1,195 @@
+import time
+import heapq
+import datetime
+import threading
+from pymongo.errors import DuplicateKeyError
+
+# Priority classes, highest first. A class is only served when every
+# higher class is empty
+PRIORITY_INTERACTIVE = 2
+PRIORITY_BULK = 1
+PRIORITY_BACKGROUND = 0
+
+def _empty_stats():
+    return {"queued": 0, "dispatched": 0, "throttled": 0, "total_wait": 0.0, "max_wait": 0.0}
+
+class QuotaExceededError(Exception):
+    """Raised when a user has used up their analysis quota.
+
+    ``retry_after`` is the number of seconds until the next analysis is allowed.
+    """
+
+    def __init__(self, retry_after):
+        super().__init__(f"Analysis quota exceeded, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+class TokenBucket:
+    """Allow ``burst`` requests at once, refilled at ``rate`` requests per second."""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def take(self):
+        """Take one token; return 0 on success or the seconds until one is available."""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate
+
+class InMemoryQuotaStore:
+    """Per-user token buckets held in this process only."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = {}
+
+    def take(self, user_id, rate, burst):
+        """Take one token; return 0 on success or the seconds until one is available."""
+        with self._lock:
+            return self._buckets.setdefault(user_id, TokenBucket(rate, burst)).take()
+
+class MongoQuotaStore:
+    """Per-user token buckets shared by every process through a MongoDB collection.
+
+    Each user has one document holding the time their bucket would next be
+    full again (the generic cell rate algorithm, equivalent to a token
+    bucket). Taking a token is a compare-and-set on that time, so
+    concurrent requests in different processes cannot both spend the same
+    token.
+    """
+
+    def __init__(self, collection, retries=5):
+        self.collection = collection
+        self.retries = retries
+
+    def take(self, user_id, rate, burst):
+        interval = 1 / rate
+        for _ in range(self.retries):
+            now = time.time()
+            bucket = self.collection.find_one({"_id": user_id})
+            full_at = max(bucket["full_at"], now) if bucket else now
+            wait = full_at + interval - now - burst * interval
+            if wait > 0:
+                return wait
+            if bucket is None:
+                try:
+                    self.collection.insert_one({"_id": user_id, "full_at": full_at + interval})
+                    return 0
+                except DuplicateKeyError:
+                    continue
+            if self.collection.update_one({"_id": user_id, "full_at": bucket["full_at"]},
+                                          {"$set": {"full_at": full_at + interval}}).matched_count:
+                return 0
+        # Lost every race to other requests of the same user: they are well over any sensible rate
+        return interval
+
+class FairScheduler:
+    """Decide which queued analysis jobs run next.
+
+    Jobs are served strictly by priority class. Within a class, users share
+    capacity by weighted fair queuing: each job is tagged with a virtual
+    finish time that grows with the number of jobs its user already has
+    queued, divided by the user's weight, so someone submitting hundreds of
+    jobs cannot delay another user's single job behind all of them.
+    Interactive and bulk submissions also draw from a per-user token bucket
+    in ``quota_store``; the default keeps buckets per process, so use a
+    :class:`MongoQuotaStore` when several processes serve the same users.
+    """
+
+    def __init__(self, rate_per_minute=20, burst=10, user_weights=None, quota_store=None):
+        self.rate = rate_per_minute / 60
+        self.burst = burst
+        self.user_weights = dict(user_weights or {})
+        self.quota_store = quota_store or InMemoryQuotaStore()
+        self._lock = threading.Lock()
+        # Per class: heap of (finish_tag, sequence, start_tag, job_id, user_id, enqueued_at)
+        self._queues = {}
+        self._virtual_time = {}
+        self._last_finish = {}
+        self._known = set()
+        self._sequence = 0
+        self._user_stats = {}
+        self._class_stats = {}
+
+    def admit(self, user_id, priority):
+        """Charge ``user_id`` one token; raises QuotaExceededError when none is left."""
+        if priority <= PRIORITY_BACKGROUND:
+            return
+        wait = self.quota_store.take(user_id, self.rate, self.burst)
+        if wait:
+            with self._lock:
+                self._stats_for(user_id)["throttled"] += 1
+            raise QuotaExceededError(max(1, round(wait)))
+
+    def push(self, job_id, user_id, priority, enqueued_at=None):
+        """Queue a job id; ids already queued are ignored."""
+        with self._lock:
+            if job_id in self._known:
+                return
+            self._known.add(job_id)
+            weight = self.user_weights.get(user_id, 1)
+            start = max(self._virtual_time.get(priority, 0), self._last_finish.get((priority, user_id), 0))
+            finish = start + 1 / weight
+            self._last_finish[(priority, user_id)] = finish
+            self._sequence += 1
+            heapq.heappush(self._queues.setdefault(priority, []), (
+                finish, self._sequence, start, job_id, user_id, enqueued_at or datetime.datetime.utcnow()
+            ))
+            self._stats_for(user_id)["queued"] += 1
+
+    def pop(self, limit=1, min_priority=PRIORITY_BACKGROUND):
+        """Return up to ``limit`` job ids from the highest non-empty class at or above ``min_priority``."""
+        with self._lock:
+            for priority in sorted(self._queues, reverse=True):
+                queue = self._queues[priority]
+                if priority < min_priority or not queue:
+                    continue
+                job_ids = []
+                now = datetime.datetime.utcnow()
+                while queue and len(job_ids) < limit:
+                    _, _, start, job_id, user_id, enqueued_at = heapq.heappop(queue)
+                    self._virtual_time[priority] = start
+                    self._known.discard(job_id)
+                    self._record_wait(user_id, priority, (now - enqueued_at).total_seconds())
+                    job_ids.append(job_id)
+                return job_ids
+            return []
+
+    def _stats_for(self, user_id):
+        return self._user_stats.setdefault(user_id, _empty_stats())
+
+    def _record_wait(self, user_id, priority, wait):
+        for stats in (self._stats_for(user_id), self._class_stats.setdefault(priority, _empty_stats())):
+            stats["dispatched"] += 1
+            stats["total_wait"] += wait
+            stats["max_wait"] = max(stats["max_wait"], wait)
+        self._user_stats[user_id]["queued"] -= 1
+
+    @staticmethod
+    def _summarize(stats):
+        return {
+            "queued": stats["queued"],
+            "dispatched": stats["dispatched"],
+            "throttled": stats["throttled"],
+            "avg_wait": round(stats["total_wait"] / stats["dispatched"], 3) if stats["dispatched"] else None,
+            "max_wait": round(stats["max_wait"], 3)
+        }
+
+    def stats(self):
+        """Return queue wait times per user and per priority class."""
+        with self._lock:
+            per_class = {}
+            for priority, queue in self._queues.items():
+                summary = self._summarize(self._class_stats.get(priority, _empty_stats()))
+                summary["queued"] = len(queue)
+                per_class[priority] = summary
+            return {
+                "per_user": {str(user_id): self._summarize(stats) for user_id, stats in self._user_stats.items()},
+                "per_class": per_class
+            }
@@ -0,0 +1,203 @@
+import datetime
+import logging
+from bson import ObjectId
+from pymongo.errors import OperationFailure
+
+logger = logging.getLogger(__name__)
+
+# Every index the application's queries rely on, by collection
+REQUIRED_INDEXES = [
+    # History, dashboard, compare and per-user stats: one user's analyses, newest first, paged by
+    # (created_at, _id) keyset. Supersedes the earlier user_recent (user_id, created_at) index
+    {"collection": "ingredient_analyses", "keys": [("user_id", 1), ("created_at", -1), ("_id", -1)], "name": "user_keyset"},
+    # Similarity index warm-up and admin views: all analyses, newest first; supersedes recent (created_at)
+    {"collection": "ingredient_analyses", "keys": [("created_at", -1), ("_id", -1)], "name": "recent_keyset"},
+    # Re-analysis of provisional results; partial, since almost no analysis stays provisional
+    {"collection": "ingredient_analyses", "keys": [("provisional", 1), ("created_at", 1)], "name": "provisional",
+     "options": {"partialFilterExpression": {"provisional": True}}},
+    # Per-user daily stats buckets, read by date range
+    {"collection": "user_daily_stats", "keys": [("user_id", 1), ("day", 1)], "name": "user_day"},
+    {"collection": "users", "keys": [("username", 1)], "name": "username", "options": {"unique": True}},
+    # Unique among users that have an email at all
+    {"collection": "users", "keys": [("email", 1)], "name": "email",
+     "options": {"unique": True, "partialFilterExpression": {"email": {"$type": "string"}}}},
+    # Admin user list: most recently active users first
+    {"collection": "users", "keys": [("last_active", -1)], "name": "last_active"},
+    # Per-day active user markers are only needed for the day they count
+    {"collection": "active_users", "keys": [("created_at", 1)], "name": "expire",
+     "options": {"expireAfterSeconds": 2 * 24 * 3600}},
+    # Finished analysis jobs are only polled for their result shortly after they finish
+    {"collection": "analysis_jobs", "keys": [("finished_at", 1)], "name": "expire",
+     "options": {"expireAfterSeconds": 24 * 3600}},
+    {"collection": "admins", "keys": [("username", 1)], "name": "username", "options": {"unique": True}},
+    {"collection": "admins", "keys": [("email", 1)], "name": "email",
+     "options": {"unique": True, "partialFilterExpression": {"email": {"$type": "string"}}}},
+]
+
+# Indexes earlier versions created that a required index now replaces; dropped by
+# IndexManager.drop_superseded once the replacement exists, so writes stop maintaining them
+SUPERSEDED_INDEXES = [
+    {"collection": "ingredient_analyses", "keys": [("user_id", 1), ("created_at", -1)], "name": "user_recent",
+     "replaced_by": "user_keyset"},
+    {"collection": "ingredient_analyses", "keys": [("created_at", -1)], "name": "recent",
+     "replaced_by": "recent_keyset"},
+]
+
+# Representative queries checked with explain(); the filter values only need the right types
+COVERED_QUERIES = [
+    {"name": "history", "collection": "ingredient_analyses",
+     "filter": {"user_id": None}, "sort": [("created_at", -1), ("_id", -1)], "limit": 11},
+    {"name": "history page", "collection": "ingredient_analyses",
+     "filter": {"user_id": None, "created_at": {"$lte": datetime.datetime(1970, 1, 1)},
+                "$or": [{"created_at": {"$lt": datetime.datetime(1970, 1, 1)}}, {"_id": {"$lt": ObjectId("0" * 24)}}]},
+     "sort": [("created_at", -1), ("_id", -1)], "limit": 11},
+    {"name": "recent analyses", "collection": "ingredient_analyses",
+     "filter": {}, "sort": [("created_at", -1), ("_id", -1)], "limit": 100},
+    # Admin overview pages after the first
+    {"name": "admin page", "collection": "ingredient_analyses",
+     "filter": {"created_at": {"$lte": datetime.datetime(1970, 1, 1)},
+                "$or": [{"created_at": {"$lt": datetime.datetime(1970, 1, 1)}}, {"_id": {"$lt": ObjectId("0" * 24)}}]},
+     "sort": [("created_at", -1), ("_id", -1)], "limit": 21},
+    {"name": "provisional analyses", "collection": "ingredient_analyses",
+     "filter": {"provisional": True}, "sort": [("created_at", 1)], "limit": 100},
+    {"name": "login", "collection": "users", "filter": {"username": ""}, "sort": None, "limit": 1},
+    {"name": "admin users", "collection": "users", "filter": {}, "sort": [("last_active", -1)], "limit": 50},
+]
+
+def _stages(plan):
+    """Yield every stage of an explain() plan tree, whatever the server version nests it in."""
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            yield plan
+        for value in plan.values():
+            yield from _stages(value)
+    elif isinstance(plan, list):
+        for value in plan:
+            yield from _stages(value)
+
+class IndexManager:
+    """Declare, create and verify the indexes the application's queries need.
+
+    :meth:`ensure` creates missing indexes and is safe to run at every
+    startup: an index that already exists with the same keys is left alone,
+    and one that cannot be built (e.g. a unique index over duplicate data)
+    is reported instead of stopping the app. :meth:`check_coverage` runs
+    ``explain()`` on the application's main queries and reports any that
+    scan the whole collection or sort in memory. :meth:`drop_superseded`
+    removes indexes a required one has replaced; it is never run at
+    startup, only when asked for, e.g. by ``scripts/check_indexes.py``.
+    """
+
+    def __init__(self, db, indexes=None, queries=None, superseded=None):
+        self.db = db
+        self.indexes = REQUIRED_INDEXES if indexes is None else indexes
+        self.queries = COVERED_QUERIES if queries is None else queries
+        self.superseded = SUPERSEDED_INDEXES if superseded is None else superseded
+        self.last_ensure = []
+        self.last_coverage = []
+
+    def ensure(self):
+        """Create every declared index that is missing; returns one status entry per index."""
+        report = []
+        for spec in self.indexes:
+            collection = self.db[spec["collection"]]
+            keys = [tuple(key) for key in spec["keys"]]
+            entry = {"collection": spec["collection"], "name": spec["name"], "keys": keys}
+            try:
+                existing = collection.index_information()
+                same_keys = [name for name, info in existing.items() if [tuple(k) for k in info["key"]] == keys]
+                if same_keys:
+                    entry["status"] = "present"
+                    entry["name"] = same_keys[0]
+                elif spec["name"] in existing:
+                    # Never drop an index automatically; someone has to decide
+                    entry["status"] = "conflict"
+                    entry["error"] = f"An index named {spec['name']} exists with other keys"
+                else:
+                    collection.create_index(keys, name=spec["name"], **spec.get("options", {}))
+                    entry["status"] = "created"
+            except OperationFailure as e:
+                entry["status"] = "failed"
+                entry["error"] = str(e)
+            if entry["status"] in ("conflict", "failed"):
+                logger.error(f"Index {spec['collection']}.{spec['name']} not available: {entry['error']}")
+            elif entry["status"] == "created":
+                logger.info(f"Created index {spec['collection']}.{spec['name']}")
+            report.append(entry)
+        self.last_ensure = report
+        return report
+
+    def drop_superseded(self):
+        """Drop every superseded index whose replacement exists; returns one status entry per index.
+
+        An index is only dropped when both its name and its keys match the
+        declaration, so an unrelated index that reuses the name is kept.
+        """
+        required = {(spec["collection"], spec["name"]): spec for spec in self.indexes}
+        report = []
+        for spec in self.superseded:
+            collection = self.db[spec["collection"]]
+            keys = [tuple(key) for key in spec["keys"]]
+            entry = {"collection": spec["collection"], "name": spec["name"], "keys": keys}
+            try:
+                existing = collection.index_information()
+                replacement = required[(spec["collection"], spec["replaced_by"])]
+                replacement_keys = [tuple(key) for key in replacement["keys"]]
+                if spec["name"] not in existing:
+                    entry["status"] = "absent"
+                elif [tuple(key) for key in existing[spec["name"]]["key"]] != keys:
+                    entry["status"] = "conflict"
+                    entry["error"] = f"An index named {spec['name']} exists with other keys"
+                elif not any([tuple(k) for k in info["key"]] == replacement_keys for info in existing.values()):
+                    # Queries would fall back to collection scans until the replacement is built
+                    entry["status"] = "kept"
+                    entry["error"] = f"Replacement {spec['replaced_by']} does not exist yet"
+                else:
+                    collection.drop_index(spec["name"])
+                    entry["status"] = "dropped"
+            except OperationFailure as e:
+                entry["status"] = "failed"
+                entry["error"] = str(e)
+            if entry["status"] in ("conflict", "kept", "failed"):
+                logger.warning(f"Superseded index {spec['collection']}.{spec['name']} not dropped: {entry['error']}")
+            elif entry["status"] == "dropped":
+                logger.info(f"Dropped superseded index {spec['collection']}.{spec['name']}")
+            report.append(entry)
+        return report
+
+    def explain(self, query):
+        """Summarize how the server would run one of :data:`COVERED_QUERIES`."""
+        cursor = self.db[query["collection"]].find(query["filter"])
+        if query.get("sort"):
+            cursor = cursor.sort(query["sort"])
+        if query.get("limit"):
+            cursor = cursor.limit(query["limit"])
+        plan = cursor.explain().get("queryPlanner", {}).get("winningPlan", {})
+        stages = [stage["stage"] for stage in _stages(plan)]
+        index_names = [stage["indexName"] for stage in _stages(plan) if "indexName" in stage]
+        problems = []
+        if "COLLSCAN" in stages:
+            problems.append("collection scan")
+        if "SORT" in stages:
+            problems.append("in-memory sort")
+        return {"query": query["name"], "collection": query["collection"], "indexes": index_names,
+                "stages": stages, "covered": not problems, "problems": problems}
+
+    def check_coverage(self):
+        """Explain every declared query; returns one entry per query, flagging those without index coverage."""
+        report = []
+        for query in self.queries:
+            try:
+                entry = self.explain(query)
+            except (OperationFailure, NotImplementedError, AttributeError) as e:
+                # In-memory test databases such as mongomock have no explain()
+                entry = {"query": query["name"], "collection": query["collection"], "covered": None,
+                         "problems": [f"explain unavailable: {str(e) or type(e).__name__}"]}
+            if entry["covered"] is False:
+                logger.warning(f"Query '{query['name']}' lacks index coverage: {', '.join(entry['problems'])}")
+            report.append(entry)
+        self.last_coverage = report
+        return report
+
+    def report(self):
+        return {"indexes": self.last_ensure, "coverage": self.last_coverage}
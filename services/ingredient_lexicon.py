@@ -0,0 +1,329 @@
+import re
+import threading
+from collections import deque
+from .ingredient_rules import CATEGORY_KEYWORDS, classify_ingredient
+from .ingredient_parser import parse_ingredients, flatten_ingredients
+
+# Canonical ingredient names with their synonyms, E-numbers and common
+# misspellings. Only names for the same ingredient belong together: a more
+# specific product (glucose -> glucose syrup) or a related one (canola ->
+# rapeseed) is an entry of its own. Every keyword of the local rules is added as well, so the
+# lexicon knows at least what the rules can classify
+INGREDIENT_LEXICON = {
+    "sugar": ["sucrose", "white sugar", "granulated sugar"],
+    "cane sugar": ["evaporated cane juice", "cane juice"],
+    "salt": ["sodium chloride", "table salt"],
+    "water": ["filtered water", "purified water", "watter"],
+    "wheat flour": ["enriched wheat flour", "wheat four", "wheatflour"],
+    "whole wheat flour": ["whole grain wheat flour", "wholemeal flour"],
+    "skimmed milk powder": ["skim milk powder", "nonfat dry milk"],
+    "skimmed milk": ["skim milk"],
+    "whey": ["whey powder", "sweet whey"],
+    "whey protein isolate": ["whey isolate"],
+    "milk protein isolate": [],
+    "milk protein": [],
+    "soy protein isolate": ["isolated soy protein"],
+    "high fructose corn syrup": ["hfcs", "glucose-fructose syrup", "glucose fructose syrup"],
+    "glucose syrup": ["liquid glucose"],
+    "glucose": [],
+    "maltodextrin": ["malto dextrin", "maltodextrine"],
+    "modified starch": ["modified corn starch", "modified food starch", "e1422", "e1442"],
+    "palm oil": ["palm fat", "vegetable oil (palm)"],
+    "palm kernel oil": ["palm kernel fat"],
+    "sunflower oil": ["sunflower seed oil"],
+    "rapeseed oil": [],
+    "canola oil": [],
+    "cocoa butter": ["cacao butter"],
+    "cocoa powder": ["cacao powder"],
+    "cocoa": ["cacao"],
+    "soy lecithin": ["soya lecithin", "e322"],
+    "sunflower lecithin": [],
+    "mono- and diglycerides": ["mono and diglycerides", "mono- and diglycerides of fatty acids", "e471"],
+    "citric acid": ["e330", "citric acld"],
+    "ascorbic acid": ["vitamin c", "e300"],
+    "malic acid": ["e296"],
+    "lactic acid": ["e270"],
+    "phosphoric acid": ["e338"],
+    "sodium bicarbonate": ["baking soda", "bicarbonate of soda", "e500"],
+    "ammonium bicarbonate": ["e503"],
+    "disodium phosphate": ["e339"],
+    "sodium benzoate": ["e211", "benzoate of soda"],
+    "potassium sorbate": ["e202", "potasium sorbate"],
+    "calcium propionate": ["e282"],
+    "sodium nitrite": ["e250"],
+    "sodium metabisulfite": ["sodium metabisulphite", "e223"],
+    "sulfur dioxide": ["sulphur dioxide", "e220"],
+    "bha": ["butylated hydroxyanisole", "e320"],
+    "bht": ["butylated hydroxytoluene", "e321"],
+    "tbhq": ["tert-butylhydroquinone", "e319"],
+    "tocopherols": ["mixed tocopherols", "vitamin e", "e306"],
+    "xanthan gum": ["xanthan", "e415"],
+    "guar gum": ["e412"],
+    "gellan gum": ["e418"],
+    "carrageenan": ["e407", "carageenan"],
+    "gum arabic": ["acacia gum", "e414"],
+    "cellulose gum": ["carboxymethylcellulose", "e466"],
+    "pectin": ["e440"],
+    "gelatin": ["gelatine"],
+    "monosodium glutamate": ["msg", "e621"],
+    "yeast extract": ["autolyzed yeast extract"],
+    "natural flavor": ["natural flavour", "natural flavors", "natural flavours", "natural flavoring"],
+    "artificial flavor": ["artificial flavour", "artificial flavors", "artificial flavours"],
+    "aspartame": ["e951"],
+    "sucralose": ["e955"],
+    "acesulfame potassium": ["acesulfame k", "ace-k", "e950"],
+    "saccharin": ["e954"],
+    "steviol glycosides": ["stevia", "stevia extract", "e960"],
+    "erythritol": ["e968"],
+    "sorbitol": ["e420"],
+    "xylitol": ["e967"],
+    "maltitol": ["e965"],
+    "caramel color": ["caramel colour", "caramel coloring", "e150a", "e150d"],
+    "red 40": ["allura red", "allura red ac", "fd&c red 40", "red no. 40", "e129"],
+    "red 3": ["erythrosine", "fd&c red 3", "e127"],
+    "yellow 5": ["tartrazine", "fd&c yellow 5", "e102"],
+    "yellow 6": ["sunset yellow", "sunset yellow fcf", "fd&c yellow 6", "e110"],
+    "blue 1": ["brilliant blue", "brilliant blue fcf", "fd&c blue 1", "e133"],
+    "blue 2": ["indigo carmine", "fd&c blue 2", "e132"],
+    "titanium dioxide": ["e171"],
+    "carmine": ["cochineal", "e120"],
+    "ponceau 4r": ["ponceau", "e124"],
+    "carmoisine": ["azorubine", "e122"],
+    "hydrogenated vegetable oil": ["partially hydrogenated vegetable oil", "hydrogenated oil"],
+    "dextrose": ["corn sugar"],
+    "invert sugar": ["invert syrup", "inverted sugar syrup"],
+    "vanilla extract": ["pure vanilla extract"],
+    "vanilla": [],
+    "vanillin": [],
+    "sea salt": [],
+    "honey": [],
+    "eggs": ["egg", "whole egg", "egg powder"],
+    "butter": ["butterfat"],
+    "cream": ["fresh cream"],
+    "milk": ["whole milk", "fresh milk"],
+    "rolled oats": ["oat flakes"],
+    "oats": ["whole grain oats", "oat"],
+}
+
+# Single-character confusions Tesseract makes most often, used to generate
+# misspelled variants of every lexicon entry
+OCR_CONFUSIONS = [("m", "rn"), ("l", "1"), ("i", "l"), ("o", "0"), ("e", "c"), ("s", "5")]
+
+_WORD_CHAR_RE = re.compile(r'\w')
+_WHITESPACE_RE = re.compile(r'\s+')
+_CONNECTOR_RE = re.compile(r'\band\b|&')
+_E_NUMBER_RE = re.compile(r'^e(\d{3,4}[a-z]?)$')
+
+def _ocr_variants(pattern):
+    """Spellings of ``pattern`` with a single common OCR confusion applied."""
+    variants = set()
+    for right, wrong in OCR_CONFUSIONS:
+        start = pattern.find(right)
+        while start != -1:
+            variants.add(pattern[:start] + wrong + pattern[start + len(right):])
+            start = pattern.find(right, start + 1)
+    variants.discard(pattern)
+    return variants
+
+class Mention:
+    """A lexicon entry found in a text, between ``start`` and ``end`` of the original string."""
+
+    __slots__ = ("start", "end", "text", "canonical", "category")
+
+    def __init__(self, start, end, text, canonical, category):
+        self.start = start
+        self.end = end
+        self.text = text
+        self.canonical = canonical
+        self.category = category
+
+    def __repr__(self):
+        return f"Mention({self.start}, {self.end}, {self.text!r} -> {self.canonical!r})"
+
+class AhoCorasick:
+    """Multi-pattern string automaton: finds every occurrence of every pattern in one scan.
+
+    States are dicts of character transitions with failure links computed
+    breadth first, so scanning is linear in the text length plus the number
+    of matches, however many patterns there are.
+    """
+
+    def __init__(self):
+        self._goto = [{}]
+        self._fail = [0]
+        # Patterns ending at each state, as (length, value); includes those reached by failure links
+        self._output = [[]]
+
+    def add(self, pattern, value):
+        state = 0
+        for char in pattern:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+            state = next_state
+        self._output[state].append((len(pattern), value))
+
+    def build(self):
+        """Compute failure links; call once after the last :meth:`add`."""
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                target = self._goto[fail].get(char, 0)
+                # Children of the root fail back to the root
+                self._fail[next_state] = target if target != next_state else 0
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+        return self
+
+    def iter(self, text):
+        """Yield ``(start, end, value)`` for every pattern occurrence in ``text``."""
+        goto, fail, output = self._goto, self._fail, self._output
+        state = 0
+        for end, char in enumerate(text, start=1):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for length, value in output[state]:
+                yield end - length, end, value
+
+class LexiconMatcher:
+    """Find known ingredients in raw OCR text and rebuild a clean ingredient list.
+
+    The text is lowercased and whitespace runs collapsed before scanning, and
+    mention offsets are mapped back to the original string. Matches must
+    start and end on word boundaries; overlapping matches resolve to the
+    leftmost, then longest, so "sodium benzoate" wins over "benzoate".
+    """
+
+    def __init__(self, lexicon=None, ocr_variants=True):
+        lexicon = INGREDIENT_LEXICON if lexicon is None else lexicon
+        entries = {}
+        for canonical, synonyms in lexicon.items():
+            entries[canonical] = canonical
+            for synonym in synonyms:
+                entries.setdefault(synonym, canonical)
+        if lexicon is INGREDIENT_LEXICON:
+            for _, keywords in CATEGORY_KEYWORDS:
+                for keyword in keywords:
+                    entries.setdefault(keyword, keyword)
+        for pattern, canonical in list(entries.items()):
+            match = _E_NUMBER_RE.match(pattern)
+            if match:
+                # Labels print E-numbers as "E211", "E 211" or "E-211"
+                entries.setdefault(f"e {match.group(1)}", canonical)
+                entries.setdefault(f"e-{match.group(1)}", canonical)
+        if ocr_variants:
+            # Misspellings never shadow a real entry; short words would match too much noise
+            for pattern, canonical in list(entries.items()):
+                if len(pattern) >= 5:
+                    for variant in _ocr_variants(pattern):
+                        entries.setdefault(variant, canonical)
+
+        self.automaton = AhoCorasick()
+        categories = {}
+        for pattern, canonical in entries.items():
+            if canonical not in categories:
+                categories[canonical] = classify_ingredient(canonical)
+            self.automaton.add(_WHITESPACE_RE.sub(" ", pattern.lower()), (canonical, categories[canonical]))
+        self.automaton.build()
+        self.patterns = len(entries)
+        self.stats = {"texts": 0, "mentions": 0, "split_items": 0, "dropped_items": 0}
+
+    def find(self, text):
+        """Return the non-overlapping lexicon mentions in ``text``, in order."""
+        # Lowercase and collapse whitespace, remembering where each character came from
+        normalized = []
+        offsets = []
+        previous_space = True
+        for i, char in enumerate(text):
+            if char.isspace():
+                if previous_space:
+                    continue
+                char = " "
+                previous_space = True
+            else:
+                previous_space = False
+            normalized.append(char.lower())
+            offsets.append(i)
+        normalized = "".join(normalized)
+        offsets.append(len(text))
+
+        candidates = []
+        for start, end, value in self.automaton.iter(normalized):
+            if start > 0 and _WORD_CHAR_RE.match(normalized[start - 1]):
+                continue
+            if end < len(normalized) and _WORD_CHAR_RE.match(normalized[end]):
+                continue
+            candidates.append((start, -end, value))
+        candidates.sort()
+
+        mentions = []
+        covered = 0
+        for start, negative_end, (canonical, category) in candidates:
+            end = -negative_end
+            if start < covered:
+                continue
+            original_start, original_end = offsets[start], offsets[end - 1] + 1
+            mentions.append(Mention(original_start, original_end, text[original_start:original_end], canonical, category))
+            covered = end
+        return mentions
+
+    def extract(self, text):
+        """Return the ingredient names of an OCR text, cleaned up with the lexicon.
+
+        The label is parsed as usual, then each item is checked against the
+        lexicon: an item that is exactly one known ingredient becomes its
+        canonical name, an item made of several known ingredients with
+        nothing else in between (commas lost by OCR) is split into them, and
+        an unknown item is kept only if it reads like words rather than OCR
+        debris. Items that name a known ingredient with extra words, such as
+        "fractionated palm oil", are kept as written.
+        """
+        self.stats["texts"] += 1
+        names = []
+        for item in flatten_ingredients(parse_ingredients(text)):
+            mentions = self.find(item)
+            self.stats["mentions"] += len(mentions)
+            if mentions:
+                leftover = item
+                for mention in reversed(mentions):
+                    leftover = leftover[:mention.start] + leftover[mention.end:]
+                if not any(char.isalnum() for char in _CONNECTOR_RE.sub("", leftover)):
+                    if len(mentions) > 1:
+                        self.stats["split_items"] += 1
+                    names.extend(mention.canonical for mention in mentions)
+                    continue
+                names.append(item)
+            elif _looks_like_words(item):
+                names.append(item)
+            else:
+                self.stats["dropped_items"] += 1
+
+        seen = set()
+        return [name for name in names if not (name in seen or seen.add(name))]
+
+def _looks_like_words(item):
+    """True for text that could be an ingredient name: mostly letters, with a real word in it."""
+    letters = sum(char.isalpha() for char in item)
+    if letters < 0.7 * len(item.replace(" ", "")):
+        return False
+    return any(len(word) >= 3 and any(vowel in word for vowel in "aeiouy") for word in item.split())
+
+_default_matcher = None
+_default_matcher_lock = threading.Lock()
+
+def get_default_matcher():
+    """Return the process-wide matcher; building the automaton takes a moment, so it is done once."""
+    global _default_matcher
+    with _default_matcher_lock:
+        if _default_matcher is None:
+            _default_matcher = LexiconMatcher()
+        return _default_matcher
@@ -0,0 +1,177 @@
+import re
+
+# Everything that ends or nests an item; splitting on it with a capturing
+# group tokenizes the label in a single pass. A period only separates when
+# whitespace or the end follows, so "vitamin b.12" and "2.5%" stay whole
+_DELIMITER_RE = re.compile(r'([()\[\]{},;:]|\.(?=\s|$))')
+_PREFIX_RE = re.compile(r'^\s*(?:ingredients?\s*:|ingredients\b)\s*', re.IGNORECASE)
+_PERCENT_RE = re.compile(r'(\d+(?:\.\d+)?)\s*%')
+# Parenthetical remarks that describe an ingredient rather than list its components,
+# including how it was processed: "processed with alkali", "treated with enzymes"
+_QUALIFIER_RE = re.compile(
+    r'^(?:(?:to|for|as|added|used|an?|from|contains?|with|made)\b'
+    r'|[a-z]+ed\s+(?:with|in|by|using)\b'
+    r'|(?:preservatives?|colou?rs?|colou?ring|emulsifiers?|antioxidants?|thickeners?|stabili[sz]ers?|'
+    r'acidity regulators?|flavou?r(?:ing)?s?|sweeteners?)$)'
+)
+# "(contains soy lecithin)" lists components after the word "contains"
+_CONTAINS_RE = re.compile(r'^contains?\s+(?:(?:less than|or less)\s+)?(?:of\s+)?')
+_NOISE = str.maketrans({char: " " for char in '()[]{}*"'})
+_OPENERS = frozenset("([{")
+_CLOSERS = frozenset(")]}")
+
+def _clean(text):
+    # Most items have no percentage or markup, so skip those substitutions cheaply
+    if "%" in text:
+        text = _PERCENT_RE.sub(" ", text)
+    if "*" in text or '"' in text:
+        text = text.translate(_NOISE)
+    return " ".join(text.split()).strip(" .:-%")
+
+def canonicalize_ingredient(name):
+    """Lowercase, drop declared percentages and punctuation noise, collapse whitespace."""
+    return _clean(name.lower().translate(_NOISE))
+
+class Ingredient:
+    """One ingredient on a label, with the components listed in its parentheses.
+
+    ``position`` is the 1-based place among its siblings - labels list
+    ingredients by descending quantity - and ``percent`` is the declared
+    share, when the label gives one. Remarks such as "(for colour)" or
+    "(processed with alkali)" are kept in ``note`` instead of becoming
+    sub-ingredients; "(contains soy lecithin)" lists one.
+    """
+
+    __slots__ = ("name", "position", "percent", "note", "children")
+
+    def __init__(self, name, position, percent=None, note=None, children=None):
+        self.name = name
+        self.position = position
+        self.percent = percent
+        self.note = note
+        self.children = children or []
+
+    def walk(self):
+        """Yield this ingredient and then its sub-ingredients, depth first."""
+        yield self
+        for child in self.children:
+            yield from child.walk()
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "position": self.position,
+            "percent": self.percent,
+            "note": self.note,
+            "children": [child.to_dict() for child in self.children]
+        }
+
+    def __repr__(self):
+        return f"Ingredient({self.name!r}, position={self.position}, percent={self.percent}, children={self.children})"
+
+class _Frame:
+    """Items collected at one bracket depth while parsing."""
+
+    __slots__ = ("items", "text", "children", "percent", "note", "bare_percent")
+
+    def __init__(self):
+        self.items = []
+        # A percentage with no name, as in "(2%)"
+        self.bare_percent = None
+        self.text = ""
+        self.children = None
+        self.percent = None
+        self.note = None
+
+    def close_item(self):
+        raw = self.text
+        percent = self.percent
+        if percent is None and "%" in raw:
+            match = _PERCENT_RE.search(raw)
+            if match:
+                percent = float(match.group(1))
+        name = _clean(raw)
+        children = self.children
+        items = self.items
+        # Lowercased text has a letter exactly when upper-casing changes it
+        if len(name) >= 2 and name != name.upper():
+            items.append(Ingredient(name, len(items) + 1, percent, self.note, children))
+        elif children:
+            # "(Palm, Sunflower)" with no name of its own joins the enclosing list
+            for child in children:
+                child.position = len(items) + 1
+                items.append(child)
+        elif percent is not None:
+            self.bare_percent = percent
+        self.text = ""
+        self.children = None
+        self.percent = None
+        self.note = None
+
+    def attach(self, inner):
+        """Fold a closed bracket into the item being read."""
+        items = inner.items
+        if items and items[0].name.startswith("contain"):
+            items[0].name = _CONTAINS_RE.sub("", items[0].name)
+        if not items and inner.bare_percent is not None:
+            self.percent = inner.bare_percent
+        elif len(items) == 1 and not items[0].children:
+            only = items[0]
+            if _QUALIFIER_RE.match(only.name):
+                self.note = only.name
+                if only.percent is not None and self.percent is None:
+                    self.percent = only.percent
+                return
+        if self.children is None:
+            self.children = []
+        self.children.extend(items)
+
+def parse_ingredients(text):
+    """Parse a label's ingredient list into a tree of :class:`Ingredient`.
+
+    ``"Protein Blend (Whey Protein Isolate, Milk Protein Isolate), Sugar 12%"``
+    gives a "protein blend" with two sub-ingredients followed by "sugar"
+    declared at 12%. Text before a colon ("Ingredients:", "Contains 2% or
+    less of:") is a heading and dropped; brackets OCR left unclosed are
+    closed at the end of the text.
+    """
+    if not text:
+        return []
+    pieces = _DELIMITER_RE.split(_PREFIX_RE.sub("", text).lower())
+    stack = [_Frame()]
+    stack[0].text = pieces[0]
+    # Delimiters sit at odd indexes, each followed by the text up to the next one
+    for i in range(1, len(pieces), 2):
+        delimiter = pieces[i]
+        frame = stack[-1]
+        if delimiter in _OPENERS:
+            frame = _Frame()
+            stack.append(frame)
+        elif delimiter in _CLOSERS:
+            if len(stack) > 1:
+                frame.close_item()
+                stack.pop()
+                stack[-1].attach(frame)
+                frame = stack[-1]
+        elif delimiter == ":":
+            # A heading such as "contains 2% or less of:"
+            frame.text = ""
+            frame.percent = None
+        else:
+            frame.close_item()
+        frame.text += pieces[i + 1]
+    while len(stack) > 1:
+        frame = stack.pop()
+        frame.close_item()
+        stack[-1].attach(frame)
+    stack[0].close_item()
+    return stack[0].items
+
+def flatten_ingredients(tree):
+    """Every ingredient name in the tree, parents before their sub-ingredients, in label order."""
+    names = []
+    for ingredient in tree:
+        names.append(ingredient.name)
+        if ingredient.children:
+            names.extend(flatten_ingredients(ingredient.children))
+    return names
@@ -0,0 +1,146 @@
+import sys
+import threading
+import logging
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from .ingredient_parser import canonicalize_ingredient
+
+logger = logging.getLogger(__name__)
+
+class IngredientRegistry:
+    """Map canonical ingredient names to compact integer ids, and back.
+
+    Names are canonicalized and interned, so every spelling of an
+    ingredient resolves to one id and one shared string. Ids are handed out
+    in order of first appearance. Once bound to a database, ids of stored
+    analyses are kept in the ``ingredients`` collection and allocated from a
+    counter in ``counters``, so every process and every stored analysis
+    agrees on them; ids another process created are fetched the first time
+    they are seen. Only ``register`` writes there: ``id_for`` gives names
+    that were never stored a negative id local to this process, so lookups
+    of OCR junk and other rejected names cost no database writes.
+    """
+
+    def __init__(self, db=None):
+        self._lock = threading.Lock()
+        # Name to the id this process uses for it; never changes once handed out
+        self._ids = {}
+        # Name to its stored id, for names that are in the database
+        self._stored = {}
+        self._names = {}
+        self._next_local = 0
+        self.collection = None
+        self.counters = None
+        self.stats = {"lookups": 0, "local": 0, "created": 0, "fetched": 0}
+        if db is not None:
+            self.bind(db)
+
+    def bind(self, db):
+        """Persist ids in ``db`` and load the ones already there; returns how many were loaded."""
+        self.collection = db.ingredients
+        self.counters = db.counters
+        self.collection.create_index("name", unique=True)
+        loaded = 0
+        with self._lock:
+            for doc in self.collection.find({}, {"name": 1}):
+                self._remember_stored(doc["_id"], doc["name"])
+                loaded += 1
+        return loaded
+
+    def _remember(self, ingredient_id, name):
+        name = sys.intern(name)
+        self._ids.setdefault(name, ingredient_id)
+        self._names[ingredient_id] = name
+        return ingredient_id
+
+    def _remember_stored(self, ingredient_id, name):
+        self._stored[sys.intern(name)] = ingredient_id
+        return self._remember(ingredient_id, name)
+
+    def _allocate(self, name):
+        counter = self.counters.find_one_and_update(
+            {"_id": "ingredients"},
+            {"$inc": {"seq": 1}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        try:
+            self.collection.insert_one({"_id": counter["seq"], "name": name})
+            return self._remember_stored(counter["seq"], name)
+        except DuplicateKeyError:
+            # Another process registered the name first; its id wins
+            return self._remember_stored(self.collection.find_one({"name": name})["_id"], name)
+
+    def id_for(self, name):
+        """Return the id this process uses for ``name``; None for names that canonicalize to nothing.
+
+        New names get an id without touching the database: a negative local
+        one when bound, since only ``register`` may allocate stored ids.
+        """
+        name = canonicalize_ingredient(name)
+        if not name:
+            return None
+        with self._lock:
+            self.stats["lookups"] += 1
+            ingredient_id = self._ids.get(name)
+            if ingredient_id is None:
+                if self.collection is None:
+                    ingredient_id = len(self._names) + 1
+                else:
+                    self._next_local -= 1
+                    ingredient_id = self._next_local
+                self._remember(ingredient_id, name)
+                self.stats["local"] += 1
+            return ingredient_id
+
+    def register(self, name):
+        """Return the stored id of ``name``, storing it if it is new; None for names that canonicalize to nothing.
+
+        Called for ingredients of analyses that are saved, so only accepted names reach the database.
+        """
+        if self.collection is None:
+            return self.id_for(name)
+        name = canonicalize_ingredient(name)
+        if not name:
+            return None
+        with self._lock:
+            ingredient_id = self._stored.get(name)
+            if ingredient_id is None:
+                ingredient_id = self._allocate(name)
+                self.stats["created"] += 1
+            return ingredient_id
+
+    def ids_for(self, names):
+        return [self.id_for(name) for name in names]
+
+    def key(self, names):
+        """Hashable key for an ingredient list: the ids in label order."""
+        return tuple(self.ids_for(names))
+
+    def name(self, ingredient_id):
+        """Return the canonical name of an id, or None if it is unknown."""
+        name = self._names.get(ingredient_id)
+        if name is None and self.collection is not None:
+            doc = self.collection.find_one({"_id": ingredient_id})
+            if doc is not None:
+                with self._lock:
+                    self.stats["fetched"] += 1
+                    name = self._names[self._remember_stored(doc["_id"], doc["name"])]
+        return name
+
+    def names(self, ingredient_ids):
+        return [self.name(ingredient_id) for ingredient_id in ingredient_ids]
+
+    def __len__(self):
+        return len(self._names)
+
+_default_registry = None
+_default_registry_lock = threading.Lock()
+
+def get_default_registry():
+    """Return the process-wide registry shared by the analysis service and the models."""
+    global _default_registry
+    with _default_registry_lock:
+        if _default_registry is None:
+            _default_registry = IngredientRegistry()
+        return _default_registry
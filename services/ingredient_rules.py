@@ -0,0 +1,73 @@
+import re
+
+# Keyword rules checked in order, so more specific categories win
+# (e.g. "caramel color" is a color even though caramel alone is not)
+CATEGORY_KEYWORDS = [
+    ("Artificial Colors", [
+        "red 3", "red 40", "yellow 5", "yellow 6", "blue 1", "blue 2", "green 3",
+        "tartrazine", "allura red", "sunset yellow", "brilliant blue", "erythrosine",
+        "ponceau", "carmoisine", "caramel color", "caramel colour", "artificial color",
+        "artificial colour", "fd&c", "titanium dioxide"
+    ]),
+    ("Preservatives", [
+        "benzoate", "benzoic acid", "sorbate", "sorbic acid", "propionate", "nitrite",
+        "nitrate", "sulfite", "sulphite", "metabisulfite", "sulfur dioxide", "bha", "bht",
+        "tbhq", "natamycin", "nisin", "edta", "preservative"
+    ]),
+    ("Highly Processed", [
+        "high fructose corn syrup", "corn syrup", "glucose syrup", "hydrogenated",
+        "interesterified", "modified starch", "modified corn starch", "modified food starch",
+        "maltodextrin", "protein isolate", "soy protein concentrate", "dextrose",
+        "invert sugar", "soluble corn fiber", "shortening", "margarine", "palm oil",
+        "palm kernel oil", "textured vegetable protein", "hydrolyzed"
+    ]),
+    ("Additives", [
+        "emulsifier", "lecithin", "mono- and diglycerides", "monoglycerides", "diglycerides",
+        "carrageenan", "xanthan gum", "guar gum", "gellan gum", "cellulose gum", "gum arabic",
+        "phosphate", "citric acid", "ascorbic acid", "malic acid", "lactic acid", "phosphoric acid",
+        "natural flavor", "natural flavour", "artificial flavor", "artificial flavour",
+        "flavoring", "flavouring", "monosodium glutamate", "msg", "sucralose", "aspartame",
+        "acesulfame", "saccharin", "stevia", "erythritol", "sorbitol", "xylitol", "maltitol",
+        "stabilizer", "stabiliser", "thickener", "acidity regulator", "antioxidant",
+        "raising agent", "leavening", "baking soda", "sodium bicarbonate", "enzymes",
+        "caffeine", "pectin", "gelatin", "yeast extract"
+    ]),
+    ("Natural", [
+        "water", "salt", "sea salt", "sugar", "cane sugar", "brown sugar", "honey", "milk",
+        "cream", "butter", "egg", "eggs", "flour", "wheat", "oats", "rolled oats", "rice",
+        "corn", "potatoes", "potato", "tomatoes", "tomato", "almonds", "peanuts", "cashews",
+        "walnuts", "seeds", "cocoa", "cinnamon", "vanilla", "spices", "garlic", "onion",
+        "olive oil", "sunflower oil", "canola oil", "coconut oil", "vinegar", "yeast",
+        "fruit", "juice", "strawberries", "bananas", "apples", "carrots", "chicken", "beef",
+        "pork", "fish", "cultures", "yogurt", "cheese", "beans", "lentils", "chia"
+    ])
+]
+
+# E-number ranges by EU numbering convention
+E_NUMBER_RANGES = [
+    (100, 199, "Artificial Colors"),
+    (200, 299, "Preservatives"),
+    (300, 1599, "Additives")
+]
+
+_E_NUMBER_RE = re.compile(r'\be\s?-?(\d{3,4})[a-z]?\b')
+_CATEGORY_PATTERNS = [
+    (category, re.compile(r'\b(?:' + '|'.join(re.escape(k) for k in sorted(keywords, key=len, reverse=True)) + r')s?\b'))
+    for category, keywords in CATEGORY_KEYWORDS
+]
+
+def classify_ingredient(name):
+    """Return the category local rules assign to an ingredient, or None if no rule applies."""
+    text = name.lower()
+
+    match = _E_NUMBER_RE.search(text)
+    if match:
+        number = int(match.group(1))
+        for low, high, category in E_NUMBER_RANGES:
+            if low <= number <= high:
+                return category
+
+    for category, pattern in _CATEGORY_PATTERNS:
+        if pattern.search(text):
+            return category
+    return None
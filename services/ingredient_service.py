@@ -1,15 +1,36 @@
 import os
-import json
-import requests
+import copy
+import time
+import threading
+from collections import OrderedDict
+from functools import lru_cache
 from dotenv import load_dotenv
 import logging
-from functools import lru_cache
+from .single_flight import SingleFlight
+from .ollama_client import ModelClientError, ModelOverloadedError, get_default_client
+from .model_router import ModelRouter
+from .ingredient_rules import classify_ingredient
+from .scoring_engine import ScoringEngine
+from .circuit_breaker import CircuitBreaker
+from .config import Config
+from .schema import COMPACT_ANALYSIS_SCHEMA, BATCH_ANALYSIS_SCHEMA, SchemaError, compile_schema, parse_model_json
+from .prompt_builder import PromptBuilder, canonical_ingredients
+from .similarity_index import MinHashLSHIndex
+from .ingredient_registry import get_default_registry
+from .versioning import fingerprint
 
 logger = logging.getLogger(__name__)
 
 # Load environment variables
 load_dotenv()
 
+# Compiled once and shared by every request
+validate_analysis = compile_schema(COMPACT_ANALYSIS_SCHEMA)
+validate_batch_analysis = compile_schema(BATCH_ANALYSIS_SCHEMA)
+
+class ModelUnavailableError(ValueError):
+    """Raised when the model cannot be reached or its circuit is open."""
+
 class IngredientService:
     def __init__(self):
         self.categories = ["Natural", "Additives", "Preservatives", "Artificial Colors", "Highly Processed"]
@@ -20,74 +41,536 @@ class IngredientService:
             "Artificial Colors": "#F44336",  # Red
             "Highly Processed": "#9C27B0"  # Purple
         }
-        self.ollama_url = "http://localhost:11434/api/generate"
+        # Shared by every service instance so the concurrency limit is global
+        self.client = get_default_client()
+        # Small model first, larger models only when its answer fails the checks
+        self.router = ModelRouter(Config.OLLAMA_MODELS)
+        # Deduplicates identical analyses that are running at the same time
+        self._inflight = SingleFlight()
+        # Most recent model results by (ingredient ids, version key)
+        self._results = OrderedDict()
+        self._results_lock = threading.Lock()
+        self.cache_size = 100
+        # Number of products packed into one prompt by analyze_batch
+        self.batch_size = int(os.getenv('ANALYSIS_BATCH_SIZE', 5))
+        self._batch_stats = {"batches": 0, "batched_products": 0, "fallbacks": 0, "cache_hits": 0}
+        self._schema_stats = {"responses": 0, "repaired_responses": 0, "repaired_fields": 0}
+        # Scores and percentages are computed locally from the model's classifications
+        self.scoring_engine = ScoringEngine(position_decay=Config.SCORE_POSITION_DECAY)
+        # Numbered, deduplicated prompts kept within the token budget
+        self.prompt_builder = PromptBuilder(token_budget=Config.PROMPT_TOKEN_BUDGET)
+        self._token_stats = {
+            "requests": 0,
+            "estimated_prompt_tokens": 0,
+            "prompt_eval_tokens": 0,
+            "eval_tokens": 0,
+            "dropped_ingredients": 0
+        }
+        # Stored analyses of near-identical ingredient lists, reused instead of re-analyzed
+        self.similarity_index = MinHashLSHIndex(
+            threshold=Config.SIMILARITY_THRESHOLD,
+            num_perm=Config.SIMILARITY_NUM_PERM,
+            max_entries=Config.SIMILARITY_INDEX_SIZE
+        )
+        self._similarity_stats = {
+            "lookups": 0,
+            "full_reuse": 0,
+            "partial_reuse": 0,
+            "ingredients_reused": 0,
+            "ingredients_sent": 0,
+            "stale_matches": 0
+        }
+        # Versions of everything that shapes a result; stamped on every analysis so
+        # stored and cached results from another version are recognized as stale
+        self.fingerprints = {
+            "model": fingerprint([
+                # num_thread only affects speed, not answers
+                [model, {k: v for k, v in Config.model_options(model).items() if k != "num_thread"}]
+                for model in self.router.models
+            ]),
+            "prompt": self.prompt_builder.fingerprint(),
+            "scorer": self.scoring_engine.fingerprint()
+        }
+        # Compact integer ids for canonical ingredient names, shared with stored analyses
+        self.registry = get_default_registry()
+        # Ids never change within a process, so the key of a repeated text is parsed only once
+        self._canonical_keys = lru_cache(maxsize=1024)(
+            lambda ingredients_text: self.registry.key(canonical_ingredients(ingredients_text))
+        )
+        # Last known category of every ingredient the model has classified, by ingredient id
+        self._ingredient_categories = {}
+        # Serve provisional rule-based results while Ollama is failing or too slow
+        self.breaker = CircuitBreaker(
+            self._probe_model,
+            failure_rate=Config.BREAKER_FAILURE_RATE,
+            min_calls=Config.BREAKER_MIN_CALLS,
+            slow_call_seconds=Config.BREAKER_SLOW_CALL_SECONDS,
+            probe_interval=Config.BREAKER_PROBE_INTERVAL
+        )
+        self._provisional_stats = {"analyses": 0, "from_cache": 0, "from_rules": 0, "unclassified": 0}
         
-    def normalize_percentages(self, percentages):
-        """Normalize percentages to ensure they sum to 100%."""
-        total = sum(percentages.values())
-        if total == 0:
-            # If all percentages are 0, distribute evenly
-            return {k: 20 for k in self.categories}
-        return {k: round((v / total) * 100, 1) for k, v in percentages.items()}
-
-    @lru_cache(maxsize=100)
-    def analyze_ingredients(self, ingredients_text):
-        """Analyze ingredients using Deepseek LLM via Ollama."""
+    def canonical_key(self, ingredients_text):
+        """Ingredient ids of an ingredients text, in label order, used to identify identical requests."""
+        return self._canonical_keys(ingredients_text)
+
+    def analyze_ingredients(self, ingredients_text, fail_fast=True):
+        """Analyze ingredients with the routed Ollama models.
+
+        While the model is unavailable a provisional analysis built from
+        local rules is returned instead; provisional results are never cached.
+        With ``fail_fast`` a full model queue raises ModelOverloadedError;
+        background work passes False to wait for a slot instead.
+        """
+        # Clean and validate input text
+        if not ingredients_text or len(ingredients_text.strip()) < 3:
+            raise ValueError("No valid ingredients text provided")
+
+        if not self.breaker.allow_request():
+            return self.provisional_analysis(ingredients_text)
         try:
-            # Clean and validate input text
-            if not ingredients_text or len(ingredients_text.strip()) < 3:
-                raise ValueError("No valid ingredients text provided")
-
-            # Prepare the prompt
-            prompt = f"""You are an expert in analyzing food ingredients. Analyze these ingredients: {ingredients_text}
-
-Return the analysis in this exact JSON format:
-{{
-    "health_score": <score>,
-    "ingredients": [{{"name": "<ingredient>", "category": "<category>"}}],
-    "ingredient_percentages": {{
-        "Natural": <percentage>,
-        "Additives": <percentage>,
-        "Preservatives": <percentage>,
-        "Artificial Colors": <percentage>,
-        "Highly Processed": <percentage>
-    }}
-}}
-
-Categories should be one of: Natural, Additives, Preservatives, Artificial Colors, Highly Processed.
-Health score should be between 0-100.
-Make sure the percentages sum to 100%."""
+            # Entries cached under another version are simply never hit again. Callers
+            # add ids and timestamps to the result, so each gets its own copy
+            return copy.deepcopy(
+                self._analyze_with_model(self.canonical_key(ingredients_text), self.version_key(), fail_fast)
+            )
+        except ModelUnavailableError as e:
+            logger.warning(f"Model unavailable, serving provisional analysis: {str(e)}")
+            return self.provisional_analysis(ingredients_text)
 
-            try:
-                # Call Ollama API
-                response = requests.post(
-                    self.ollama_url,
-                    json={
-                        "model": "deepseek-llm",
-                        "prompt": prompt,
-                        "stream": False
-                    }
-                )
-                response.raise_for_status()
-                
-                # Parse response
-                result = response.json()["response"]
-                # Extract JSON from the response text
-                json_str = result[result.find("{"):result.rfind("}")+1]
-                analysis = json.loads(json_str)
-                
-                # Normalize percentages
-                analysis['ingredient_percentages'] = self.normalize_percentages(analysis['ingredient_percentages'])
-                
-                return analysis
-                
-            except requests.exceptions.RequestException as e:
-                logger.error(f"Error calling Ollama API: {str(e)}")
-                raise ValueError("Failed to connect to Ollama. Make sure Ollama is running and Deepseek model is installed.")
-            except json.JSONDecodeError as e:
-                logger.error(f"Error parsing LLM response: {str(e)}")
-                raise ValueError("Failed to parse the LLM response. The model might have returned an invalid format.")
-                    
+    def version_key(self):
+        return ":".join(self.fingerprints[part] for part in ("model", "prompt", "scorer"))
+
+    def is_stale(self, analysis):
+        """True when an analysis' classifications come from another model or prompt version."""
+        stamped = analysis.get("fingerprint") or {}
+        return any(stamped.get(part) != self.fingerprints[part] for part in ("model", "prompt"))
+
+    def refresh_analysis(self, analysis):
+        """Bring a stored analysis up to date when it is read; returns ``(rescored, stale)``.
+
+        A different scorer version only needs the score and percentages
+        recomputed from the stored classifications, which is done in place.
+        A different model or prompt version means the classifications
+        themselves are stale; the caller decides when to re-analyze.
+        """
+        stamped = analysis.get("fingerprint") or {}
+        rescored = False
+        if stamped.get("scorer") != self.fingerprints["scorer"] and analysis.get("ingredients"):
+            self.scoring_engine.score_analysis(analysis)
+            analysis["fingerprint"] = {**stamped, "scorer": self.fingerprints["scorer"]}
+            rescored = True
+        return rescored, self.is_stale(analysis)
+
+    def _cached(self, key):
+        with self._results_lock:
+            if key in self._results:
+                self._results.move_to_end(key)
+                return self._results[key]
+        return None
+
+    def _cache(self, key, result):
+        with self._results_lock:
+            self._results[key] = result
+            if len(self._results) > self.cache_size:
+                self._results.popitem(last=False)
+
+    def _analyze_with_model(self, ingredient_ids, version, fail_fast=True):
+        # fail_fast only decides how a miss waits for the model, so it is not part of the key
+        key = (ingredient_ids, version)
+        cached = self._cached(key)
+        if cached is not None:
+            return cached
+        try:
+            # Concurrent requests for the same ingredients share one model call;
+            # a waiting caller never joins a call that may be rejected as overloaded
+            result = self._inflight.do(
+                (ingredient_ids, fail_fast),
+                lambda: self._generate_analysis(", ".join(self.registry.names(ingredient_ids)), fail_fast)
+            )
         except Exception as e:
             logger.error(f"Error in analyze_ingredients: {str(e)}")
-            raise
\ No newline at end of file
+            raise
+
+        self._cache(key, result)
+        return result
+
+    def _find_similar(self, names):
+        """Return a current similarity match for ``names``, or None."""
+        if not Config.SIMILARITY_ENABLED:
+            return None
+        match = self.similarity_index.query(self.registry.ids_for(names))
+        self._similarity_stats["lookups"] += 1
+        if match and self.is_stale(match.data):
+            # Analyzed by an older model or prompt; replaced in the index once re-analyzed
+            self._similarity_stats["stale_matches"] += 1
+            match = None
+        return match
+
+    def _generate_analysis(self, ingredients_text, fail_fast=True):
+        """Run one model generation for the given ingredients text."""
+        built = self.prompt_builder.build(ingredients_text)
+        if not built.names:
+            raise ValueError("No ingredients could be identified")
+
+        # A near-identical known product only needs its differing ingredients analyzed
+        match = self._find_similar(built.names)
+        if match:
+            analysis = self._reuse_similar(built.names, match, fail_fast)
+        else:
+            analysis = self._route_analysis(built, fail_fast)
+            self._similarity_stats["ingredients_sent"] += len(built.names)
+
+        self.index_analysis(analysis)
+        return analysis
+
+    def _route_analysis(self, built, fail_fast=True):
+        self._record_prompt(built)
+
+        def generate(model):
+            compact, repairs = self._call_model(built.prompt, validate_analysis, model, fail_fast=fail_fast)
+            return self.build_analysis(built.names, self.prompt_builder.expand(compact, built.names)), repairs
+
+        analysis, _ = self.router.route(
+            generate,
+            lambda result: self._check_analysis(result[0], result[1], built.names)
+        )
+        return analysis
+
+    def _reuse_similar(self, names, match, fail_fast=True):
+        """Merge a similar stored analysis with a model analysis of only the new ingredients."""
+        known = match.data["categories"]
+        categories = {}
+        differing = []
+        for name in names:
+            category = known.get(self.registry.id_for(name))
+            if category:
+                categories[name] = category
+            else:
+                differing.append(name)
+
+        if differing:
+            partial = self._route_analysis(self.prompt_builder.build(", ".join(differing)), fail_fast)
+            categories.update({item["name"]: item["category"] for item in partial["ingredients"] if item["category"]})
+            self._similarity_stats["partial_reuse"] += 1
+            self._similarity_stats["ingredients_sent"] += len(differing)
+        else:
+            self._similarity_stats["full_reuse"] += 1
+
+        self._similarity_stats["ingredients_reused"] += len(names) - len(differing)
+        logger.info(f"Reused analysis with similarity {match.similarity:.2f}; {len(differing)} new ingredient(s) analyzed")
+        return self.build_analysis(names, categories)
+
+    def build_analysis(self, names, categories):
+        """Build an analysis from ``{name: category}``, scored locally in the label order of ``names``.
+
+        Every name keeps its position in ``ingredients``; unclassified ones
+        have category None, so rescoring the stored list gives the same
+        position weights as the original score.
+        """
+        analysis = self.scoring_engine.score([categories.get(name) for name in names])
+        analysis["ingredients"] = [{"name": name, "category": categories.get(name)} for name in names]
+        analysis["fingerprint"] = dict(self.fingerprints)
+        return analysis
+
+    def provisional_analysis(self, ingredients_text):
+        """Analyze with local rules and previously seen ingredients only, without the model.
+
+        Each ingredient takes the category the model last gave it, then the
+        local rule category; anything else is left unclassified. The
+        result is flagged ``provisional`` so it can be re-analyzed later.
+        """
+        names = canonical_ingredients(ingredients_text)
+        if not names:
+            raise ValueError("No ingredients could be identified")
+
+        categories = {}
+        for name in names:
+            category = self._ingredient_categories.get(self.registry.id_for(name))
+            if category:
+                self._provisional_stats["from_cache"] += 1
+            else:
+                category = classify_ingredient(name)
+                if category:
+                    self._provisional_stats["from_rules"] += 1
+                else:
+                    # Left out of the score rather than guessed
+                    self._provisional_stats["unclassified"] += 1
+                    continue
+            categories[name] = category
+
+        self._provisional_stats["analyses"] += 1
+        analysis = self.build_analysis(names, categories)
+        analysis["provisional"] = True
+        analysis["fingerprint"]["model"] = "rules"
+        return analysis
+
+    def index_analysis(self, analysis):
+        """Add a finished analysis to the similarity index and the per-ingredient categories."""
+        if analysis.get("provisional"):
+            return
+        categories = {
+            self.registry.id_for(item["name"]): item["category"]
+            for item in analysis.get("ingredients", [])
+            if item.get("name") and item.get("category") in self.categories
+        }
+        categories.pop(None, None)
+        if not categories:
+            return
+        self._ingredient_categories.update(categories)
+        self.similarity_index.add(
+            tuple(sorted(categories)),
+            categories.keys(),
+            {"categories": categories, "fingerprint": analysis.get("fingerprint")}
+        )
+
+    def load_similarity_index(self, analyses):
+        """Index previously stored analyses, e.g. at startup; returns how many were indexed."""
+        before = len(self.similarity_index)
+        for analysis in analyses:
+            self.index_analysis(analysis)
+        return len(self.similarity_index) - before
+
+    def analyze_batch(self, ingredients_texts, batch_size=None):
+        """Analyze several products with one model generation per batch.
+
+        Each product is first served like a single analysis would be: from
+        the result cache, from an identical analysis already running, or
+        from a similar stored analysis. The remaining products share one
+        prompt per batch, so the instructions are sent once instead of once
+        per product, and the JSON response is split back into one analysis
+        per input and cached. Products the model leaves out of the batch
+        response are analyzed individually. Like the batch call itself,
+        those single analyses wait for a model slot rather than failing on
+        a full queue. Returns a list aligned with the input; entries whose
+        analysis failed are None.
+        """
+        batch_size = batch_size or self.batch_size
+        results = [None] * len(ingredients_texts)
+        version = self.version_key()
+
+        for start in range(0, len(ingredients_texts), batch_size):
+            chunk = list(enumerate(ingredients_texts[start:start + batch_size], start=start))
+            chunk = [(i, text) for i, text in chunk if text and len(text.strip()) >= 3]
+            if not chunk:
+                continue
+
+            pending = {}
+            for index, text in chunk:
+                ingredient_ids = self.canonical_key(text)
+                cached = self._cached((ingredient_ids, version))
+                if cached is not None:
+                    self._batch_stats["cache_hits"] += 1
+                    results[index] = copy.deepcopy(cached)
+                else:
+                    pending.setdefault(ingredient_ids, []).append(index)
+            if not pending:
+                continue
+
+            # Products already being analyzed elsewhere are waited for, not analyzed again
+            analyses = self._inflight.do_many([(ids, False) for ids in pending], self._analyze_uncached)
+            for (ingredient_ids, _), analysis in analyses.items():
+                if isinstance(analysis, ModelUnavailableError):
+                    logger.warning(f"Model unavailable, serving provisional analyses: {str(analysis)}")
+                    analysis = self.provisional_analysis(", ".join(self.registry.names(ingredient_ids)))
+                elif isinstance(analysis, Exception):
+                    logger.error(f"Error analyzing products {pending[ingredient_ids]}: {str(analysis)}")
+                    continue
+                else:
+                    self._cache((ingredient_ids, version), analysis)
+                for index in pending[ingredient_ids]:
+                    results[index] = copy.deepcopy(analysis)
+
+        return results
+
+    def _analyze_uncached(self, keys):
+        """Analyze the products behind single-flight ``keys``: similar ones alone, the rest in one batch.
+
+        Returns ``{key: analysis or exception}``.
+        """
+        analyses = {}
+        unmatched = []
+        for key in keys:
+            names = self.registry.names(key[0])
+            try:
+                match = self._find_similar(names)
+                if match:
+                    analyses[key] = self._reuse_similar(names, match, fail_fast=False)
+                    self.index_analysis(analyses[key])
+                    continue
+            except Exception as e:
+                analyses[key] = e
+                continue
+            unmatched.append(key)
+
+        texts = [", ".join(self.registry.names(key[0])) for key in unmatched]
+        batch_results = {}
+        if len(unmatched) > 1:
+            try:
+                batch_results = self._generate_batch_analysis(texts)
+            except ValueError as e:
+                logger.error(f"Batch analysis failed, falling back to single analyses: {str(e)}")
+        if batch_results:
+            self._batch_stats["batches"] += 1
+            self._batch_stats["batched_products"] += len(batch_results)
+
+        for position, (key, text) in enumerate(zip(unmatched, texts), start=1):
+            analysis = batch_results.get(position)
+            if analysis is None:
+                if len(unmatched) > 1:
+                    self._batch_stats["fallbacks"] += 1
+                try:
+                    built = self.prompt_builder.build(text)
+                    analysis = self._route_analysis(built, fail_fast=False)
+                    self._similarity_stats["ingredients_sent"] += len(built.names)
+                except Exception as e:
+                    analyses[key] = e
+                    continue
+            self.index_analysis(analysis)
+            analyses[key] = analysis
+        return analyses
+
+    def _generate_batch_analysis(self, ingredients_texts):
+        """Run one model generation for several products, keyed by 1-based product id."""
+        built = self.prompt_builder.build_batch(ingredients_texts)
+        self._record_prompt(built)
+
+        def generate(model):
+            response, repairs = self._call_model(built.prompt, validate_batch_analysis, model, fail_fast=False,
+                                                 products=len(ingredients_texts))
+            products = {}
+            for item in response["products"]:
+                product_id = item.get("id")
+                if product_id and product_id <= len(built.names) and product_id not in products:
+                    product_names = built.names[product_id - 1]
+                    products[product_id] = self.build_analysis(product_names, self.prompt_builder.expand(item, product_names))
+            return products, repairs
+
+        def check(result):
+            products, repairs = result
+            reasons = set()
+            for product_id, product_names in enumerate(built.names, start=1):
+                if product_id not in products:
+                    reasons.add("coverage")
+                    continue
+                reasons.update(self._check_analysis(products[product_id], [], product_names))
+            if len(repairs) > Config.ROUTER_MAX_REPAIRS * len(ingredients_texts):
+                reasons.add("schema")
+            return sorted(reasons)
+
+        # Backlog processing waits for a model slot instead of being rejected
+        analyses, _ = self.router.route(generate, check)
+
+        for analysis in analyses.values():
+            self.index_analysis(analysis)
+        return analyses
+
+    def _record_prompt(self, built):
+        self._token_stats["requests"] += 1
+        self._token_stats["estimated_prompt_tokens"] += built.tokens
+        self._token_stats["dropped_ingredients"] += built.dropped
+        if built.dropped:
+            logger.warning(f"Prompt token budget reached, dropped {built.dropped} trailing ingredient(s)")
+
+    def _check_analysis(self, analysis, repairs, names):
+        """Return the routing checks an analysis fails; an empty list accepts it."""
+        reasons = []
+        if len(repairs) > Config.ROUTER_MAX_REPAIRS:
+            reasons.append("schema")
+
+        returned = [item for item in analysis["ingredients"] if item["name"].strip() and item["category"]]
+        if names and len(returned) / len(names) < Config.ROUTER_MIN_COVERAGE:
+            reasons.append("coverage")
+
+        # Compare with local rules on the ingredients they know about
+        ruled = [(item["category"], classify_ingredient(item["name"])) for item in returned]
+        ruled = [(model_category, rule_category) for model_category, rule_category in ruled if rule_category]
+        if ruled:
+            agreement = sum(1 for model_category, rule_category in ruled if model_category == rule_category) / len(ruled)
+            if agreement < Config.ROUTER_MIN_AGREEMENT:
+                reasons.append("rules")
+        return reasons
+
+    def _call_model(self, prompt, validator, model, fail_fast=True, products=1):
+        """Send a prompt to ``model`` and return ``(response, repairs)``, repaired against ``validator``'s schema."""
+        options = Config.model_options(model)
+        # A batch answer holds one analysis per product. num_ctx stays fixed:
+        # Ollama reloads the model whenever the context size changes
+        options["num_predict"] *= products
+        if not self.breaker.allow_request():
+            raise ModelUnavailableError("Model circuit is open")
+        started = time.monotonic()
+        try:
+            # `format` constrains generation to the schema
+            response = self.client.generate({
+                "model": model,
+                "prompt": prompt,
+                "format": validator.schema,
+                "stream": False,
+                "keep_alive": Config.OLLAMA_KEEP_ALIVE,
+                "options": options
+            }, fail_fast=fail_fast)
+            self.breaker.record_success(time.monotonic() - started)
+            
+            # Actual token counts reported by Ollama
+            self._token_stats["prompt_eval_tokens"] += response.get("prompt_eval_count", 0)
+            self._token_stats["eval_tokens"] += response.get("eval_count", 0)
+
+            # Parse response
+            analysis, repairs = validator(parse_model_json(response["response"]))
+
+            self._schema_stats["responses"] += 1
+            if repairs:
+                self._schema_stats["repaired_responses"] += 1
+                self._schema_stats["repaired_fields"] += len(repairs)
+                logger.warning(f"Repaired {len(repairs)} field(s) in {model} response: {', '.join(sorted(set(repairs)))}")
+            return analysis, repairs
+            
+        except ModelOverloadedError:
+            # Surfaced to the caller so it can answer 503 with Retry-After. A full
+            # queue is our own backpressure, not a model fault, so the breaker
+            # only counts model errors and slow calls
+            raise
+        except ModelClientError as e:
+            logger.error(str(e))
+            self.breaker.record_failure()
+            raise ModelUnavailableError(f"Failed to connect to Ollama. Make sure Ollama is running and the {model} model is installed.")
+        except (SchemaError, KeyError) as e:
+            logger.error(f"Error parsing LLM response: {str(e)}")
+            raise ValueError("Failed to parse the LLM response. The model might have returned an invalid format.")
+
+    def warm_up(self):
+        """Preload every routed model so the first analysis does not pay the load time."""
+        for model in self.router.models:
+            try:
+                self.client.warm_up(model, Config.OLLAMA_KEEP_ALIVE, Config.model_options(model))
+                logger.info(f"Model {model} loaded (keep_alive={Config.OLLAMA_KEEP_ALIVE})")
+            except ModelClientError as e:
+                logger.error(f"Could not preload model {model}: {str(e)}")
+
+    def _probe_model(self):
+        """Recovery probe for the circuit breaker: the first model must load again."""
+        model = self.router.models[0]
+        self.client.warm_up(model, Config.OLLAMA_KEEP_ALIVE, Config.model_options(model))
+
+    def get_metrics(self):
+        """Return runtime counters for the analysis layer."""
+        return {
+            "single_flight": self._inflight.stats(),
+            "batch": dict(self._batch_stats),
+            "schema": dict(self._schema_stats),
+            "model_client": self.client.stats(),
+            "router": self.router.stats(),
+            "tokens": dict(self._token_stats),
+            "fingerprints": dict(self.fingerprints),
+            "circuit_breaker": self.breaker.stats(),
+            "provisional": dict(self._provisional_stats),
+            "registry": {"ingredients": len(self.registry), **self.registry.stats},
+            "similarity": {
+                **self._similarity_stats,
+                "indexed": len(self.similarity_index),
+                "evicted": self.similarity_index.evictions,
+                "threshold": self.similarity_index.threshold,
+                # Each full reuse is one model call that was never made
+                "model_calls_avoided": self._similarity_stats["full_reuse"]
+            }
+        }
@@ -0,0 +1,429 @@
+import os
+import time
+import uuid
+import socket
+import datetime
+import threading
+import logging
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from .fair_scheduler import FairScheduler, PRIORITY_INTERACTIVE, PRIORITY_BACKGROUND
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+class QueueFullError(Exception):
+    """Raised when too many jobs of a priority class are already waiting.
+
+    ``retry_after`` is an estimate, in seconds, of when the queue will have drained enough.
+    """
+
+    def __init__(self, retry_after):
+        super().__init__(f"Analysis queue is full, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+class DuplicateJobError(ValueError):
+    """Raised by a store when a job with the same pending key is already queued or running."""
+
+def _lease(worker, lease_seconds):
+    """Fields that mark a job as running under ``worker``'s lease."""
+    now = datetime.datetime.utcnow()
+    return {"status": RUNNING, "started_at": now, "worker": worker,
+            "lease_expires": now + datetime.timedelta(seconds=lease_seconds)}
+
+class MongoJobStore:
+    """Durable job storage backed by a MongoDB collection.
+
+    A claimed job carries a lease: the id of the worker process running it
+    and when the lease expires. Live processes keep renewing the leases of
+    their jobs, so ``requeue_stale`` only puts back jobs whose worker died,
+    however many processes share the collection.
+
+    A job may carry a ``pending_key`` until it finishes; a unique index on
+    it keeps one queued or running job per key across every process.
+    Finished jobs keep only their result, and a TTL index on
+    ``finished_at`` (see IndexManager) removes them after a day.
+    """
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.collection.create_index([("status", 1), ("priority", -1), ("created_at", 1)])
+        self.collection.create_index([("status", 1), ("lease_expires", 1)])
+        self.collection.create_index([("pending_key", 1)], unique=True,
+                                     partialFilterExpression={"pending_key": {"$exists": True}})
+
+    def insert(self, job):
+        try:
+            self.collection.insert_one(job)
+        except DuplicateKeyError:
+            raise DuplicateJobError(job.get("pending_key"))
+
+    def find_pending(self, key):
+        """Return the queued or running job holding ``key``, or None."""
+        return self.collection.find_one({"pending_key": key})
+
+    def claim(self, limit=1, worker=None, lease_seconds=300):
+        """Atomically move up to ``limit`` queued jobs to running under ``worker``'s lease and return them."""
+        jobs = []
+        for _ in range(limit):
+            job = self.collection.find_one_and_update(
+                {"status": QUEUED},
+                {"$set": _lease(worker, lease_seconds),
+                 "$inc": {"attempts": 1}},
+                sort=[("priority", -1), ("created_at", 1)],
+                return_document=ReturnDocument.AFTER
+            )
+            if job is None:
+                break
+            jobs.append(job)
+        return jobs
+
+    def claim_ids(self, job_ids, worker=None, lease_seconds=300):
+        """Move the given jobs to running under ``worker``'s lease if they are still queued and return them."""
+        jobs = []
+        for job_id in job_ids:
+            job = self.collection.find_one_and_update(
+                {"_id": job_id, "status": QUEUED},
+                {"$set": _lease(worker, lease_seconds),
+                 "$inc": {"attempts": 1}},
+                return_document=ReturnDocument.AFTER
+            )
+            if job is not None:
+                jobs.append(job)
+        return jobs
+
+    def queued(self):
+        """Return the id, user, priority and creation time of every queued job."""
+        return list(self.collection.find(
+            {"status": QUEUED},
+            {"user_id": 1, "priority": 1, "created_at": 1}
+        ).sort("created_at", 1))
+
+    def count_queued(self, priority):
+        """Number of queued jobs of one priority class, across every process."""
+        return self.collection.count_documents({"status": QUEUED, "priority": priority})
+
+    def finish(self, job_id, status, result=None, error=None):
+        self.collection.update_one(
+            {"_id": job_id},
+            {"$set": {
+                "status": status,
+                "result": result,
+                "error": error,
+                "finished_at": datetime.datetime.utcnow()
+            },
+             # Frees the key for a new job and drops the input, e.g. a base64 image
+             "$unset": {"pending_key": "", "payload": ""}}
+        )
+
+    def get(self, job_id):
+        return self.collection.find_one({"_id": job_id})
+
+    def renew(self, worker, lease_seconds):
+        """Extend the leases of every job ``worker`` is running; returns how many."""
+        result = self.collection.update_many(
+            {"status": RUNNING, "worker": worker},
+            {"$set": {"lease_expires": datetime.datetime.utcnow() + datetime.timedelta(seconds=lease_seconds)}}
+        )
+        return result.matched_count
+
+    def requeue_stale(self):
+        """Put running jobs whose lease expired back on the queue; returns how many."""
+        result = self.collection.update_many(
+            # Jobs claimed before leases existed have none and are requeued too
+            {"status": RUNNING, "$or": [
+                {"lease_expires": {"$lt": datetime.datetime.utcnow()}},
+                {"lease_expires": {"$exists": False}}
+            ]},
+            {"$set": {"status": QUEUED}, "$unset": {"worker": "", "lease_expires": ""}}
+        )
+        return result.modified_count
+
+class InMemoryJobStore:
+    """In-process stand-in for MongoJobStore, used in tests and local runs."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._jobs = {}
+
+    def insert(self, job):
+        with self._lock:
+            if job.get("pending_key") is not None and self._pending(job["pending_key"]):
+                raise DuplicateJobError(job["pending_key"])
+            self._jobs[job["_id"]] = dict(job)
+
+    def _pending(self, key):
+        return next((job for job in self._jobs.values() if job.get("pending_key") == key), None)
+
+    def find_pending(self, key):
+        with self._lock:
+            job = self._pending(key)
+            return dict(job) if job else None
+
+    def claim(self, limit=1, worker=None, lease_seconds=300):
+        with self._lock:
+            queued = [job for job in self._jobs.values() if job["status"] == QUEUED]
+            queued.sort(key=lambda job: (-job.get("priority", 0), job["created_at"]))
+            jobs = []
+            for job in queued[:limit]:
+                job.update(_lease(worker, lease_seconds))
+                job["attempts"] = job.get("attempts", 0) + 1
+                jobs.append(dict(job))
+            return jobs
+
+    def claim_ids(self, job_ids, worker=None, lease_seconds=300):
+        with self._lock:
+            jobs = []
+            for job_id in job_ids:
+                job = self._jobs.get(job_id)
+                if job is None or job["status"] != QUEUED:
+                    continue
+                job.update(_lease(worker, lease_seconds))
+                job["attempts"] = job.get("attempts", 0) + 1
+                jobs.append(dict(job))
+            return jobs
+
+    def queued(self):
+        with self._lock:
+            queued = [dict(job) for job in self._jobs.values() if job["status"] == QUEUED]
+            return sorted(queued, key=lambda job: job["created_at"])
+
+    def count_queued(self, priority):
+        with self._lock:
+            return sum(1 for job in self._jobs.values() if job["status"] == QUEUED and job.get("priority") == priority)
+
+    def finish(self, job_id, status, result=None, error=None):
+        with self._lock:
+            self._jobs[job_id].update({
+                "status": status,
+                "result": result,
+                "error": error,
+                "finished_at": datetime.datetime.utcnow()
+            })
+            self._jobs[job_id].pop("pending_key", None)
+            self._jobs[job_id].pop("payload", None)
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def renew(self, worker, lease_seconds):
+        with self._lock:
+            running = [job for job in self._jobs.values() if job["status"] == RUNNING and job.get("worker") == worker]
+            for job in running:
+                job["lease_expires"] = datetime.datetime.utcnow() + datetime.timedelta(seconds=lease_seconds)
+            return len(running)
+
+    def requeue_stale(self):
+        with self._lock:
+            now = datetime.datetime.utcnow()
+            stale = [job for job in self._jobs.values()
+                     if job["status"] == RUNNING and (job.get("lease_expires") or now) <= now]
+            for job in stale:
+                job["status"] = QUEUED
+                job.pop("worker", None)
+                job.pop("lease_expires", None)
+            return len(stale)
+
+class JobQueue:
+    """Background analysis queue with worker threads.
+
+    ``handler`` receives a list of claimed jobs and returns one result per
+    job, in order. Workers claim up to ``batch_size`` jobs at a time so the
+    handler can analyze several products with one model call. If the handler
+    raises, every job in the batch is marked failed.
+
+    The ``scheduler`` picks which jobs run next (by priority class, then
+    fairly across users) and the first ``interactive_workers`` workers only
+    take interactive jobs, so interactive latency holds while bulk work
+    drains. Jobs queued by other processes are picked up whenever the local
+    scheduler runs empty.
+
+    At most ``max_queued`` interactive or bulk jobs of each class may wait
+    at once; beyond that ``enqueue`` sheds the request with QueueFullError
+    instead of letting callers wait behind a backlog that cannot drain in
+    time. Background jobs are never shed.
+
+    Claimed jobs are leased to this queue for ``lease_seconds``; a
+    background thread renews the leases while the jobs run and puts back
+    jobs whose lease ran out, i.e. whose process died, so a restart of one
+    process never steals jobs another process is still running. A job
+    claimed more than ``max_attempts`` times, e.g. one that keeps crashing
+    its worker, is marked failed instead of run again.
+    """
+
+    def __init__(self, store, handler, workers=2, batch_size=1, poll_interval=1.0,
+                 scheduler=None, interactive_workers=0, lease_seconds=300, max_queued=None,
+                 max_attempts=3):
+        self.store = store
+        self.handler = handler
+        self.workers = workers
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.scheduler = scheduler or FairScheduler()
+        self.interactive_workers = min(interactive_workers, workers - 1)
+        self.lease_seconds = lease_seconds
+        self.max_queued = max_queued
+        self.max_attempts = max_attempts
+        # Moving average of the seconds one job takes, for Retry-After estimates
+        self.job_seconds = None
+        # Identifies this process' leases among every process sharing the store
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._wakeup = threading.Condition()
+        self._finished = threading.Condition()
+        self._stopping = threading.Event()
+        self._threads = []
+
+    def start(self):
+        self._requeue_stale()
+        self._sync_scheduler()
+        for i in range(self.workers):
+            min_priority = PRIORITY_INTERACTIVE if i < self.interactive_workers else 0
+            thread = threading.Thread(target=self._run, args=(min_priority,), name=f"analysis-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        thread = threading.Thread(target=self._keep_leases, name="analysis-leases", daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def stop(self, timeout=None):
+        self._stopping.set()
+        with self._wakeup:
+            self._wakeup.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def enqueue(self, user_id, payload, priority=PRIORITY_INTERACTIVE, key=None):
+        """Queue a job and return its id.
+
+        Raises QueueFullError when the job's priority class is full and
+        QuotaExceededError when the user is over quota. With a ``key``, a
+        job already queued or running under the same key (in any process)
+        is returned instead of queueing another.
+        """
+        if key is not None:
+            pending = self.store.find_pending(key)
+            if pending is not None:
+                return pending["_id"]
+        if self.max_queued is not None and priority > PRIORITY_BACKGROUND:
+            depth = self.store.count_queued(priority)
+            if depth >= self.max_queued:
+                raise QueueFullError(self.retry_after(depth))
+        self.scheduler.admit(user_id, priority)
+        job = {
+            "_id": uuid.uuid4().hex,
+            "user_id": user_id,
+            "payload": payload,
+            "priority": priority,
+            "status": QUEUED,
+            "result": None,
+            "error": None,
+            "attempts": 0,
+            "created_at": datetime.datetime.utcnow()
+        }
+        if key is not None:
+            job["pending_key"] = key
+        try:
+            self.store.insert(job)
+        except DuplicateJobError:
+            # Queued by another process since the check above
+            pending = self.store.find_pending(key)
+            if pending is not None:
+                return pending["_id"]
+            raise
+        self.scheduler.push(job["_id"], user_id, priority, job["created_at"])
+        with self._wakeup:
+            self._wakeup.notify_all()
+        return job["_id"]
+
+    def get(self, job_id):
+        return self.store.get(job_id)
+
+    def retry_after(self, depth):
+        """Seconds until ``depth`` queued jobs are likely to have been worked off."""
+        seconds = self.job_seconds if self.job_seconds is not None else self.poll_interval
+        return max(1, round(depth * seconds / self.workers))
+
+    def wait(self, job_id, timeout=None):
+        """Block until the job finishes or ``timeout`` expires; return the job."""
+        deadline = None if timeout is None else datetime.datetime.utcnow() + datetime.timedelta(seconds=timeout)
+        with self._finished:
+            while True:
+                job = self.store.get(job_id)
+                if job is None or job["status"] in (DONE, FAILED):
+                    return job
+                remaining = self.poll_interval
+                if deadline is not None:
+                    remaining = min(remaining, (deadline - datetime.datetime.utcnow()).total_seconds())
+                    if remaining <= 0:
+                        return job
+                # Another process may finish the job, so wake up periodically too
+                self._finished.wait(remaining)
+
+    def _requeue_stale(self):
+        requeued = self.store.requeue_stale()
+        if requeued:
+            logger.info(f"Requeued {requeued} analysis job(s) whose worker stopped")
+        return requeued
+
+    def _keep_leases(self):
+        # Renewed well before expiry so a slow store write never loses a lease
+        interval = self.lease_seconds / 3
+        while not self._stopping.wait(interval):
+            try:
+                self.store.renew(self.worker_id, self.lease_seconds)
+                if self._requeue_stale():
+                    self._sync_scheduler()
+                    with self._wakeup:
+                        self._wakeup.notify_all()
+            except Exception as e:
+                logger.error(f"Could not renew analysis job leases: {str(e)}")
+
+    def _sync_scheduler(self):
+        for job in self.store.queued():
+            self.scheduler.push(job["_id"], job["user_id"], job.get("priority", PRIORITY_INTERACTIVE), job["created_at"])
+
+    def _run(self, min_priority):
+        while not self._stopping.is_set():
+            job_ids = self.scheduler.pop(self.batch_size, min_priority)
+            if not job_ids:
+                with self._wakeup:
+                    self._wakeup.wait(self.poll_interval)
+                self._sync_scheduler()
+                continue
+
+            # Ids another worker or process already claimed are skipped
+            jobs = self.store.claim_ids(job_ids, self.worker_id, self.lease_seconds)
+            exhausted = [job for job in jobs if job.get("attempts", 1) > self.max_attempts]
+            for job in exhausted:
+                logger.error(f"Analysis job {job['_id']} was attempted {self.max_attempts} times, giving up")
+                self.store.finish(job["_id"], FAILED, error=f"Gave up after {self.max_attempts} attempts")
+                jobs.remove(job)
+            if exhausted:
+                with self._finished:
+                    self._finished.notify_all()
+            if not jobs:
+                continue
+
+            started = time.monotonic()
+            try:
+                results = self.handler(jobs)
+                if len(results) != len(jobs):
+                    raise ValueError(f"Handler returned {len(results)} results for {len(jobs)} jobs")
+                for job, result in zip(jobs, results):
+                    self.store.finish(job["_id"], DONE, result=result)
+            except Exception as e:
+                logger.error(f"Analysis job batch failed: {str(e)}")
+                for job in jobs:
+                    self.store.finish(job["_id"], FAILED, error=str(e))
+            seconds = (time.monotonic() - started) / len(jobs)
+            self.job_seconds = seconds if self.job_seconds is None else 0.8 * self.job_seconds + 0.2 * seconds
+
+            with self._finished:
+                self._finished.notify_all()
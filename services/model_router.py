@@ -0,0 +1,103 @@
+import time
+import threading
+import logging
+from .ollama_client import ModelOverloadedError
+
+logger = logging.getLogger(__name__)
+
+class ModelRouter:
+    """Route each analysis through model tiers, cheapest first.
+
+    ``models`` is ordered from the smallest, fastest model to the largest.
+    Each request goes to the first tier; its answer is passed to a check
+    function and only if that check fails (or the call errors) is the
+    request escalated to the next tier. The last tier's answer is always
+    accepted. Escalation rate and per-model latency are recorded so the
+    share of traffic served by the cheap model can be monitored.
+    """
+
+    def __init__(self, models):
+        if not models:
+            raise ValueError("ModelRouter needs at least one model")
+        self.models = list(models)
+        self._lock = threading.Lock()
+        self._requests = 0
+        self._escalations = 0
+        self._per_model = {
+            model: {"calls": 0, "accepted": 0, "errors": 0, "total_latency": 0.0}
+            for model in self.models
+        }
+        self._escalation_reasons = {}
+
+    def route(self, generate, check):
+        """Run ``generate(model)`` tier by tier until ``check(result)`` passes.
+
+        ``check`` returns a list of failed-check reasons; an empty list
+        accepts the result.
+        """
+        with self._lock:
+            self._requests += 1
+
+        last_error = None
+        for tier, model in enumerate(self.models):
+            is_last = tier == len(self.models) - 1
+            started = time.monotonic()
+            try:
+                result = generate(model)
+            except ModelOverloadedError:
+                raise
+            except Exception as e:
+                self._record(model, time.monotonic() - started, error=True)
+                last_error = e
+                if is_last:
+                    raise
+                self._record_escalation(model, ["error"])
+                logger.warning(f"Model {model} failed ({str(e)}), escalating")
+                continue
+
+            self._record(model, time.monotonic() - started)
+            reasons = check(result)
+            if not reasons or is_last:
+                with self._lock:
+                    self._per_model[model]["accepted"] += 1
+                return result
+
+            self._record_escalation(model, reasons)
+            logger.info(f"Escalating analysis from {model}: {', '.join(reasons)}")
+
+        raise last_error
+
+    def _record(self, model, latency, error=False):
+        with self._lock:
+            stats = self._per_model[model]
+            stats["calls"] += 1
+            stats["total_latency"] += latency
+            if error:
+                stats["errors"] += 1
+
+    def _record_escalation(self, model, reasons):
+        with self._lock:
+            self._escalations += 1
+            for reason in reasons:
+                self._escalation_reasons[reason] = self._escalation_reasons.get(reason, 0) + 1
+
+    def stats(self):
+        """Return escalation rate and per-model call counts and latency."""
+        with self._lock:
+            per_model = {
+                model: {
+                    "calls": stats["calls"],
+                    "accepted": stats["accepted"],
+                    "errors": stats["errors"],
+                    "avg_latency": round(stats["total_latency"] / stats["calls"], 3) if stats["calls"] else None
+                }
+                for model, stats in self._per_model.items()
+            }
+            return {
+                "models": list(self.models),
+                "requests": self._requests,
+                "escalations": self._escalations,
+                "escalation_rate": round(self._escalations / self._requests, 3) if self._requests else 0,
+                "escalation_reasons": dict(self._escalation_reasons),
+                "per_model": per_model
+            }
@@ -51,8 +51,23 @@ class OCRService:
         
         return gray
 
+    @staticmethod
+    def word_confidences(data):
+        """Map each word Tesseract read to its lowest confidence (0-100) in ``image_to_data`` output."""
+        confidences = {}
+        for word, conf in zip(data['text'], data['conf']):
+            word = word.strip()
+            conf = float(conf)
+            if word and conf >= 0:
+                confidences[word] = min(conf, confidences.get(word, conf))
+        return confidences
+
     def extract_text_from_base64(self, base64_data):
         """Extract text from base64 encoded image data"""
+        return self.extract_text_and_confidences_from_base64(base64_data)[0]
+
+    def extract_text_and_confidences_from_base64(self, base64_data):
+        """Extract text from base64 encoded image data, with per-word confidences of the chosen reading"""
         try:
             # Remove header if present
             if 'base64,' in base64_data:
@@ -83,6 +98,7 @@ class OCRService:
             ]
             
             best_text = ""
+            best_confidences = {}
             max_confidence = 0
             
             for config in configs:
@@ -104,6 +120,7 @@ class OCRService:
                         if avg_confidence > max_confidence and text.strip():
                             max_confidence = avg_confidence
                             best_text = text
+                            best_confidences = self.word_confidences(data)
                 
                 except Exception as e:
                     print(f"Error with config {config}: {str(e)}")
@@ -113,10 +130,10 @@ class OCRService:
                 raise ValueError("No text could be extracted from the image")
             
             print(f"Final extracted text: {best_text[:100]}...")
-            return best_text.strip()
+            return best_text.strip(), best_confidences
             
         except Exception as e:
-            print(f"Error in extract_text_from_base64: {str(e)}")
+            print(f"Error in extract_text_and_confidences_from_base64: {str(e)}")
             traceback.print_exc()
             raise
 
@@ -0,0 +1,343 @@
+import math
+import time
+import asyncio
+import threading
+import logging
+import aiohttp
+from .config import Config
+
+logger = logging.getLogger(__name__)
+
+class ModelClientError(Exception):
+    """Raised when Ollama cannot be reached or returns an error."""
+
+class ModelOverloadedError(ModelClientError):
+    """Raised immediately when the wait queue is full.
+
+    ``retry_after`` is a hint, in seconds, for when capacity is likely to be free.
+    """
+
+    def __init__(self, retry_after):
+        super().__init__(f"Model is overloaded, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+def parse_duration(value):
+    """Seconds in an Ollama keep_alive value such as "30m", "1h", "90s" or 300; negative means forever."""
+    if isinstance(value, (int, float)):
+        seconds = float(value)
+    else:
+        units = {"s": 1, "m": 60, "h": 3600}
+        value = str(value).strip()
+        seconds = float(value[:-1]) * units[value[-1]] if value[-1] in units else float(value)
+    return math.inf if seconds < 0 else seconds
+
+def _model_key(model):
+    # Ollama lists "deepseek-llm" as "deepseek-llm:latest"
+    return model if ":" in model else f"{model}:latest"
+
+class _EndpointDown(ModelClientError):
+    """The endpoint could not be connected to; another endpoint may serve the request."""
+
+class OllamaEndpoint:
+    """One Ollama server in the pool and what is known about it."""
+
+    def __init__(self, url, max_concurrency, models=None, options=None):
+        self.url = url.rstrip('/')
+        self.max_concurrency = max_concurrency
+        # Options this server needs on every request, e.g. num_thread for its CPU
+        self.options = dict(options or {})
+        # Models this endpoint may serve by configuration; None allows any
+        self.allowed_models = {_model_key(m) for m in models} if models else None
+        # Models the server reports as installed; None until the first health check answers
+        self.installed_models = None
+        self.healthy = True
+        self.outstanding = 0
+        # Model -> when it last served a request, i.e. where it is still loaded
+        self.warm = {}
+        self.stats = {"completed": 0, "failed": 0}
+        self.avg_latency = None
+
+    def serves(self, model):
+        key = _model_key(model)
+        return (self.healthy
+                and (self.allowed_models is None or key in self.allowed_models)
+                and (self.installed_models is None or key in self.installed_models))
+
+    def prepare(self, payload):
+        """``payload`` with this endpoint's options filled in; options the request sets itself win."""
+        if not self.options:
+            return payload
+        return {**payload, "options": {**self.options, **(payload.get("options") or {})}}
+
+class OllamaClient:
+    """Asyncio client for a pool of Ollama servers with a global wait queue.
+
+    Each endpoint runs at most ``max_concurrency`` generations at once and
+    at most ``max_queue`` interactive callers wait for a free slot anywhere
+    in the pool; anyone beyond that is rejected straight away with
+    :class:`ModelOverloadedError` instead of piling up until every request
+    times out. Background callers (``fail_fast=False``) wait without limit
+    and are counted separately, so a backlog of them never gets interactive
+    calls rejected. A request goes to an endpoint where its model is still warm
+    (served within the keep-alive time) when one has a free slot, otherwise
+    to the endpoint with the fewest outstanding requests. Endpoints are
+    health-checked in the background through /api/tags, which also reports
+    the models each one has installed; an endpoint that refuses connections
+    is skipped until it answers again. The client runs its own event loop on
+    a background thread, so synchronous Flask handlers and job workers use
+    the blocking :meth:`generate` facade.
+    """
+
+    def __init__(self, base_urls, max_concurrency=2, max_queue=8, timeout=120, endpoint_models=None,
+                 warm_ttl=1800, health_interval=10, endpoint_options=None):
+        if isinstance(base_urls, str):
+            base_urls = [base_urls]
+        endpoint_models = endpoint_models or {}
+        endpoint_options = endpoint_options or {}
+        self.endpoints = [
+            OllamaEndpoint(url, max_concurrency,
+                           endpoint_models.get(url.rstrip('/')) or endpoint_models.get(url),
+                           endpoint_options.get(url.rstrip('/')) or endpoint_options.get(url))
+            for url in base_urls
+        ]
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.warm_ttl = warm_ttl
+        self.health_interval = health_interval
+
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="ollama-client", daemon=True)
+        self._thread.start()
+        self._slot_freed = None
+        self._session = None
+        self._health_task = None
+
+        # Only touched from the event loop thread; fail-fast waiters, which max_queue limits, and the rest
+        self._waiting = 0
+        self._waiting_background = 0
+        self._stats = {"completed": 0, "failed": 0, "rejected": 0}
+        self._avg_latency = None
+
+    async def _ensure_started(self):
+        if self._session is None:
+            self._slot_freed = asyncio.Condition()
+            self._session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=self.timeout))
+            self._health_task = asyncio.ensure_future(self._health_loop())
+
+    @property
+    def capacity(self):
+        return sum(endpoint.max_concurrency for endpoint in self.endpoints if endpoint.healthy) or self.max_concurrency
+
+    def retry_after(self):
+        """Estimate how long until a queued request would get a slot."""
+        latency = self._avg_latency or 5.0
+        backlog = self._waiting + self._waiting_background + sum(endpoint.outstanding for endpoint in self.endpoints)
+        return max(1, math.ceil(backlog / self.capacity * latency))
+
+    def _pick(self, model):
+        """Return the endpoint to run ``model`` on, or None when every candidate is busy."""
+        candidates = [endpoint for endpoint in self.endpoints if endpoint.serves(model)]
+        if not candidates:
+            raise ModelClientError(f"No healthy Ollama endpoint serves {model}")
+        free = [endpoint for endpoint in candidates if endpoint.outstanding < endpoint.max_concurrency]
+        if not free:
+            return None
+        # Sticky: stay where the model is loaded rather than load it on another server
+        now = time.monotonic()
+        warm = [endpoint for endpoint in free if now - endpoint.warm.get(model, -math.inf) < self.warm_ttl]
+        return min(warm or free, key=lambda endpoint: endpoint.outstanding)
+
+    async def _acquire(self, model, fail_fast):
+        if fail_fast and self._waiting >= self.max_queue:
+            self._stats["rejected"] += 1
+            raise ModelOverloadedError(self.retry_after())
+
+        if fail_fast:
+            self._waiting += 1
+        else:
+            self._waiting_background += 1
+        try:
+            async with self._slot_freed:
+                while True:
+                    endpoint = self._pick(model)
+                    if endpoint is not None:
+                        break
+                    await self._slot_freed.wait()
+        finally:
+            if fail_fast:
+                self._waiting -= 1
+            else:
+                self._waiting_background -= 1
+        endpoint.outstanding += 1
+        return endpoint
+
+    async def _release(self, endpoint):
+        endpoint.outstanding -= 1
+        async with self._slot_freed:
+            self._slot_freed.notify_all()
+
+    async def generate_async(self, payload, fail_fast=True):
+        """POST ``payload`` to /api/generate once a slot is free and return the decoded body.
+
+        With ``fail_fast`` a full wait queue raises immediately; background
+        callers pass ``fail_fast=False`` to wait for capacity instead. If the
+        chosen endpoint refuses the connection the request moves to another.
+        """
+        await self._ensure_started()
+        model = payload.get("model", "")
+
+        for attempt in range(len(self.endpoints)):
+            endpoint = await self._acquire(model, fail_fast and attempt == 0)
+            started = time.monotonic()
+            try:
+                result = await self._post(endpoint, "/api/generate", endpoint.prepare(payload))
+                endpoint.warm[model] = time.monotonic()
+                return result
+            except _EndpointDown:
+                continue
+            finally:
+                self._record_latency(endpoint, time.monotonic() - started)
+                await self._release(endpoint)
+        raise ModelClientError("No Ollama endpoint could be reached")
+
+    async def _post(self, endpoint, path, payload):
+        try:
+            async with self._session.post(f"{endpoint.url}{path}", json=payload) as response:
+                if response.status != 200:
+                    body = await response.text()
+                    raise ModelClientError(f"Ollama API error {response.status}: {body[:200]}")
+                result = await response.json(content_type=None)
+                self._stats["completed"] += 1
+                endpoint.stats["completed"] += 1
+                return result
+        except aiohttp.ClientConnectorError as e:
+            self._stats["failed"] += 1
+            endpoint.stats["failed"] += 1
+            endpoint.healthy = False
+            logger.error(f"Ollama endpoint {endpoint.url} is unreachable: {str(e)}")
+            raise _EndpointDown(f"Error calling Ollama API: {str(e)}")
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            self._stats["failed"] += 1
+            endpoint.stats["failed"] += 1
+            raise ModelClientError(f"Error calling Ollama API: {str(e) or type(e).__name__}")
+        except ModelClientError:
+            self._stats["failed"] += 1
+            endpoint.stats["failed"] += 1
+            raise
+
+    async def _check(self, endpoint):
+        try:
+            async with self._session.get(f"{endpoint.url}/api/tags", timeout=aiohttp.ClientTimeout(total=5)) as response:
+                if response.status == 200:
+                    body = await response.json(content_type=None)
+                    endpoint.installed_models = {_model_key(m["name"]) for m in body.get("models", [])}
+                recovered = not endpoint.healthy
+                endpoint.healthy = True
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError, KeyError) as e:
+            if endpoint.healthy:
+                logger.error(f"Ollama endpoint {endpoint.url} failed its health check: {str(e) or type(e).__name__}")
+            endpoint.healthy = False
+            return
+        if recovered:
+            logger.info(f"Ollama endpoint {endpoint.url} is healthy again")
+            async with self._slot_freed:
+                self._slot_freed.notify_all()
+
+    async def _health_loop(self):
+        while True:
+            await asyncio.gather(*(self._check(endpoint) for endpoint in self.endpoints))
+            await asyncio.sleep(self.health_interval)
+
+    async def warm_up_async(self, model, keep_alive, options=None):
+        """Load ``model`` on every endpoint that serves it, without generating anything.
+
+        Ollama loads a model when it receives a request with no prompt;
+        ``keep_alive`` then controls how long it stays resident. ``options``
+        should match later requests, since a different ``num_ctx`` makes
+        Ollama load the model again. Warm-up bypasses the concurrency limit
+        because it does no generation. Raises only if no endpoint loaded it.
+        """
+        await self._ensure_started()
+        payload = {"model": model, "keep_alive": keep_alive, "options": options or {}}
+        endpoints = [endpoint for endpoint in self.endpoints if endpoint.serves(model)]
+        results = await asyncio.gather(*(self._post(endpoint, "/api/generate", endpoint.prepare(payload))
+                                         for endpoint in endpoints),
+                                       return_exceptions=True)
+        loaded = None
+        for endpoint, result in zip(endpoints, results):
+            if not isinstance(result, Exception):
+                endpoint.warm[model] = time.monotonic()
+                loaded = result
+        if loaded is None:
+            error = next((result for result in results if isinstance(result, Exception)), None)
+            raise ModelClientError(str(error) if error else f"No healthy Ollama endpoint serves {model}")
+        return loaded
+
+    def _record_latency(self, endpoint, seconds):
+        # Exponentially weighted so the retry hint follows current load
+        self._avg_latency = seconds if self._avg_latency is None else 0.8 * self._avg_latency + 0.2 * seconds
+        endpoint.avg_latency = seconds if endpoint.avg_latency is None else 0.8 * endpoint.avg_latency + 0.2 * seconds
+
+    def generate(self, payload, fail_fast=True):
+        """Blocking wrapper around :meth:`generate_async` for threaded callers."""
+        future = asyncio.run_coroutine_threadsafe(self.generate_async(payload, fail_fast), self._loop)
+        return future.result()
+
+    def warm_up(self, model, keep_alive, options=None):
+        """Blocking wrapper around :meth:`warm_up_async`."""
+        return asyncio.run_coroutine_threadsafe(self.warm_up_async(model, keep_alive, options), self._loop).result()
+
+    def stats(self):
+        """Return queue depth, in-flight count and request counters, overall and per endpoint."""
+        now = time.monotonic()
+        return {
+            "queue_depth": self._waiting + self._waiting_background,
+            "background_waiting": self._waiting_background,
+            "in_flight": sum(endpoint.outstanding for endpoint in self.endpoints),
+            "max_concurrency": self.capacity,
+            "max_queue": self.max_queue,
+            "avg_latency": round(self._avg_latency, 3) if self._avg_latency is not None else None,
+            **self._stats,
+            "endpoints": [
+                {
+                    "url": endpoint.url,
+                    "healthy": endpoint.healthy,
+                    "outstanding": endpoint.outstanding,
+                    "warm_models": sorted(m for m, used in endpoint.warm.items() if now - used < self.warm_ttl),
+                    "installed_models": sorted(endpoint.installed_models) if endpoint.installed_models is not None else None,
+                    "avg_latency": round(endpoint.avg_latency, 3) if endpoint.avg_latency is not None else None,
+                    **endpoint.stats
+                }
+                for endpoint in self.endpoints
+            ]
+        }
+
+    def close(self):
+        async def _close():
+            if self._health_task is not None:
+                self._health_task.cancel()
+            if self._session is not None:
+                await self._session.close()
+        asyncio.run_coroutine_threadsafe(_close(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+
+_default_client = None
+_default_client_lock = threading.Lock()
+
+def get_default_client():
+    """Return the process-wide client so every caller shares one pool and concurrency limit."""
+    global _default_client
+    with _default_client_lock:
+        if _default_client is None:
+            _default_client = OllamaClient(
+                Config.OLLAMA_URLS or [Config.OLLAMA_URL],
+                max_concurrency=Config.OLLAMA_MAX_CONCURRENCY,
+                max_queue=Config.OLLAMA_MAX_QUEUE,
+                timeout=Config.OLLAMA_TIMEOUT,
+                endpoint_models=Config.OLLAMA_ENDPOINT_MODELS,
+                endpoint_options=Config.OLLAMA_ENDPOINT_OPTIONS,
+                warm_ttl=parse_duration(Config.OLLAMA_KEEP_ALIVE),
+                health_interval=Config.OLLAMA_HEALTH_INTERVAL
+            )
+        return _default_client
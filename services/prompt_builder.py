@@ -0,0 +1,159 @@
+import re
+import math
+from .schema import COMPACT_ANALYSIS_SCHEMA
+from .versioning import fingerprint
+from .ingredient_parser import flatten_ingredients, parse_ingredients
+from .ingredient_lexicon import INGREDIENT_LEXICON
+from .ingredient_rules import CATEGORY_KEYWORDS, classify_ingredient
+
+# One-letter category codes keep the model's answer short
+CATEGORY_CODES = {
+    "N": "Natural",
+    "A": "Additives",
+    "P": "Preservatives",
+    "C": "Artificial Colors",
+    "H": "Highly Processed"
+}
+CODE_FOR_CATEGORY = {category: code for code, category in CATEGORY_CODES.items()}
+
+_SPLIT_RE = re.compile(r'\s*(?:\band/or\b|\bor\b)\s*')
+_TOKEN_RE = re.compile(r'\w+|[^\w\s]')
+
+# Names that are an ingredient on their own; used to tell "sugar or honey" (two
+# ingredients) from "sunflower or canola oil" (one oil, the head word shared)
+_KNOWN_NAMES = frozenset(
+    [name for name in INGREDIENT_LEXICON]
+    + [synonym for synonyms in INGREDIENT_LEXICON.values() for synonym in synonyms]
+    + [keyword for _, keywords in CATEGORY_KEYWORDS for keyword in keywords]
+)
+
+INSTRUCTIONS = """Classify each numbered food ingredient by code: N=Natural (whole or minimally processed), A=Additives (flavor/texture), P=Preservatives, C=Artificial Colors, H=Highly Processed.
+Answer by ingredient number only."""
+
+ANSWER_FORMAT = '{"items":[{"i":<number>,"c":"<code>"}]}'
+
+def count_tokens(text):
+    """Approximate the model token count of ``text``.
+
+    Words are split into roughly four-character pieces the way BPE
+    vocabularies split rarer words; punctuation counts as one token each.
+    """
+    return sum(math.ceil(len(piece) / 4) if piece[0].isalnum() else 1 for piece in _TOKEN_RE.findall(text))
+
+def _is_complete(part, head=None):
+    """True when ``part`` names an ingredient by itself rather than qualifying ``head``."""
+    if head is not None and f"{part} {head}" in _KNOWN_NAMES:
+        return False
+    return " " in part or part in _KNOWN_NAMES or classify_ingredient(part) is not None
+
+def split_alternatives(item):
+    """Split "x or y" and "x and/or y" into alternatives, but only when each one is a complete ingredient name.
+
+    "Natural or artificial flavor" and "sunflower and/or canola oil" stay whole.
+    """
+    parts = [part for part in _SPLIT_RE.split(item) if part]
+    if len(parts) < 2:
+        return parts
+    head = parts[-1].split()[-1]
+    if all(_is_complete(part, head) for part in parts[:-1]) and _is_complete(parts[-1]):
+        return parts
+    return [item]
+
+def canonical_ingredients(ingredients_text):
+    """Return the distinct canonical ingredient names in label order, sub-ingredients after their parent."""
+    seen = set()
+    names = []
+    for item in flatten_ingredients(parse_ingredients(ingredients_text)):
+        for name in split_alternatives(item):
+            if len(name) < 2 or name in seen:
+                continue
+            seen.add(name)
+            names.append(name)
+    return names
+
+class BuiltPrompt:
+    """A prompt together with the numbered ingredients it refers to."""
+
+    def __init__(self, prompt, names, tokens, dropped):
+        self.prompt = prompt
+        self.names = names
+        self.tokens = tokens
+        self.dropped = dropped
+
+class PromptBuilder:
+    """Build compact, numbered analysis prompts within a token budget.
+
+    Ingredients are deduplicated and canonicalized, then listed by number
+    so the model answers with indices and one-letter category codes rather
+    than repeating names. When a list exceeds the budget the last
+    ingredients are dropped first - labels are ordered by quantity, so
+    those matter least.
+    """
+
+    def __init__(self, token_budget=1024):
+        self.token_budget = token_budget
+        self._fixed_tokens = count_tokens(INSTRUCTIONS) + count_tokens(ANSWER_FORMAT)
+
+    def fingerprint(self):
+        """Version of the prompt format; classifications from another prompt fingerprint are stale."""
+        return fingerprint([INSTRUCTIONS, ANSWER_FORMAT, COMPACT_ANALYSIS_SCHEMA, self.token_budget])
+
+    def _fit(self, names, budget):
+        lines = []
+        used = 0
+        for i, name in enumerate(names, start=1):
+            line = f"{i} {name}"
+            cost = count_tokens(line) + 1
+            if used + cost > budget and lines:
+                break
+            lines.append(line)
+            used += cost
+        return lines
+
+    def build(self, ingredients_text):
+        """Build the prompt for one product."""
+        names = canonical_ingredients(ingredients_text)
+        lines = self._fit(names, self.token_budget - self._fixed_tokens)
+        kept = names[:len(lines)]
+        ingredient_list = "\n".join(lines)
+        prompt = f"{INSTRUCTIONS}\nIngredients:\n{ingredient_list}\nJSON: {ANSWER_FORMAT}"
+        return BuiltPrompt(prompt, kept, count_tokens(prompt), len(names) - len(kept))
+
+    def build_batch(self, ingredients_texts):
+        """Build one prompt covering several products; ``names`` holds one list per product."""
+        all_names = [canonical_ingredients(text) for text in ingredients_texts]
+        per_product = max(1, (self.token_budget - self._fixed_tokens) // len(all_names))
+        sections = []
+        kept = []
+        dropped = 0
+        for product_id, names in enumerate(all_names, start=1):
+            lines = self._fit(names, per_product)
+            kept.append(names[:len(lines)])
+            dropped += len(names) - len(lines)
+            sections.append(f"Product {product_id}:\n" + "\n".join(lines))
+        prompt = (
+            f"{INSTRUCTIONS}\nClassify every product independently; number ingredients within each product.\n"
+            + "\n".join(sections)
+            + f'\nJSON: {{"products":[{{"id":<product number>,{ANSWER_FORMAT[1:-1]}}}]}}'
+        )
+        return BuiltPrompt(prompt, kept, count_tokens(prompt), dropped)
+
+    @staticmethod
+    def expand(compact, names):
+        """Map a compact indexed answer back to ``{name: category}``, in label order.
+
+        An index answered more than once is ambiguous and left out, like an
+        unanswered one, so the coverage check sends it to the next model tier.
+        """
+        categories = {}
+        ambiguous = set()
+        for item in compact.get("items", []):
+            index = item.get("i")
+            if not isinstance(index, int) or not 1 <= index <= len(names):
+                continue
+            name = names[index - 1]
+            if name in categories:
+                ambiguous.add(name)
+                continue
+            categories[name] = CATEGORY_CODES.get(item.get("c"), "Additives")
+        return {name: categories[name] for name in names if name in categories and name not in ambiguous}
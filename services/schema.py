@@ -0,0 +1,262 @@
+import re
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+CATEGORIES = ["Natural", "Additives", "Preservatives", "Artificial Colors", "Highly Processed"]
+
+# Compact answer format used with PromptBuilder: ingredients are referred to
+# by their number in the prompt and categories by one-letter codes. The model
+# only classifies; scores and percentages are computed by ScoringEngine
+CATEGORY_CODE_LIST = ["N", "A", "P", "C", "H"]
+
+COMPACT_ANALYSIS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "items": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "i": {"type": "integer", "minimum": 1},
+                    "c": {"type": "string", "enum": CATEGORY_CODE_LIST, "default": "A"}
+                },
+                "required": ["i", "c"]
+            }
+        }
+    },
+    "required": ["items"]
+}
+
+BATCH_ANALYSIS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "products": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": dict(COMPACT_ANALYSIS_SCHEMA["properties"], id={"type": "integer", "minimum": 1}),
+                "required": COMPACT_ANALYSIS_SCHEMA["required"]
+            }
+        }
+    },
+    "required": ["products"]
+}
+
+_TYPE_DEFAULTS = {
+    "object": dict,
+    "array": list,
+    "string": str,
+    "number": float,
+    "integer": int,
+    "boolean": bool
+}
+_NUMBER_RE = re.compile(r'-?\d+(?:\.\d+)?')
+_TRAILING_COMMA_RE = re.compile(r',(\s*[}\]])')
+
+class SchemaError(ValueError):
+    """Raised when a model response cannot be turned into a JSON object at all."""
+
+class _Unrepairable(Exception):
+    """A value that may not be invented or clamped, such as an ingredient index."""
+
+class SchemaValidator:
+    """Validator compiled from a JSON schema that repairs values field by field.
+
+    Instead of rejecting a response that is missing a field or has an out of
+    range score, each field is coerced to its declared type, clamped to its
+    bounds or replaced with its default. Every repair is recorded so callers
+    can track how often the model drifts from the schema.
+
+    Numbers without a declared ``default`` identify something (an
+    ingredient index, a product id) and are never invented or clamped: an
+    array item with such a field missing or out of range is dropped.
+    """
+
+    def __init__(self, schema):
+        self.schema = schema
+        self._validate = _compile(schema, "$")
+
+    def __call__(self, value):
+        """Return ``(repaired_value, repairs)`` for a decoded JSON value."""
+        repairs = []
+        try:
+            return self._validate(value, repairs), repairs
+        except _Unrepairable as e:
+            raise SchemaError(f"{e} cannot be repaired")
+
+def compile_schema(schema):
+    """Compile ``schema`` into a reusable :class:`SchemaValidator`."""
+    return SchemaValidator(schema)
+
+def _default_for(node):
+    if "default" in node:
+        return node["default"]
+    if "enum" in node:
+        return node["enum"][0]
+    if node.get("type") in ("number", "integer"):
+        raise _Unrepairable("number without a default")
+    return _TYPE_DEFAULTS.get(node.get("type"), lambda: None)()
+
+def _compile(node, path):
+    node_type = node.get("type")
+
+    if node_type == "object":
+        fields = {name: _compile(child, f"{path}.{name}") for name, child in node.get("properties", {}).items()}
+        defaults = {name: child for name, child in node.get("properties", {}).items()}
+        required = list(node.get("required", []))
+        keep_extra = node.get("additionalProperties", True) is not False
+
+        def validate_object(value, repairs):
+            if not isinstance(value, dict):
+                repairs.append(path)
+                value = {}
+            result = dict(value) if keep_extra else {}
+            for name, validate_field in fields.items():
+                if name in value:
+                    result[name] = validate_field(value[name], repairs)
+                elif name in required:
+                    try:
+                        default = _default_for(defaults[name])
+                    except _Unrepairable:
+                        raise _Unrepairable(f"{path}.{name}")
+                    repairs.append(f"{path}.{name}")
+                    result[name] = validate_field(default, [])
+            return result
+        return validate_object
+
+    if node_type == "array":
+        item_node = node.get("items", {})
+        validate_item = _compile(item_node, f"{path}[]")
+        item_type = item_node.get("type")
+
+        def validate_array(value, repairs):
+            if not isinstance(value, list):
+                repairs.append(path)
+                return []
+            items = []
+            for item in value:
+                # Drop items of the wrong container type rather than invent them
+                if item_type == "object" and not isinstance(item, dict):
+                    repairs.append(f"{path}[]")
+                    continue
+                item_repairs = []
+                try:
+                    items.append(validate_item(item, item_repairs))
+                except _Unrepairable:
+                    item_repairs = [f"{path}[]"]
+                repairs.extend(item_repairs)
+            return items
+        return validate_array
+
+    if node_type in ("number", "integer"):
+        minimum = node.get("minimum")
+        maximum = node.get("maximum")
+        cast = int if node_type == "integer" else float
+        clamp = "default" in node
+
+        def validate_number(value, repairs):
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                match = _NUMBER_RE.search(value) if isinstance(value, str) else None
+                if not match and not clamp:
+                    raise _Unrepairable(path)
+                repairs.append(path)
+                value = float(match.group()) if match else _default_for(node)
+            if (minimum is not None and value < minimum) or (maximum is not None and value > maximum):
+                if not clamp:
+                    raise _Unrepairable(path)
+                repairs.append(path)
+                value = minimum if minimum is not None and value < minimum else maximum
+            return cast(value) if node_type == "integer" else value
+        return validate_number
+
+    if node_type == "string":
+        enum = node.get("enum")
+        lookup = {_enum_key(option): option for option in enum} if enum else None
+
+        def validate_string(value, repairs):
+            if not isinstance(value, str):
+                repairs.append(path)
+                value = "" if value is None else str(value)
+            if lookup is not None and value not in enum:
+                repairs.append(path)
+                value = lookup.get(_enum_key(value), _default_for(node))
+            return value
+        return validate_string
+
+    if node_type == "boolean":
+        def validate_boolean(value, repairs):
+            if not isinstance(value, bool):
+                repairs.append(path)
+                value = bool(value)
+            return value
+        return validate_boolean
+
+    return lambda value, repairs: value
+
+def _enum_key(value):
+    return re.sub(r'[^a-z]', '', value.lower())
+
+def parse_model_json(text):
+    """Decode the JSON object in a model response, repairing common damage.
+
+    Structured output normally makes the first ``json.loads`` succeed; the
+    fallbacks handle models that ignore ``format``: surrounding prose, code
+    fences, line comments, trailing commas and output cut off mid-object.
+    """
+    if isinstance(text, dict):
+        return text
+
+    text = (text or "").strip()
+    try:
+        value = json.loads(text)
+        if isinstance(value, dict):
+            return value
+    except json.JSONDecodeError:
+        pass
+
+    start = text.find("{")
+    if start == -1:
+        raise SchemaError("No JSON object found in response")
+    end = text.rfind("}")
+    candidate = text[start:end + 1] if end > start else text[start:]
+    candidate = candidate.replace("```json", "").replace("```", "")
+    candidate = "\n".join(line for line in candidate.split("\n") if not line.strip().startswith("//"))
+    candidate = _TRAILING_COMMA_RE.sub(r"\1", candidate)
+
+    for attempt in (candidate, _close_truncated(text[start:])):
+        try:
+            value = json.loads(attempt)
+            if isinstance(value, dict):
+                return value
+        except json.JSONDecodeError:
+            continue
+
+    raise SchemaError("Failed to parse the LLM response as JSON")
+
+def _close_truncated(text):
+    """Close the strings, arrays and objects left open by a cut-off response."""
+    stack = []
+    in_string = False
+    escaped = False
+    for char in text:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in "{[":
+            stack.append("}" if char == "{" else "]")
+        elif char in "}]" and stack:
+            stack.pop()
+
+    if in_string:
+        text += '"'
+    text = text.rstrip().rstrip(",:")
+    text = _TRAILING_COMMA_RE.sub(r"\1", text)
+    return text + "".join(reversed(stack))
@@ -0,0 +1,74 @@
+import numpy as np
+from .schema import CATEGORIES
+from .versioning import fingerprint
+
+# How healthy each category is on a 0-1 scale
+CATEGORY_HEALTH = {
+    "Natural": 1.0,
+    "Additives": 0.4,
+    "Preservatives": 0.3,
+    "Artificial Colors": 0.1,
+    "Highly Processed": 0.15
+}
+
+class ScoringEngine:
+    """Compute health scores and category percentages from ingredient classifications.
+
+    Labels list ingredients by descending weight, so an ingredient's share
+    of the product is estimated from its position: each one weighs
+    ``position_decay`` times the one before it. Category percentages are the
+    summed shares per category and the health score is the share-weighted
+    mean of the category health values, scaled to 0-100. The model only
+    classifies; everything here is deterministic and cheap to recompute
+    when the weights change.
+    """
+
+    def __init__(self, position_decay=0.85, category_health=None):
+        self.position_decay = position_decay
+        self.category_health = dict(category_health or CATEGORY_HEALTH)
+        self._index = {category: i for i, category in enumerate(CATEGORIES)}
+        self._health = np.array([self.category_health[category] for category in CATEGORIES])
+
+    def fingerprint(self):
+        """Version of the scoring parameters; results with another scorer fingerprint need rescoring."""
+        return fingerprint({"position_decay": self.position_decay, "category_health": self.category_health})
+
+    def score(self, categories):
+        """Score one product; ``categories`` is in label order, None for unclassified ingredients."""
+        return self.score_many([categories])[0]
+
+    def score_many(self, products):
+        """Score several products at once; returns one result dict per product."""
+        product_ids, positions, codes = [], [], []
+        for product_id, categories in enumerate(products):
+            for position, category in enumerate(categories):
+                # Unclassified ingredients keep their position but carry no weight
+                if category in self._index:
+                    product_ids.append(product_id)
+                    positions.append(position)
+                    codes.append(self._index[category])
+
+        shares = np.zeros((len(products), len(CATEGORIES)))
+        if codes:
+            weights = self.position_decay ** np.asarray(positions, dtype=float)
+            np.add.at(shares, (np.asarray(product_ids), np.asarray(codes)), weights)
+
+        totals = shares.sum(axis=1, keepdims=True)
+        # Products with nothing classified are split evenly across the categories
+        shares = np.divide(shares, totals, out=np.full_like(shares, 1 / len(CATEGORIES)), where=totals > 0)
+        scores = shares @ self._health * 100
+
+        return [
+            {
+                "health_score": round(float(score), 1),
+                "ingredient_percentages": {
+                    category: round(float(share) * 100, 1) for category, share in zip(CATEGORIES, row)
+                }
+            }
+            for score, row in zip(scores, shares)
+        ]
+
+    def score_analysis(self, analysis):
+        """Recompute ``health_score`` and ``ingredient_percentages`` of an analysis in place."""
+        analysis.update(self.score([item.get("category") for item in analysis.get("ingredients", [])]))
+        return analysis
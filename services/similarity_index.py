@@ -0,0 +1,129 @@
+import zlib
+import threading
+from collections import OrderedDict
+import numpy as np
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+
+def _choose_bands(num_perm, threshold):
+    """Pick (bands, rows) so the LSH S-curve crosses ``threshold`` as closely as possible."""
+    best = None
+    for bands in range(1, num_perm + 1):
+        if num_perm % bands:
+            continue
+        rows = num_perm // bands
+        # Similarity at which a pair has a 50% chance of sharing a bucket
+        crossing = (1 / bands) ** (1 / rows)
+        error = abs(crossing - threshold)
+        # Lean towards a slightly lower crossing so true matches are not missed
+        if crossing > threshold:
+            error *= 2
+        if best is None or error < best[0]:
+            best = (error, bands, rows)
+    return best[1], best[2]
+
+class MinHasher:
+    """MinHash signatures of string sets using ``num_perm`` universal hash functions."""
+
+    def __init__(self, num_perm=64, seed=1):
+        rng = np.random.RandomState(seed)
+        self.num_perm = num_perm
+        self._a = rng.randint(1, 1 << 31, size=num_perm, dtype=np.uint64)
+        self._b = rng.randint(0, 1 << 31, size=num_perm, dtype=np.uint64)
+
+    def signature(self, items):
+        if not items:
+            return np.full(self.num_perm, _MAX_HASH, dtype=np.uint64)
+        # Integer ingredient ids are hashed as they are; crc32 is stable across processes, unlike hash()
+        hashes = np.fromiter((item if isinstance(item, int) else zlib.crc32(item.encode("utf-8")) for item in items),
+                             dtype=np.uint64, count=len(items))
+        # One row per item, one column per permutation; take the column minimums
+        permuted = (np.outer(hashes, self._a) + self._b) % _MERSENNE_PRIME & _MAX_HASH
+        return permuted.min(axis=0)
+
+class SimilarityMatch:
+    """A stored ingredient set similar to the one looked up."""
+
+    def __init__(self, key, similarity, data):
+        self.key = key
+        self.similarity = similarity
+        self.data = data
+
+class MinHashLSHIndex:
+    """Locality-sensitive index for finding ingredient lists with high Jaccard similarity.
+
+    Signatures are split into bands; two sets become candidates when any
+    band matches exactly, and candidates are confirmed with their exact
+    Jaccard similarity, so false positives never reach the caller.
+    With ``max_entries`` set, the least recently added or matched sets are
+    evicted from their bands once the index is full.
+    """
+
+    def __init__(self, threshold=0.9, num_perm=64, max_entries=None):
+        self.threshold = threshold
+        self.hasher = MinHasher(num_perm)
+        self.bands, self.rows = _choose_bands(num_perm, threshold)
+        self.max_entries = max_entries
+        self.evictions = 0
+        self._buckets = [{} for _ in range(self.bands)]
+        # Least recently used first
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _band_keys(self, signature):
+        return [signature[i * self.rows:(i + 1) * self.rows].tobytes() for i in range(self.bands)]
+
+    def add(self, key, items, data=None):
+        """Index ``items`` (a set of ingredient ids or canonical names) under ``key``, replacing any entry with that key."""
+        items = frozenset(items)
+        if not items:
+            return
+        band_keys = self._band_keys(self.hasher.signature(list(items)))
+        with self._lock:
+            if key in self._entries:
+                if self._entries[key][0] == items:
+                    # Same set analyzed again, e.g. by a newer model: keep the latest data
+                    self._entries[key] = (items, data)
+                    self._entries.move_to_end(key)
+                    return
+                self._remove(key)
+            self._entries[key] = (items, data)
+            for bucket, band_key in zip(self._buckets, band_keys):
+                bucket.setdefault(band_key, set()).add(key)
+            while self.max_entries and len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _remove(self, key):
+        items, _ = self._entries.pop(key)
+        for bucket, band_key in zip(self._buckets, self._band_keys(self.hasher.signature(list(items)))):
+            keys = bucket.get(band_key)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del bucket[band_key]
+
+    def query(self, items):
+        """Return the most similar indexed set at or above the threshold, or None."""
+        items = frozenset(items)
+        if not items:
+            return None
+        band_keys = self._band_keys(self.hasher.signature(list(items)))
+        with self._lock:
+            candidates = set()
+            for bucket, band_key in zip(self._buckets, band_keys):
+                candidates.update(bucket.get(band_key, ()))
+
+            best = None
+            for key in candidates:
+                stored, data = self._entries[key]
+                similarity = len(items & stored) / len(items | stored)
+                if similarity >= self.threshold and (best is None or similarity > best.similarity):
+                    best = SimilarityMatch(key, similarity, data)
+            if best is not None:
+                self._entries.move_to_end(best.key)
+            return best
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,123 @@
+import copy
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+class _Call:
+    """A single in-progress execution shared by every caller with the same key."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+class SingleFlight:
+    """Collapse concurrent calls with the same key into one execution.
+
+    The first caller for a key runs the function; callers arriving while it is
+    still running block until it finishes and receive a copy of its result (or
+    the same exception). Nothing is kept once the call completes - caching is
+    left to the layer above.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.executions = 0
+        self.coalesced = 0
+
+    def do(self, key, fn):
+        """Run ``fn()`` for ``key`` unless an identical call is already in flight."""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = _Call()
+                self._calls[key] = call
+                self.executions += 1
+                leader = True
+            else:
+                call.waiters += 1
+                self.coalesced += 1
+                leader = False
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return copy.deepcopy(call.result)
+
+        try:
+            result = fn()
+            # Waiters get their own copy so callers can safely mutate the result
+            call.result = copy.deepcopy(result)
+            return result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            if call.waiters:
+                logger.debug(f"Single-flight call shared with {call.waiters} waiter(s)")
+            call.done.set()
+
+    def do_many(self, keys, fn):
+        """Like :meth:`do` for several keys sharing one execution.
+
+        ``fn(led_keys)`` runs once for the keys no call is in flight for and
+        returns ``{key: result}``, where a result may be an exception raised
+        only to that key's callers. Keys already in flight wait for their
+        own call. Returns ``{key: result or exception}`` for every key.
+        """
+        led = {}
+        joined = {}
+        with self._lock:
+            for key in keys:
+                call = self._calls.get(key)
+                if call is None:
+                    call = self._calls[key] = _Call()
+                    led[key] = call
+                elif key not in led:
+                    call.waiters += 1
+                    self.coalesced += 1
+                    joined[key] = call
+            if led:
+                self.executions += 1
+
+        results = {}
+        if led:
+            produced = {}
+            try:
+                produced = fn(list(led))
+            except Exception as e:
+                produced = {key: e for key in led}
+            finally:
+                # Waiters are released even if fn left a key out or was interrupted
+                for key, call in led.items():
+                    result = produced.get(key, KeyError(key))
+                    if isinstance(result, Exception):
+                        call.error = result
+                    else:
+                        call.result = copy.deepcopy(result)
+                    results[key] = result
+                with self._lock:
+                    for key in led:
+                        self._calls.pop(key, None)
+                for call in led.values():
+                    call.done.set()
+
+        for key, call in joined.items():
+            call.done.wait()
+            results[key] = call.error if call.error is not None else copy.deepcopy(call.result)
+        return results
+
+    def stats(self):
+        """Return counters describing how many calls were deduplicated."""
+        with self._lock:
+            return {
+                "executions": self.executions,
+                "coalesced": self.coalesced,
+                "in_flight": len(self._calls)
+            }
@@ -0,0 +1,253 @@
+import os
+import re
+import threading
+from functools import lru_cache
+from .config import Config
+from .ingredient_lexicon import INGREDIENT_LEXICON
+from .ingredient_rules import CATEGORY_KEYWORDS, classify_ingredient
+
+# Words that appear on labels around the ingredients themselves
+LABEL_WORDS = [
+    "ingredients", "contains", "less", "than", "following", "organic", "enriched", "concentrate",
+    "extract", "powder", "natural", "flavor", "flavour", "vegetable", "modified", "dried", "color",
+    "colour", "added", "vitamins", "minerals", "niacin", "riboflavin", "thiamine", "folic", "iron"
+]
+
+# Common food words that are not in the lexicon, so valid label words are never
+# "corrected" into a near lexicon word (raisins -> raising, almond -> almonds)
+FOOD_WORDS = [
+    "almond", "almonds", "apple", "apples", "apricot", "apricots", "banana", "bananas", "barley",
+    "basil", "bean", "beans", "berries", "berry", "blueberries", "blueberry", "bran", "bread",
+    "broccoli", "buckwheat", "butter", "buttermilk", "cabbage", "carrot", "carrots", "cashew",
+    "cashews", "celery", "cereal", "cherries", "cherry", "chickpea", "chickpeas", "chili", "chilli",
+    "chives", "chocolate", "cocoa", "coffee", "corn", "cranberries", "cranberry", "cream", "cucumber",
+    "cultured", "culture", "currants", "dates", "dill", "eggs", "fennel", "figs", "flax", "flaxseed",
+    "flour", "garlic", "ginger", "grape", "grapes", "hazelnut", "hazelnuts", "herbs", "honey",
+    "kale", "lemon", "lemons", "lentil", "lime", "limes", "malt", "malted", "mango", "mangoes",
+    "melon", "milk", "millet", "mint", "molasses", "mushroom", "mushrooms", "mustard", "nutmeg",
+    "nuts", "oats", "olives", "onions", "orange", "oranges", "oregano", "paprika", "parsley",
+    "pasta", "pea", "peach", "peaches", "peanut", "pear", "pears", "peas", "pecan", "pecans",
+    "pepper", "peppers", "pineapple", "pistachio", "pistachios", "plum", "plums", "pumpkin",
+    "quinoa", "raisin", "raisins", "raspberries", "raspberry", "rosemary", "rye", "sage",
+    "sesame", "soybean", "soybeans", "spelt", "spinach", "strawberry", "sultanas", "sunflower",
+    "thyme", "turmeric", "vanilla", "walnut", "wheat", "yeast",
+    "baked", "blanched", "chopped", "cooked", "crushed", "diced", "flaked", "fresh", "frozen",
+    "ground", "minced", "peeled", "pitted", "raw", "roasted", "rolled", "salted", "sliced",
+    "smoked", "sprouted", "toasted", "unsalted", "unsweetened", "whole"
+]
+
+# Endings that turn one valid word into another (almond/almonds, cultured/cultures)
+_INFLECTIONS = ("s", "es", "d", "ed", "ing")
+
+# Endings of chemical and additive names (citrate, sulfite, chloride, mannitol,
+# sorbitan, dextrose, potassium, ...). A word with one is plausibly a real name
+# the vocabulary does not list, so it is not corrected into one that it does
+_CHEMICAL_SUFFIX_RE = re.compile(r'(?:ates?|ites?|ides?|[aey]nes?|ols?|oses?|ases?|ium|ic|ines?|yls?|ones?|ans?|ins?)$')
+
+_WORD_RE = re.compile(r'[A-Za-z0-9]+')
+_LETTER_RE = re.compile(r'[A-Za-z]')
+_E_NUMBER_RE = re.compile(r'^[Ee]\d{3,4}[a-z]?$')
+
+def lexicon_vocabulary():
+    """Every word of the ingredient lexicon and rule keywords, with how often it occurs."""
+    counts = {}
+    phrases = list(INGREDIENT_LEXICON)
+    phrases += [synonym for synonyms in INGREDIENT_LEXICON.values() for synonym in synonyms]
+    phrases += [keyword for _, keywords in CATEGORY_KEYWORDS for keyword in keywords]
+    phrases += LABEL_WORDS + FOOD_WORDS
+    for phrase in phrases:
+        for word in _WORD_RE.findall(phrase.lower()):
+            if len(word) >= 4 and word.isalpha():
+                counts[word] = counts.get(word, 0) + 1
+    return counts
+
+def load_word_list(path):
+    """Lowercase alphabetic words of a one-word-per-line dictionary such as /usr/share/dict/words; empty if missing."""
+    if not path or not os.path.exists(path):
+        return frozenset()
+    with open(path, encoding="utf-8", errors="ignore") as f:
+        return frozenset(line.strip().lower() for line in f if line.strip().isalpha())
+
+def word_forms(word):
+    """``word`` and the words it may be an inflection of or inflect to, e.g. spiced -> spice, spices."""
+    stems = {word} | {word[:-len(ending)] for ending in _INFLECTIONS if word.endswith(ending)}
+    return stems | {stem + ending for stem in stems for ending in _INFLECTIONS}
+
+def edit_distance(a, b, limit):
+    """Optimal string alignment distance between ``a`` and ``b``, or ``limit + 1`` once it exceeds ``limit``."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous_previous = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        row_min = i
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            value = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                value = min(value, previous_previous[j - 2] + 1)
+            current[j] = value
+            row_min = min(row_min, value)
+        if row_min > limit:
+            return limit + 1
+        previous_previous, previous = previous, current
+    return previous[-1]
+
+def _deletes(word, max_distance, prefix_length):
+    """Every string reachable from the first ``prefix_length`` characters of ``word`` by deleting up to ``max_distance`` characters."""
+    word = word[:prefix_length]
+    found = {word}
+    frontier = {word}
+    for _ in range(max_distance):
+        frontier = {candidate[:i] + candidate[i + 1:] for candidate in frontier for i in range(len(candidate))}
+        frontier -= found
+        found |= frontier
+    return found
+
+class SymSpellIndex:
+    """Symmetric delete spelling index over a fixed vocabulary.
+
+    Every vocabulary word is stored under each string obtained by deleting
+    up to ``max_distance`` characters from its prefix. A lookup generates
+    the same deletes of the query, so candidates within the edit distance
+    come from a handful of dict lookups instead of a scan of the
+    vocabulary; only those candidates get a full distance computation.
+    """
+
+    def __init__(self, vocabulary, max_distance=2, prefix_length=7):
+        self.max_distance = max_distance
+        self.prefix_length = prefix_length
+        self.frequencies = dict(vocabulary)
+        self._deletes = {}
+        for word in self.frequencies:
+            for delete in _deletes(word, max_distance, prefix_length):
+                self._deletes.setdefault(delete, []).append(word)
+
+    def __contains__(self, word):
+        return word in self.frequencies
+
+    def candidates(self, word, max_distance):
+        """Return every ``(word, distance)`` within ``max_distance``, closest then most frequent first."""
+        if word in self.frequencies:
+            return [(word, 0)]
+        max_distance = min(max_distance, self.max_distance)
+        if max_distance <= 0:
+            return []
+        found = []
+        checked = set()
+        for delete in _deletes(word, max_distance, self.prefix_length):
+            for candidate in self._deletes.get(delete, ()):
+                if candidate in checked:
+                    continue
+                checked.add(candidate)
+                distance = edit_distance(word, candidate, max_distance)
+                if distance <= max_distance:
+                    found.append((distance, -self.frequencies[candidate], candidate))
+        return [(candidate, distance) for distance, _, candidate in sorted(found)]
+
+    def lookup(self, word, max_distance):
+        """Return ``(suggestion, distance)`` for the closest word within ``max_distance``, or None.
+
+        Ties go to the more frequent word, then alphabetically.
+        """
+        found = self.candidates(word, max_distance)
+        return found[0] if found else None
+
+class OCRCorrector:
+    """Correct OCR misreads of ingredient words against the lexicon.
+
+    The vocabulary is small, so a valid word it does not list has close
+    neighbours in it that mean something else (citrate and nitrate). A
+    word is therefore only corrected when all of these hold:
+
+    * Tesseract read it with low confidence; without a confidence it is
+      left as read.
+    * It is not a plausible word: not in the vocabulary or ``dictionary``,
+      not another form of a vocabulary word (a plural or past tense) and
+      without the ending of a chemical name.
+    * Exactly one vocabulary word is within the allowed edit distance,
+      which shrinks with the word's length, and a two-edit correction
+      lands on a word seen at least ``min_frequency`` times.
+    * The local rules classify the correction like the word as read, so a
+      correction never changes an ingredient's category.
+    """
+
+    def __init__(self, index=None, dictionary=None, confident=90, unsure=60, min_frequency=2, cache_size=4096):
+        self.index = index or SymSpellIndex(lexicon_vocabulary())
+        self.dictionary = frozenset(dictionary or ())
+        self.confident = confident
+        self.unsure = unsure
+        self.min_frequency = min_frequency
+        self.stats = {"words": 0, "corrected": 0, "left_confident": 0, "left_plausible": 0,
+                      "left_ambiguous": 0, "left_category": 0}
+        self._candidates = lru_cache(maxsize=cache_size)(self.index.candidates)
+
+    def max_distance(self, word, confidence=None):
+        """Edit distance allowed for ``word`` read with ``confidence`` (0-100, None when unknown)."""
+        if len(word) <= 4 or confidence is None or confidence >= self.unsure:
+            return 0
+        return 1 if len(word) <= 7 else 2
+
+    def is_plausible(self, word):
+        """Whether lowercase ``word`` looks like a real word rather than a misread."""
+        return (word in self.dictionary
+                or _CHEMICAL_SUFFIX_RE.search(word) is not None
+                or any(form in self.index or form in self.dictionary for form in word_forms(word)))
+
+    def correct_word(self, word, confidence=None):
+        """Return the lexicon spelling of ``word``, or ``word`` unchanged."""
+        lowered = word.lower()
+        if lowered in self.index or not _LETTER_RE.search(word) or _E_NUMBER_RE.match(word):
+            return word
+        self.stats["words"] += 1
+        max_distance = self.max_distance(lowered, confidence)
+        if max_distance == 0:
+            if len(lowered) > 4:
+                self.stats["left_confident"] += 1
+            return word
+        if lowered.isalpha() and self.is_plausible(lowered):
+            self.stats["left_plausible"] += 1
+            return word
+        found = self._candidates(lowered, max_distance)
+        if len(found) != 1:
+            if found:
+                self.stats["left_ambiguous"] += 1
+            return word
+        suggestion, distance = found[0]
+        if distance > 1 and self.index.frequencies[suggestion] < self.min_frequency:
+            return word
+        if classify_ingredient(suggestion) != classify_ingredient(lowered):
+            self.stats["left_category"] += 1
+            return word
+        self.stats["corrected"] += 1
+        if word.isupper():
+            return suggestion.upper()
+        if word[0].isupper():
+            return suggestion.capitalize()
+        return suggestion
+
+    def correct(self, text, confidences=None):
+        """Correct every word of ``text``; ``confidences`` maps words to Tesseract confidences."""
+        # Tesseract words keep their punctuation ("SODLUM," or "(soy"); key them
+        # by the same word tokens the text is split into
+        words = {}
+        for token, confidence in (confidences or {}).items():
+            for word in _WORD_RE.findall(token):
+                words[word] = min(confidence, words.get(word, confidence))
+        confidences = words
+        return _WORD_RE.sub(lambda match: self.correct_word(match.group(0), confidences.get(match.group(0))), text)
+
+    def cache_info(self):
+        return self._candidates.cache_info()._asdict()
+
+_default_corrector = None
+_default_corrector_lock = threading.Lock()
+
+def get_default_corrector():
+    """Return the process-wide corrector; its index is built once."""
+    global _default_corrector
+    with _default_corrector_lock:
+        if _default_corrector is None:
+            _default_corrector = OCRCorrector(dictionary=load_word_list(Config.SPELL_DICTIONARY))
+        return _default_corrector
@@ -0,0 +1,7 @@
+import json
+import hashlib
+
+def fingerprint(value):
+    """Short stable hash of a JSON-serializable value, used to version cached results."""
+    encoded = json.dumps(value, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha1(encoded.encode("utf-8")).hexdigest()[:12]
@@ -0,0 +1,67 @@
+import os
+import sys
+import datetime
+import mongomock
+from bson import ObjectId
+
+# Add parent directory to path to import services
+parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(parent_dir)
+
+from models import IngredientAnalysis
+
+def make_db(analyses_per_user):
+    db = mongomock.MongoClient().db
+    analyses = IngredientAnalysis(db)
+    start = datetime.datetime(2024, 1, 1)
+    minute = 0
+    for username, count in analyses_per_user.items():
+        user_id = db.users.insert_one({"username": username, "email": f"{username}@example.com",
+                                       "password": b"hash"}).inserted_id
+        for _ in range(count):
+            analysis_id = analyses.save_analysis(user_id, "Water, Sugar", {
+                "ingredients": [{"name": "water", "category": "Natural"}, {"name": "sugar", "category": "Natural"}],
+                "health_score": 4
+            })
+            minute += 1
+            db.ingredient_analyses.update_one({"_id": ObjectId(analysis_id)},
+                                              {"$set": {"created_at": start + datetime.timedelta(minutes=minute)}})
+    return db, analyses
+
+def test_overview_joins_usernames_and_counts_per_user():
+    db, analyses = make_db({"alice": 3, "bob": 2})
+    overview = analyses.get_admin_overview(limit=4)
+    assert overview["total"] == 5
+    assert [a["username"] for a in overview["analyses"]] == ["bob", "bob", "alice", "alice"]
+    assert overview["analyses"][0]["ingredients"] == [
+        {"name": "water", "category": "Natural"}, {"name": "sugar", "category": "Natural"}
+    ]
+    counts = {user["username"]: user["analysis_count"] for user in overview["users"]}
+    assert counts == {"alice": 3, "bob": 2}
+    assert overview["users"][0]["email"] == "bob@example.com"
+    assert "password" not in overview["users"][0]
+
+def test_overview_paginates_and_tolerates_deleted_users():
+    db, analyses = make_db({"alice": 3, "bob": 2})
+    db.users.delete_one({"username": "bob"})
+    first = analyses.get_admin_overview(limit=4)
+    assert [a["username"] for a in first["analyses"]] == ["Unknown", "Unknown", "alice", "alice"]
+    page = analyses.get_admin_overview(limit=4, page_token=first["next_token"])
+    assert [a["username"] for a in page["analyses"]] == ["alice"]
+    assert [user["username"] for user in page["users"]] == ["alice"]
+
+def test_overview_lists_users_without_analyses_with_counts_from_stats():
+    db, analyses = make_db({"alice": 2})
+    carol = db.users.insert_one({"username": "carol", "email": "carol@example.com", "password": b"hash"}).inserted_id
+    # Counts are the running stats, not a count of the analyses
+    db.user_stats.update_one({"_id": db.users.find_one({"username": "alice"})["_id"]}, {"$set": {"count": 42}})
+    overview = analyses.get_admin_overview()
+    counts = {user["username"]: user["analysis_count"] for user in overview["users"]}
+    assert counts == {"alice": 42, "carol": 0}
+    assert [user["user_id"] for user in overview["users"] if user["username"] == "carol"] == [carol]
+
+def test_overview_of_empty_collection():
+    db = mongomock.MongoClient().db
+    overview = IngredientAnalysis(db).get_admin_overview()
+    assert (overview["analyses"], overview["users"], overview["total"]) == ([], [], 0)
+    assert not overview["has_next"] and not overview["has_prev"]
@@ -0,0 +1,72 @@
+import os
+import sys
+import datetime
+import mongomock
+
+# Add parent directory to path to import services
+parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(parent_dir)
+
+from models import AdminStats, User, IngredientAnalysis
+
+class CountingCollection:
+    """Wrap a collection to fail the test if anything counts it."""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    def count_documents(self, *args, **kwargs):
+        raise AssertionError("admin stats must not count collections")
+
+    def __getattr__(self, name):
+        return getattr(self.collection, name)
+
+def make_models():
+    db = mongomock.MongoClient().db
+    stats = AdminStats(db)
+    users = User(db, stats)
+    analyses = IngredientAnalysis(db, admin_stats=stats)
+    return db, stats, users, analyses
+
+def test_counters_follow_signups_logins_and_analyses():
+    db, stats, users, analyses = make_models()
+    alice = users.create_user("alice", "alice@example.com", "pw")
+    users.create_user("bob", "bob@example.com", "pw")
+    stats.record_login(db.users.find_one({"username": "bob"})["_id"])
+    analyses.save_analysis(alice, "Water", {"product_name": "Still water"})
+    analyses.save_analysis(alice, "Salt", {"product_name": "Salt"})
+
+    stats.users = CountingCollection(stats.users)
+    stats.counters = CountingCollection(stats.counters)
+    assert stats.totals() == {"totalUsers": 2, "totalAnalyses": 2, "activeToday": 2, "analysesToday": 2}
+
+def test_yesterdays_activity_does_not_count_today():
+    db, stats, users, analyses = make_models()
+    users.create_user("alice", "alice@example.com", "pw")
+    stats.record_analysis(db.users.find_one()["_id"], "Old", datetime.datetime.utcnow() - datetime.timedelta(days=1))
+    assert stats.totals()["activeToday"] == 0
+    stats.record_login(db.users.find_one()["_id"])
+    stats.record_login(db.users.find_one()["_id"])
+    assert stats.totals()["activeToday"] == 1
+
+def test_activity_feed_and_recent_users():
+    db, stats, users, analyses = make_models()
+    alice = users.create_user("alice", "alice@example.com", "pw")
+    users.create_user("bob", "bob@example.com", "pw")
+    analyses.save_analysis(alice, "Water", {"product_name": "Still water"})
+    stats.record_login("0123456789ab0123456789ab", is_admin=True)
+
+    activity = stats.recent_activity(limit=2)
+    assert [(entry["action"], entry["username"]) for entry in activity] == [("Admin login", "admin"), ("Analysis", "alice")]
+    assert activity[1]["details"] == "Analyzed Still water"
+    assert [user["username"] for user in stats.recent_users()][0] == "alice"
+    assert "password" not in stats.recent_users()[0]
+
+def test_totals_are_counted_once_for_existing_databases():
+    db = mongomock.MongoClient().db
+    db.users.insert_many([{"username": "a"}, {"username": "b"}])
+    db.ingredient_analyses.insert_one({"user_id": None})
+    stats = AdminStats(db)
+    assert stats.ensure_totals() == {"users": 2, "analyses": 1}
+    assert stats.ensure_totals() is None
+    assert stats.totals()["totalUsers"] == 2
@@ -0,0 +1,32 @@
+import os
+import sys
+
+# Add parent directory to path to import services
+parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(parent_dir)
+
+from services.ingredient_service import IngredientService
+
+class CountingClient:
+    def __init__(self):
+        self.calls = 0
+
+    def generate(self, payload, fail_fast=True):
+        self.calls += 1
+        return {"response": '{"items": [{"i": 1, "c": "N"}, {"i": 2, "c": "N"}, {"i": 3, "c": "N"}]}'}
+
+def test_cached_results_are_not_shared_with_callers():
+    service = IngredientService()
+    service.client = CountingClient()
+
+    first = service.analyze_ingredients("water, salt, sugar")
+    pristine = dict(first, ingredients=[dict(item) for item in first["ingredients"]])
+    # What the request path does before saving
+    first["_id"] = "abc"
+    first["health_score"] = 0
+    first["ingredients"][0]["category"] = "Preservatives"
+
+    second = service.analyze_ingredients("water, salt, sugar")
+    assert service.client.calls == 1
+    assert second == pristine
+    assert second is not first
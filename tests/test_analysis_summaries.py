@@ -0,0 +1,96 @@
+import os
+import sys
+import mongomock
+from bson import ObjectId
+
+# Add parent directory to path to import services
+parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(parent_dir)
+
+from models import IngredientAnalysis, SUMMARY_FIELDS, CHOICE_FIELDS, REFRESH_FIELDS
+
+USER_ID = "0123456789ab0123456789ab"
+
+class RecordingCollection:
+    """Wrap a collection to record the projection of every find()."""
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.projections = []
+
+    def find(self, filter=None, projection=None):
+        self.projections.append(projection)
+        return self.collection.find(filter, projection)
+
+    def __getattr__(self, name):
+        return getattr(self.collection, name)
+
+def make_analyses():
+    db = mongomock.MongoClient().db
+    analyses = IngredientAnalysis(db)
+    analyses.save_analysis(USER_ID, "Water, " * 60 + "Salt", {
+        "ingredients": [{"name": "water", "category": "Natural"}, {"name": "salt", "category": "Natural"}],
+        "ingredient_percentages": {"Natural": 100.0},
+        "health_score": 4.5,
+        "product_name": "Brine"
+    })
+    db.ingredient_analyses.insert_one({"user_id": ObjectId(USER_ID), "created_at": None})
+    return analyses
+
+def test_summaries_read_only_list_fields():
+    analyses = make_analyses()
+    analyses.collection = RecordingCollection(analyses.collection)
+    summaries = analyses.get_user_analysis_summaries(USER_ID)["analyses"]
+    assert [set(projection) - {"_id"} for projection in analyses.collection.projections] == [set(SUMMARY_FIELDS)]
+    brine = [summary for summary in summaries if summary["product_name"] == "Brine"][0]
+    assert set(brine) == {"_id", "product_name", "health_score", "ingredient_percentages", "created_at"}
+    assert brine["health_score"] == 4.5 and brine["ingredient_percentages"] == {"Natural": 100.0}
+
+def test_summaries_fill_defaults_and_preview_text():
+    summaries = make_analyses().get_user_analysis_summaries(USER_ID, preview_length=20)["analyses"]
+    by_name = {summary["product_name"]: summary for summary in summaries}
+    assert by_name["Brine"]["ingredients_preview"] == "Water, Water, Water,..."
+    legacy = by_name["Unnamed Product"]
+    assert legacy["health_score"] == 0
+    assert legacy["ingredient_percentages"]["Highly Processed"] == 0
+    assert legacy["ingredients_preview"] == "No ingredients listed"
+
+def test_choices_and_admin_summaries():
+    analyses = make_analyses()
+    choices = analyses.get_user_analysis_summaries(USER_ID, fields=CHOICE_FIELDS)["analyses"]
+    assert all(set(choice) == {"_id", "product_name", "created_at"} for choice in choices)
+    overview = analyses.get_admin_overview(fields=SUMMARY_FIELDS)
+    assert "ingredients" not in overview["analyses"][0]
+    assert {analysis["product_name"] for analysis in overview["analyses"]} == {"Brine", "Unnamed Product"}
+
+def test_summaries_with_scores_are_refreshed_on_read():
+    analyses = make_analyses()
+    analyses.collection = RecordingCollection(analyses.collection)
+    refreshed = []
+
+    def rescore(analysis):
+        refreshed.append(analysis)
+        if analysis.get("ingredients"):
+            analysis["health_score"] = 3.0
+
+    analyses.on_read = rescore
+    summaries = analyses.get_user_analysis_summaries(USER_ID)["analyses"]
+    assert set(analyses.collection.projections[0]) - {"_id"} == set(SUMMARY_FIELDS) | set(REFRESH_FIELDS)
+    assert len(refreshed) == 2
+    assert all(analysis["user_id"] == ObjectId(USER_ID) for analysis in refreshed)
+    brine = [summary for summary in summaries if summary["product_name"] == "Brine"][0]
+    assert set(brine) == {"_id", "product_name", "health_score", "ingredient_percentages", "created_at"}
+    assert brine["health_score"] == 3.0
+
+    overview = analyses.get_admin_overview(fields=SUMMARY_FIELDS)
+    assert len(refreshed) == 4
+    assert {analysis["health_score"] for analysis in overview["analyses"]} == {3.0, 0}
+
+def test_choices_skip_refresh():
+    analyses = make_analyses()
+    analyses.collection = RecordingCollection(analyses.collection)
+    refreshed = []
+    analyses.on_read = refreshed.append
+    analyses.get_user_analysis_summaries(USER_ID, fields=CHOICE_FIELDS)
+    assert refreshed == []
+    assert set(analyses.collection.projections[0]) - {"_id"} == set(CHOICE_FIELDS)
@@ -0,0 +1,122 @@
+import os
+import sys
+import time
+import threading
+
+# Add parent directory to path to import services
+parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(parent_dir)
+
+from loadtest.fake_ollama import FakeOllama, LatencyModel
+from services.ollama_client import OllamaClient
+from services.ingredient_service import IngredientService
+
+def _service(server, max_concurrency=1, max_queue=1):
+    service = IngredientService()
+    service.client = OllamaClient([server.url], max_concurrency=max_concurrency, max_queue=max_queue)
+    return service
+
+def _wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition not reached"
+        time.sleep(0.01)
+
+def test_single_product_batch_waits_for_a_full_queue():
+    server = FakeOllama(LatencyModel("fixed", median=0.3), max_concurrency=1)
+    server.start()
+    service = _service(server)
+    payload = {"model": "llama3.2:3b", "prompt": "1 Water", "stream": False}
+    # One request holds the only slot and another fills the wait queue
+    busy = [threading.Thread(target=service.client.generate, args=(payload, False)) for _ in range(2)]
+    try:
+        for thread in busy:
+            thread.start()
+        _wait_for(lambda: service.client.stats()["queue_depth"] == 1)
+
+        results = service.analyze_batch(["water, salt, sugar"])
+        assert results[0] is not None
+        assert not results[0].get("provisional")
+        assert service.client.stats()["rejected"] == 0
+    finally:
+        for thread in busy:
+            thread.join()
+        service.client.close()
+        server.stop()
+
+class ForgetfulOllama(FakeOllama):
+    """Leaves the second product out of every batch answer."""
+
+    def _classify(self, prompt):
+        products = super()._classify(prompt)
+        if "Product " in prompt:
+            products.pop(2, None)
+        return products
+
+def _categories(analysis):
+    return [(item["name"], item["category"]) for item in analysis["ingredients"]]
+
+def test_batch_response_is_split_back_per_product():
+    server = FakeOllama(LatencyModel("fixed", median=0.01))
+    server.start()
+    service = _service(server, max_concurrency=2, max_queue=4)
+    try:
+        results = service.analyze_batch(["water, red 40", "oats, sodium benzoate", "", "sugar, yellow 5"],
+                                        batch_size=3)
+
+        assert _categories(results[0]) == [("water", "Natural"), ("red 40", "Artificial Colors")]
+        assert _categories(results[1]) == [("oats", "Natural"), ("sodium benzoate", "Preservatives")]
+        assert results[2] is None
+        assert _categories(results[3]) == [("sugar", "Natural"), ("yellow 5", "Artificial Colors")]
+        # One generation for the first two products, one for the product left alone in its chunk
+        assert server.stats["generate"] == 2
+        assert "Product 2:" in server.requests[0]["prompt"]
+        assert service.get_metrics()["batch"] == {"batches": 1, "batched_products": 2, "fallbacks": 0, "cache_hits": 0}
+    finally:
+        service.client.close()
+        server.stop()
+
+def test_product_missing_from_batch_answer_is_analyzed_alone():
+    server = ForgetfulOllama(LatencyModel("fixed", median=0.01))
+    server.start()
+    service = _service(server, max_concurrency=2, max_queue=4)
+    try:
+        results = service.analyze_batch(["water, red 40", "oats, sodium benzoate"])
+
+        assert _categories(results[0]) == [("water", "Natural"), ("red 40", "Artificial Colors")]
+        assert _categories(results[1]) == [("oats", "Natural"), ("sodium benzoate", "Preservatives")]
+        assert service.get_metrics()["batch"] == {"batches": 1, "batched_products": 1, "fallbacks": 1, "cache_hits": 0}
+        prompts = [request["prompt"] for request in server.requests if request.get("prompt")]
+        single = [prompt for prompt in prompts if "Product " not in prompt]
+        assert len(single) == 1 and "sodium benzoate" in single[0]
+    finally:
+        service.client.close()
+        server.stop()
+
+def test_repeated_and_similar_products_are_not_batched_again():
+    server = FakeOllama(LatencyModel("fixed", median=0.01))
+    server.start()
+    service = _service(server, max_concurrency=2, max_queue=4)
+    labels = ["water, red 40", "oats, sodium benzoate"]
+    try:
+        first = service.analyze_batch(labels)
+        assert server.stats["generate"] == 1
+
+        # Both products come from the cache, only the new one is analyzed
+        known = "flour, sugar, salt, yeast, water, oats, rice, corn, honey, butter"
+        service.analyze_ingredients(known)
+        assert server.stats["generate"] == 2
+        again = service.analyze_batch(labels + [known + ", red 40"])
+        assert again[:2] == first
+        assert again[2]["ingredients"][-1] == {"name": "red 40", "category": "Artificial Colors"}
+        assert server.stats["generate"] == 3
+        prompts = [request["prompt"] for request in server.requests if request.get("prompt")]
+        assert "Product " not in prompts[-1] and "flour" not in prompts[-1]
+
+        metrics = service.get_metrics()
+        assert metrics["batch"]["cache_hits"] == 2
+        assert metrics["batch"]["batches"] == 1
+        assert metrics["similarity"]["partial_reuse"] == 1
+    finally:
+        service.client.close()
+        server.stop()
@@ -0,0 +1,63 @@
+import os
+import sys
+import threading
+
+# Add parent directory to path to import services
+parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(parent_dir)
+
+import pytest
+from services.circuit_breaker import CircuitBreaker, CLOSED, OPEN
+from services.ollama_client import ModelClientError, ModelOverloadedError
+from services.ingredient_service import IngredientService
+
+def test_opens_on_failure_rate_and_recovers_after_probe():
+    """The circuit should open once enough calls fail and close when the probe succeeds"""
+    recovered = threading.Event()
+    breaker = CircuitBreaker(lambda: None, failure_rate=0.5, min_calls=4, probe_interval=0.05)
+    breaker.on_recover(recovered.set)
+
+    breaker.record_success(1)
+    breaker.record_failure()
+    breaker.record_success(1)
+    assert breaker.allow_request()
+
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert not breaker.allow_request()
+
+    assert recovered.wait(2)
+    assert breaker.state == CLOSED
+    assert breaker.allow_request()
+
+def test_slow_calls_count_as_failures():
+    """Calls slower than the threshold should trip the circuit like errors"""
+    breaker = CircuitBreaker(lambda: None, min_calls=2, slow_call_seconds=5, probe_interval=60)
+    breaker.record_success(10)
+    breaker.record_success(12)
+    assert breaker.state == OPEN
+    assert breaker.stats()["trips"] == 1
+
+class FailingClient:
+    def __init__(self, error):
+        self.error = error
+
+    def generate(self, payload, fail_fast=True):
+        raise self.error
+
+    def warm_up(self, model, keep_alive, options=None):
+        raise self.error
+
+def test_overloaded_queue_does_not_trip_the_circuit():
+    """A full local queue is backpressure, not a model failure"""
+    service = IngredientService()
+    service.client = FailingClient(ModelOverloadedError(2))
+    for _ in range(service.breaker.min_calls * 2):
+        with pytest.raises(ModelOverloadedError):
+            service.analyze_ingredients("water, salt, sugar")
+    assert service.breaker.state == CLOSED
+
+    service.client = FailingClient(ModelClientError("connection refused"))
+    for _ in range(service.breaker.min_calls):
+        service.analyze_ingredients("water, salt, sugar")
+    assert service.breaker.state == OPEN
@@ -0,0 +1,59 @@
+import os
+import sys
+import pytest
+import mongomock
+
+# Add parent directory to path to import services
+parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(parent_dir)
+
+from services.fair_scheduler import (FairScheduler, MongoQuotaStore, QuotaExceededError, PRIORITY_INTERACTIVE,
+                                     PRIORITY_BULK, PRIORITY_BACKGROUND)
+
+def test_users_are_interleaved_within_a_class():
+    """A user with a long backlog should not delay another user's job behind all of it"""
+    scheduler = FairScheduler()
+    for i in range(10):
+        scheduler.push(f"heavy-{i}", "heavy", PRIORITY_BULK)
+    scheduler.push("light-0", "light", PRIORITY_BULK)
+
+    assert "light-0" in scheduler.pop(2)
+
+def test_higher_priority_classes_run_first():
+    scheduler = FairScheduler()
+    scheduler.push("reanalysis", "user1", PRIORITY_BACKGROUND)
+    scheduler.push("bulk", "user1", PRIORITY_BULK)
+    scheduler.push("interactive", "user2", PRIORITY_INTERACTIVE)
+
+    assert scheduler.pop(5) == ["interactive"]
+    assert scheduler.pop(5, min_priority=PRIORITY_INTERACTIVE) == []
+    assert scheduler.pop(5) == ["bulk"]
+    assert scheduler.pop(5) == ["reanalysis"]
+    assert scheduler.stats()["per_user"]["user1"]["dispatched"] == 2
+
+def test_token_bucket_limits_bursts_but_not_background_work():
+    scheduler = FairScheduler(rate_per_minute=1, burst=2)
+    scheduler.admit("user1", PRIORITY_INTERACTIVE)
+    scheduler.admit("user1", PRIORITY_BULK)
+    with pytest.raises(QuotaExceededError) as error:
+        scheduler.admit("user1", PRIORITY_INTERACTIVE)
+    assert error.value.retry_after >= 1
+
+    scheduler.admit("user1", PRIORITY_BACKGROUND)
+    scheduler.admit("user2", PRIORITY_INTERACTIVE)
+
+def test_mongo_quota_is_shared_between_schedulers():
+    """Every process draws from the same bucket, so N workers do not get N times the quota"""
+    collection = mongomock.MongoClient().db.analysis_quotas
+    first = FairScheduler(rate_per_minute=1, burst=2, quota_store=MongoQuotaStore(collection))
+    second = FairScheduler(rate_per_minute=1, burst=2, quota_store=MongoQuotaStore(collection))
+
+    first.admit("user1", PRIORITY_INTERACTIVE)
+    second.admit("user1", PRIORITY_INTERACTIVE)
+    with pytest.raises(QuotaExceededError) as error:
+        first.admit("user1", PRIORITY_INTERACTIVE)
+    assert 1 <= error.value.retry_after <= 60
+    with pytest.raises(QuotaExceededError):
+        second.admit("user1", PRIORITY_BULK)
+    second.admit("user2", PRIORITY_INTERACTIVE)
+    assert first.stats()["per_user"]["user1"]["throttled"] == 1
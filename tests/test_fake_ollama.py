@@ -0,0 +1,35 @@
+import os
+import sys
+import json
+import pytest
+
+# Add parent directory to path to import services
+parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(parent_dir)
+
+from loadtest.fake_ollama import FakeOllama, LatencyModel
+from services.ollama_client import OllamaClient
+from services.prompt_builder import PromptBuilder
+
+def test_fake_server_answers_compact_batch_prompts():
+    """The stand-in should classify every numbered ingredient of every product"""
+    server = FakeOllama(LatencyModel("fixed", median=0.01))
+    client = OllamaClient(server.start())
+    try:
+        built = PromptBuilder().build_batch(["Water, Red 40", "Oats, Sodium Benzoate, Salt"])
+        response = client.generate({"model": "llama3.2:3b", "prompt": built.prompt, "stream": False})
+        products = json.loads(response["response"])["products"]
+        assert [len(product["items"]) for product in products] == [2, 3]
+        assert products[0]["items"][1] == {"i": 2, "c": "C"}
+        assert server.stats["generate"] == 1
+    finally:
+        client.close()
+        server.stop()
+
+def test_malformed_rate_corrupts_answers():
+    server = FakeOllama(LatencyModel("fixed", median=0), malformed_rate=1.0, seed=3)
+    text, items = server._answer(PromptBuilder().build("Water, Salt").prompt)
+    assert items == 2
+    assert server.stats["malformed"] == 1
+    with pytest.raises(ValueError):
+        json.loads(text)
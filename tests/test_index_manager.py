@@ -0,0 +1,150 @@
+import os
+import sys
+import datetime
+import mongomock
+import pytest
+from bson import ObjectId
+from pymongo import MongoClient
+
+# Add parent directory to path to import services
+parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(parent_dir)
+
+from services.index_manager import IndexManager, COVERED_QUERIES
+from models import IngredientAnalysis
+
+class ExplainedCursor:
+    """Stands in for a pymongo cursor with a canned explain() plan."""
+
+    def __init__(self, plan):
+        self.plan = plan
+
+    def sort(self, *args):
+        return self
+
+    def limit(self, *args):
+        return self
+
+    def explain(self):
+        return {"queryPlanner": {"winningPlan": self.plan}}
+
+class ExplainedCollection:
+    def __init__(self, plan):
+        self.plan = plan
+
+    def find(self, *args):
+        return ExplainedCursor(self.plan)
+
+def test_ensure_creates_missing_indexes_once():
+    db = mongomock.MongoClient().db
+    manager = IndexManager(db)
+    assert {entry["status"] for entry in manager.ensure()} == {"created"}
+    assert {entry["status"] for entry in manager.ensure()} == {"present"}
+    assert [("user_id", 1), ("created_at", -1), ("_id", -1)] in [info["key"] for info in db.ingredient_analyses.index_information().values()]
+
+def test_existing_index_with_other_keys_is_reported_not_replaced():
+    db = mongomock.MongoClient().db
+    db.ingredient_analyses.create_index([("user_id", 1)], name="user_keyset")
+    report = IndexManager(db).ensure()
+    assert next(entry for entry in report if entry["name"] == "user_keyset")["status"] == "conflict"
+
+def test_superseded_indexes_are_dropped_once_replaced():
+    db = mongomock.MongoClient().db
+    db.ingredient_analyses.create_index([("user_id", 1), ("created_at", -1)], name="user_recent")
+    # Reuses a superseded name for other keys, so it is not ours to drop
+    db.ingredient_analyses.create_index([("product_name", 1)], name="recent")
+    manager = IndexManager(db)
+
+    before = {entry["name"]: entry["status"] for entry in manager.drop_superseded()}
+    assert before == {"user_recent": "kept", "recent": "conflict"}
+    assert "user_recent" in db.ingredient_analyses.index_information()
+
+    manager.ensure()
+    after = {entry["name"]: entry["status"] for entry in manager.drop_superseded()}
+    assert after == {"user_recent": "dropped", "recent": "conflict"}
+    indexes = db.ingredient_analyses.index_information()
+    assert "user_recent" not in indexes and "recent" in indexes
+    assert manager.drop_superseded()[0]["status"] == "absent"
+
+def test_coverage_flags_collection_scans_and_in_memory_sorts():
+    scan = {"stage": "SORT", "inputStage": {"stage": "COLLSCAN"}}
+    indexed = {"stage": "LIMIT", "inputStage": {"stage": "FETCH", "inputStage": {"stage": "IXSCAN", "indexName": "user_keyset"}}}
+    query = {"name": "history", "collection": "ingredient_analyses", "filter": {}, "sort": [("created_at", -1)], "limit": 10}
+
+    uncovered = IndexManager({"ingredient_analyses": ExplainedCollection(scan)}, queries=[query]).check_coverage()[0]
+    assert uncovered["covered"] is False
+    assert uncovered["problems"] == ["collection scan", "in-memory sort"]
+
+    covered = IndexManager({"ingredient_analyses": ExplainedCollection(indexed)}, queries=[query]).check_coverage()[0]
+    assert covered["covered"] and covered["indexes"] == ["user_keyset"]
+
+class RecordingCursor:
+    def __init__(self, cursor, query):
+        self.cursor = cursor
+        self.query = query
+
+    def sort(self, sort):
+        self.query["sort"] = list(sort)
+        self.cursor = self.cursor.sort(sort)
+        return self
+
+    def limit(self, limit):
+        self.query["limit"] = limit
+        self.cursor = self.cursor.limit(limit)
+        return self
+
+    def __iter__(self):
+        return iter(self.cursor)
+
+class RecordingCollection:
+    """Wrap a collection to record the filter, sort and limit of every find()."""
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.queries = []
+
+    def find(self, filter=None, projection=None):
+        query = {"filter": filter}
+        self.queries.append(query)
+        return RecordingCursor(self.collection.find(filter, projection), query)
+
+    def __getattr__(self, name):
+        return getattr(self.collection, name)
+
+def shape(value):
+    """The operators and value types of a query, without the values."""
+    if isinstance(value, dict):
+        return {key: shape(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [shape(item) for item in value]
+    return type(value).__name__
+
+def admin_page_query(db):
+    analyses = IngredientAnalysis(db)
+    for i in range(30):
+        db.ingredient_analyses.insert_one({"user_id": ObjectId(), "created_at": datetime.datetime(2024, 1, 1, 0, i)})
+    token = analyses.get_admin_overview(limit=20)["next_token"]
+    analyses.collection = RecordingCollection(analyses.collection)
+    analyses.get_admin_overview(limit=20, page_token=token)
+    return analyses.collection.queries[0]
+
+def test_admin_page_is_a_declared_keyset_query():
+    """The admin overview pages with the query check_coverage explains, not an aggregation"""
+    query = admin_page_query(mongomock.MongoClient().db)
+    declared = next(q for q in COVERED_QUERIES if q["name"] == "admin page")
+    assert shape(query["filter"]) == shape(declared["filter"])
+    assert (query["sort"], query["limit"]) == (declared["sort"], declared["limit"])
+
+@pytest.mark.skipif(not os.getenv("MONGODB_TEST_URI"), reason="explain() needs a MongoDB server (MONGODB_TEST_URI)")
+def test_admin_page_query_seeks_the_recent_index():
+    client = MongoClient(os.getenv("MONGODB_TEST_URI"))
+    db = client.get_database(f"index_test_{ObjectId()}")
+    try:
+        manager = IndexManager(db)
+        manager.ensure()
+        query = admin_page_query(db)
+        plan = manager.explain({"name": "admin page", "collection": "ingredient_analyses", **query})
+        assert plan["covered"], plan["problems"]
+        assert plan["indexes"] == ["recent_keyset"]
+    finally:
+        client.drop_database(db.name)
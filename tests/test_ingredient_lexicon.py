@@ -0,0 +1,37 @@
+import os
+import sys
+
+# Add parent directory to path to import services
+parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(parent_dir)
+
+from services.ingredient_lexicon import AhoCorasick, LexiconMatcher, get_default_matcher
+
+def test_automaton_finds_overlapping_patterns():
+    automaton = AhoCorasick()
+    for pattern in ["he", "she", "his", "hers"]:
+        automaton.add(pattern, pattern)
+    automaton.build()
+    assert sorted(automaton.iter("ushers")) == [(1, 4, "she"), (2, 4, "he"), (2, 6, "hers")]
+
+def test_mentions_map_back_to_original_offsets():
+    text = "INGREDIENTS: Wheat  Flour, S0DIUM BENZOATE (E 211), sugarcane"
+    mentions = get_default_matcher().find(text)
+    assert [(m.text, m.canonical) for m in mentions] == [
+        ("Wheat  Flour", "wheat flour"), ("S0DIUM BENZOATE", "sodium benzoate"), ("E 211", "sodium benzoate")
+    ]
+    assert text[mentions[0].start:mentions[0].end] == "Wheat  Flour"
+    assert mentions[1].category == "Preservatives"
+
+def test_extract_splits_lost_boundaries_and_drops_debris():
+    matcher = LexiconMatcher()
+    names = matcher.extract("INGREDIENTS: SUGAR SALT WATER, fractionated palm oil, Vitamin C, x7/ %$, quinoa, E-330")
+    assert names == ["sugar", "salt", "water", "fractionated palm oil", "ascorbic acid", "quinoa", "citric acid"]
+    assert matcher.stats["split_items"] == 1
+    assert matcher.stats["dropped_items"] == 1
+
+def test_related_ingredients_are_not_merged():
+    names = ["glucose", "cocoa", "vanilla", "skimmed milk", "milk protein", "canola oil"]
+    mentions = get_default_matcher().find(", ".join(names))
+    assert [m.canonical for m in mentions] == names
+    assert "soy lecithin" not in [m.canonical for m in get_default_matcher().find("lecithin (soy)")]
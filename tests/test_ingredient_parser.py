@@ -0,0 +1,38 @@
+import os
+import sys
+
+# Add parent directory to path to import services
+parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(parent_dir)
+
+from services.ingredient_parser import parse_ingredients, flatten_ingredients
+
+def test_sub_ingredients_percentages_and_positions():
+    tree = parse_ingredients(
+        "Ingredients: Protein Blend (Whey Protein Isolate, Milk Protein Isolate), Sugar 12%, Cocoa Powder (2.5%)"
+    )
+    assert [(item.name, item.position, item.percent) for item in tree] == [
+        ("protein blend", 1, None), ("sugar", 2, 12.0), ("cocoa powder", 3, 2.5)
+    ]
+    assert [(child.name, child.position) for child in tree[0].children] == [
+        ("whey protein isolate", 1), ("milk protein isolate", 2)
+    ]
+
+def test_periods_only_split_at_sentence_ends():
+    names = flatten_ingredients(parse_ingredients("Vitamin B.12, Niacin. Contains 2% or less of: Salt, Citric Acid"))
+    assert names == ["vitamin b.12", "niacin", "salt", "citric acid"]
+
+def test_qualifiers_become_notes_and_unclosed_brackets_are_closed():
+    tree = parse_ingredients("Salt (for flavour), Oil (Palm, Corn), Red 40 (colour")
+    assert tree[0].note == "for flavour" and not tree[0].children
+    assert [child.name for child in tree[1].children] == ["palm", "corn"]
+    assert tree[2].name == "red 40" and tree[2].note == "colour"
+
+def test_junk_tokens_are_dropped():
+    assert flatten_ingredients(parse_ingredients("Water, 12, -, ; (), Sugar")) == ["water", "sugar"]
+
+def test_processing_remarks_are_notes_and_contains_lists_components():
+    tree = parse_ingredients("Cocoa (Processed with Alkali), Milk (Contains Soy Lecithin, Salt), Cream (contains)")
+    assert tree[0].note == "processed with alkali" and not tree[0].children
+    assert [child.name for child in tree[1].children] == ["soy lecithin", "salt"]
+    assert tree[2].note == "contains" and not tree[2].children
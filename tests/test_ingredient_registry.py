@@ -0,0 +1,55 @@
+import os
+import sys
+import mongomock
+
+# Add parent directory to path to import services
+parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(parent_dir)
+
+from services.ingredient_registry import IngredientRegistry
+from models import IngredientAnalysis
+
+def test_spellings_share_one_id_and_interned_name():
+    registry = IngredientRegistry()
+    assert registry.id_for("Sugar") == registry.id_for("  sugar 12% ") == 1
+    assert registry.key(["water", "SUGAR"]) == (2, 1)
+    assert registry.name(1) is registry.name(registry.id_for("sugar*"))
+    assert registry.id_for("()") is None
+
+def test_bound_registries_agree_across_processes():
+    db = mongomock.MongoClient().db
+    first, second = IngredientRegistry(db), IngredientRegistry(db)
+    water = first.register("water")
+    salt = second.register("salt")
+    assert water != salt
+    assert second.register("water") == water
+    # An id created elsewhere is fetched on first sight
+    assert first.name(salt) == "salt"
+    assert IngredientRegistry(db).bind(db) == 2
+
+def test_lookups_write_nothing_until_a_name_is_registered():
+    db = mongomock.MongoClient().db
+    registry = IngredientRegistry(db)
+    junk = registry.id_for("xq7 l1")
+    assert junk < 0 and registry.name(junk) == "xq7 l1"
+    assert db.ingredients.count_documents({}) == 0 and db.counters.count_documents({}) == 0
+
+    stored = registry.register("XQ7 L1")
+    assert stored > 0 and db.ingredients.find_one({"_id": stored})["name"] == "xq7 l1"
+    # Keys already built in this process stay valid
+    assert registry.id_for("xq7 l1") == junk
+    assert registry.stats == {"lookups": 2, "local": 1, "created": 1, "fetched": 0}
+
+def test_analyses_store_ids_and_codes_and_read_back_names():
+    db = mongomock.MongoClient().db
+    analyses = IngredientAnalysis(db)
+    analysis_id = analyses.save_analysis("0123456789ab0123456789ab", "Water, Red 40", {
+        "ingredients": [{"name": "water", "category": "Natural"}, {"name": "red 40", "category": "Artificial Colors"}]
+    })
+    stored = db.ingredient_analyses.find_one()
+    assert "ingredients" not in stored
+    assert stored["category_codes"] == "NC" and len(stored["ingredient_ids"]) == 2
+    assert all(ingredient_id > 0 for ingredient_id in stored["ingredient_ids"])
+    assert analyses.get_analysis_by_id(analysis_id)["ingredients"] == [
+        {"name": "water", "category": "Natural"}, {"name": "red 40", "category": "Artificial Colors"}
+    ]
@@ -0,0 +1,183 @@
+import os
+import sys
+import time
+import mongomock
+import pytest
+
+# Add parent directory to path to import services
+parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(parent_dir)
+
+from services.job_queue import (JobQueue, InMemoryJobStore, MongoJobStore, QueueFullError, DONE, FAILED, QUEUED,
+                               RUNNING)
+from services.fair_scheduler import FairScheduler, PRIORITY_INTERACTIVE, PRIORITY_BULK, PRIORITY_BACKGROUND
+
+def test_jobs_are_processed_in_batches():
+    batches = []
+
+    def handler(jobs):
+        batches.append(len(jobs))
+        return [{'success': True, 'product_name': job['payload']['product_name']} for job in jobs]
+
+    store = InMemoryJobStore()
+    queue = JobQueue(store, handler, workers=1, batch_size=3, poll_interval=0.05)
+    job_ids = [queue.enqueue('user1', {'type': 'text', 'content': 'sugar', 'product_name': f'P{i}'}) for i in range(5)]
+    assert store.get(job_ids[0])['status'] == QUEUED
+
+    queue.start()
+    jobs = [queue.wait(job_id, timeout=5) for job_id in job_ids]
+    queue.stop(timeout=1)
+
+    assert [job['status'] for job in jobs] == [DONE] * 5
+    assert [job['result']['product_name'] for job in jobs] == ['P0', 'P1', 'P2', 'P3', 'P4']
+    assert sum(batches) == 5
+    assert max(batches) <= 3
+
+def test_handler_errors_mark_jobs_failed():
+    def handler(jobs):
+        raise RuntimeError("Ollama unavailable")
+
+    queue = JobQueue(InMemoryJobStore(), handler, workers=1, poll_interval=0.05)
+    queue.start()
+    job_id = queue.enqueue('user1', {'type': 'text', 'content': 'salt', 'product_name': 'Salt'})
+    job = queue.wait(job_id, timeout=5)
+    queue.stop(timeout=1)
+
+    assert job['status'] == FAILED
+    assert 'Ollama unavailable' in job['error']
+
+def test_unfinished_jobs_are_requeued_on_start():
+    store = InMemoryJobStore()
+    queue = JobQueue(store, lambda jobs: [{'success': True}] * len(jobs), workers=1, poll_interval=0.05)
+    job_id = queue.enqueue('user1', {'type': 'text', 'content': 'oats', 'product_name': 'Oats'})
+    # Simulate a worker that died after claiming the job: its lease has run out
+    store.claim(1, 'dead-worker', lease_seconds=0)
+
+    queue.start()
+    job = queue.wait(job_id, timeout=5)
+    queue.stop(timeout=1)
+
+    assert job['status'] == DONE
+    assert job['attempts'] == 2
+
+def test_jobs_of_live_workers_are_left_running():
+    """Starting another process must not requeue jobs whose worker still holds the lease"""
+    store = InMemoryJobStore()
+    queue = JobQueue(store, lambda jobs: [{'success': True}] * len(jobs), workers=1, poll_interval=0.05)
+    job_id = queue.enqueue('user1', {'type': 'text', 'content': 'oats', 'product_name': 'Oats'})
+    store.claim(1, 'other-process', lease_seconds=60)
+
+    queue.start()
+    job = queue.wait(job_id, timeout=0.3)
+    queue.stop(timeout=1)
+
+    assert job['status'] == RUNNING
+    assert job['worker'] == 'other-process'
+
+def test_expired_leases_are_requeued_while_running():
+    store = InMemoryJobStore()
+    queue = JobQueue(store, lambda jobs: [{'success': True}] * len(jobs), workers=1, poll_interval=0.05,
+                     lease_seconds=0.3)
+    queue.start()
+    job_id = queue.enqueue('user1', {'type': 'text', 'content': 'oats', 'product_name': 'Oats'})
+    # Claimed by a process that dies before finishing or renewing
+    store.claim_ids([job_id], 'other-process', lease_seconds=0.2)
+
+    job = queue.wait(job_id, timeout=5)
+    queue.stop(timeout=1)
+    assert job['status'] == DONE
+    assert job['attempts'] == 2
+
+def test_long_jobs_keep_their_lease():
+    def handler(jobs):
+        time.sleep(0.5)
+        return [{'success': True}] * len(jobs)
+
+    queue = JobQueue(InMemoryJobStore(), handler, workers=2, poll_interval=0.05, lease_seconds=0.15)
+    queue.start()
+    job_id = queue.enqueue('user1', {'type': 'text', 'content': 'oats', 'product_name': 'Oats'})
+    job = queue.wait(job_id, timeout=5)
+    queue.stop(timeout=1)
+    assert job['status'] == DONE
+    assert job['attempts'] == 1
+
+def test_mongo_store_requeues_only_expired_leases():
+    store = MongoJobStore(mongomock.MongoClient().db.analysis_jobs)
+    for job_id in ('live', 'dead', 'legacy'):
+        store.insert({'_id': job_id, 'user_id': 'user1', 'payload': {}, 'priority': 1, 'status': QUEUED,
+                      'attempts': 0, 'created_at': time.time()})
+    store.claim_ids(['live'], 'worker-a', lease_seconds=60)
+    store.claim_ids(['dead'], 'worker-b', lease_seconds=-1)
+    # Claimed before jobs had leases
+    store.collection.update_one({'_id': 'legacy'}, {'$set': {'status': RUNNING}})
+
+    assert store.renew('worker-a', 60) == 1
+    assert store.requeue_stale() == 2
+    assert [store.get(job_id)['status'] for job_id in ('live', 'dead', 'legacy')] == [RUNNING, QUEUED, QUEUED]
+    assert 'worker' not in store.get('dead')
+
+def test_keyed_jobs_are_queued_once_until_finished():
+    collection = mongomock.MongoClient().db.analysis_jobs
+    # Two processes sharing one job collection
+    first = JobQueue(MongoJobStore(collection), lambda jobs: [{'success': True}] * len(jobs), workers=1, poll_interval=0.05)
+    second = JobQueue(MongoJobStore(collection), lambda jobs: [{'success': True}] * len(jobs), workers=1, poll_interval=0.05)
+    payload = {'type': 'reanalyze', 'analysis_id': 'a1'}
+
+    job_id = first.enqueue('user1', payload, key='reanalyze:a1')
+    assert first.enqueue('user1', payload, key='reanalyze:a1') == job_id
+    assert second.enqueue('user1', payload, key='reanalyze:a1') == job_id
+    assert collection.count_documents({}) == 1
+
+    first.start()
+    assert first.wait(job_id, timeout=5)['status'] == DONE
+    first.stop(timeout=1)
+    assert second.enqueue('user1', payload, key='reanalyze:a1') != job_id
+
+def test_full_priority_class_sheds_new_jobs():
+    # One analysis per user, so a shed request that took a token would fail the bulk one below
+    scheduler = FairScheduler(burst=1)
+    queue = JobQueue(MongoJobStore(mongomock.MongoClient().db.jobs), lambda jobs: [], workers=2,
+                     scheduler=scheduler, max_queued=2)
+    payload = {'type': 'text', 'content': 'salt', 'product_name': 'Salt'}
+    queue.enqueue('user1', payload)
+    queue.enqueue('user2', payload)
+
+    with pytest.raises(QueueFullError) as error:
+        queue.enqueue('user3', payload, priority=PRIORITY_INTERACTIVE)
+    assert error.value.retry_after >= 1
+    # Other classes have their own depth and background work is never shed
+    queue.enqueue('user3', payload, priority=PRIORITY_BULK)
+    for i in range(3):
+        queue.enqueue('user3', payload, priority=PRIORITY_BACKGROUND)
+    assert queue.store.count_queued(PRIORITY_INTERACTIVE) == 2
+
+def test_finished_jobs_drop_their_payload():
+    store = MongoJobStore(mongomock.MongoClient().db.jobs)
+    queue = JobQueue(store, lambda jobs: [{'success': True}] * len(jobs), workers=1, poll_interval=0.05)
+    queue.start()
+    job_id = queue.enqueue('user1', {'type': 'image', 'content': 'aGVsbG8=', 'product_name': 'Photo'})
+    job = queue.wait(job_id, timeout=5)
+    queue.stop(timeout=1)
+
+    assert job['status'] == DONE and job['result'] == {'success': True}
+    assert 'payload' not in job
+    assert job['finished_at'] is not None
+
+def test_jobs_that_keep_crashing_their_worker_fail():
+    store = InMemoryJobStore()
+    handled = []
+    queue = JobQueue(store, lambda jobs: handled.extend(jobs) or [{'success': True}] * len(jobs),
+                     workers=1, poll_interval=0.05, max_attempts=2)
+    job_id = queue.enqueue('user1', {'type': 'text', 'content': 'oats', 'product_name': 'Oats'})
+    # Two workers died while running it
+    for _ in range(2):
+        store.claim(1, 'dead-worker', lease_seconds=0)
+        store.requeue_stale()
+
+    queue.start()
+    job = queue.wait(job_id, timeout=5)
+    queue.stop(timeout=1)
+
+    assert job['status'] == FAILED
+    assert 'Gave up after 2 attempts' in job['error']
+    assert handled == []
@@ -0,0 +1,77 @@
+import os
+import sys
+import datetime
+import mongomock
+import pytest
+from bson import ObjectId
+
+# Add parent directory to path to import services
+parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(parent_dir)
+
+from models import IngredientAnalysis, encode_page_token, decode_page_token
+
+USER_ID = ObjectId("0123456789ab0123456789ab")
+
+def make_analyses(count):
+    db = mongomock.MongoClient().db
+    analyses = IngredientAnalysis(db)
+    start = datetime.datetime(2024, 1, 1)
+    for i in range(count):
+        # Pairs share a timestamp, so _id has to break the tie
+        db.ingredient_analyses.insert_one({"user_id": USER_ID, "product_name": f"P{i}",
+                                           "created_at": start + datetime.timedelta(minutes=i // 2)})
+    db.ingredient_analyses.insert_one({"user_id": ObjectId(), "product_name": "other",
+                                       "created_at": start})
+    return analyses
+
+def names(page):
+    return [analysis["product_name"] for analysis in page["analyses"]]
+
+def test_pages_walk_forward_and_back_without_gaps_or_repeats():
+    analyses = make_analyses(7)
+    first = analyses.get_user_analyses(USER_ID, limit=3)
+    assert names(first) == ["P6", "P5", "P4"]
+    assert first["has_next"] and not first["has_prev"]
+
+    second = analyses.get_user_analyses(USER_ID, limit=3, page_token=first["next_token"])
+    third = analyses.get_user_analyses(USER_ID, limit=3, page_token=second["next_token"])
+    assert names(second) == ["P3", "P2", "P1"]
+    assert names(third) == ["P0"]
+    assert not third["has_next"] and third["has_prev"]
+
+    back = analyses.get_user_analyses(USER_ID, limit=3, page_token=third["prev_token"])
+    assert names(back) == ["P3", "P2", "P1"] and back["has_prev"]
+    assert names(analyses.get_user_analyses(USER_ID, limit=3, page_token=back["prev_token"])) == ["P6", "P5", "P4"]
+
+def test_exact_fit_has_no_next_page():
+    page = make_analyses(3).get_user_analyses(USER_ID, limit=3)
+    assert names(page) == ["P2", "P1", "P0"]
+    assert not page["has_next"] and page["next_token"] is None
+
+def test_new_analyses_do_not_shift_later_pages():
+    analyses = make_analyses(6)
+    first = analyses.get_user_analyses(USER_ID, limit=2)
+    analyses.collection.insert_one({"user_id": USER_ID, "product_name": "new",
+                                    "created_at": datetime.datetime(2025, 1, 1)})
+    assert names(analyses.get_user_analyses(USER_ID, limit=2, page_token=first["next_token"])) == ["P3", "P2"]
+
+def test_tokens_are_opaque_and_validated():
+    analysis = {"_id": USER_ID, "created_at": datetime.datetime(2024, 5, 6, 7, 8, 9, 123000)}
+    token = encode_page_token(">", analysis)
+    assert str(USER_ID) not in token
+    assert decode_page_token(token) == (">", analysis["created_at"], USER_ID)
+    for bad in ["", "garbage", token[:-3], encode_page_token(">", analysis).swapcase()]:
+        with pytest.raises(ValueError):
+            decode_page_token(bad)
+
+def test_admin_overview_pages_by_keyset():
+    analyses = make_analyses(5)
+    # Inserted around the model, so the totals are counted once
+    analyses.admin_stats.recount()
+    first = analyses.get_admin_overview(limit=4)
+    second = analyses.get_admin_overview(limit=4, page_token=first["next_token"])
+    assert len(first["analyses"]) == 4 and len(second["analyses"]) == 2
+    assert first["total"] == second["total"] == 6
+    back = analyses.get_admin_overview(limit=4, page_token=second["prev_token"])
+    assert [a["_id"] for a in back["analyses"]] == [a["_id"] for a in first["analyses"]]
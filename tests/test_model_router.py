@@ -0,0 +1,106 @@
+import os
+import sys
+import pytest
+
+# Add parent directory to path to import services
+parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(parent_dir)
+
+from loadtest.fake_ollama import FakeOllama, LatencyModel
+from services.model_router import ModelRouter
+from services.ollama_client import OllamaClient, ModelOverloadedError
+from services.ingredient_service import IngredientService
+
+def test_failed_check_escalates_to_next_tier():
+    router = ModelRouter(["small", "large"])
+    calls = []
+
+    def generate(model):
+        calls.append(model)
+        return model
+
+    result = router.route(generate, lambda model: ["coverage"] if model == "small" else [])
+
+    assert result == "large"
+    assert calls == ["small", "large"]
+    stats = router.stats()
+    assert stats["requests"] == 1
+    assert stats["escalations"] == 1
+    assert stats["escalation_rate"] == 1.0
+    assert stats["escalation_reasons"] == {"coverage": 1}
+    assert stats["per_model"]["small"]["calls"] == 1
+    assert stats["per_model"]["small"]["accepted"] == 0
+    assert stats["per_model"]["large"]["accepted"] == 1
+
+def test_passing_check_stays_on_first_tier():
+    router = ModelRouter(["small", "large"])
+    router.route(lambda model: model, lambda model: [])
+    router.route(lambda model: model, lambda model: ["rules"] if model == "small" else [])
+
+    stats = router.stats()
+    assert stats["escalation_rate"] == 0.5
+    assert stats["per_model"]["small"]["calls"] == 2
+    assert stats["per_model"]["small"]["accepted"] == 1
+    assert stats["per_model"]["small"]["avg_latency"] is not None
+    assert stats["per_model"]["large"]["calls"] == 1
+
+def test_error_escalates_and_last_tier_is_always_accepted():
+    router = ModelRouter(["small", "large"])
+
+    def generate(model):
+        if model == "small":
+            raise ValueError("invalid JSON")
+        return model
+
+    assert router.route(generate, lambda model: ["rules"]) == "large"
+    stats = router.stats()
+    assert stats["escalation_reasons"] == {"error": 1}
+    assert stats["per_model"]["small"]["errors"] == 1
+    assert stats["per_model"]["large"]["accepted"] == 1
+
+def test_error_on_last_tier_is_raised():
+    router = ModelRouter(["small", "large"])
+
+    def generate(model):
+        raise ValueError(f"{model} failed")
+
+    with pytest.raises(ValueError, match="large failed"):
+        router.route(generate, lambda model: [])
+    assert router.stats()["per_model"]["large"]["errors"] == 1
+
+def test_overloaded_model_is_not_escalated():
+    router = ModelRouter(["small", "large"])
+    calls = []
+
+    def generate(model):
+        calls.append(model)
+        raise ModelOverloadedError(retry_after=1)
+
+    with pytest.raises(ModelOverloadedError):
+        router.route(generate, lambda model: [])
+    assert calls == ["small"]
+    assert router.stats()["escalations"] == 0
+
+def test_service_escalates_when_small_model_fails():
+    failing = FakeOllama(LatencyModel("fixed", median=0.01), error_rate=1.0)
+    healthy = FakeOllama(LatencyModel("fixed", median=0.01))
+    failing.start()
+    healthy.start()
+    service = IngredientService()
+    small, large = service.router.models
+    service.client = OllamaClient([failing.url, healthy.url], max_concurrency=2, max_queue=4,
+                                  endpoint_models={failing.url: [small], healthy.url: [large]})
+    try:
+        analysis = service.analyze_ingredients("water, red 40, salt")
+
+        assert [item["category"] for item in analysis["ingredients"]] == ["Natural", "Artificial Colors", "Natural"]
+        assert failing.stats["generate"] == 1
+        assert [request["model"] for request in healthy.requests if request.get("prompt")] == [large]
+        stats = service.get_metrics()["router"]
+        assert stats["escalation_reasons"] == {"error": 1}
+        assert stats["per_model"][small]["errors"] == 1
+        assert stats["per_model"][large]["accepted"] == 1
+    finally:
+        service.client.close()
+        failing.stop()
+        healthy.stop()
@@ -0,0 +1,56 @@
+import os
+import sys
+
+# Add parent directory to path to import services
+parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(parent_dir)
+
+from loadtest.fake_ollama import FakeOllama, LatencyModel
+from services.config import Config
+from services.ollama_client import OllamaClient
+from services.ingredient_service import IngredientService
+
+def _service(server, **client_options):
+    service = IngredientService()
+    service.client = OllamaClient([server.start()], **client_options)
+    return service
+
+def test_warm_up_loads_every_model_with_the_request_options():
+    server = FakeOllama(LatencyModel("fixed", median=0.01))
+    service = _service(server)
+    try:
+        service.warm_up()
+        assert server.stats["warm_up"] == len(service.router.models)
+        warm_ups = list(server.requests)
+        assert [payload["model"] for payload in warm_ups] == service.router.models
+        for payload in warm_ups:
+            assert "prompt" not in payload
+            assert payload["keep_alive"] == Config.OLLAMA_KEEP_ALIVE
+            assert payload["options"] == Config.model_options(payload["model"])
+            assert "num_thread" not in payload["options"]
+
+        service.analyze_ingredients("water, salt, sugar")
+        generate = server.requests[-1]
+        assert generate["keep_alive"] == Config.OLLAMA_KEEP_ALIVE
+        # Same context size as the warm-up, or Ollama would load the model again
+        assert generate["options"]["num_ctx"] == warm_ups[0]["options"]["num_ctx"]
+        assert "num_thread" not in generate["options"]
+    finally:
+        service.client.close()
+        server.stop()
+
+def test_endpoint_options_fill_in_what_the_request_leaves_out():
+    server = FakeOllama(LatencyModel("fixed", median=0.01))
+    url = server.start()
+    client = OllamaClient([url], endpoint_options={url: {"num_thread": 6}})
+    try:
+        client.warm_up("llama3.2:3b", "10m", {"num_ctx": 4096})
+        client.generate({"model": "llama3.2:3b", "prompt": "1 water", "stream": False, "options": {"num_ctx": 4096}})
+        client.generate({"model": "llama3.2:3b", "prompt": "1 water", "stream": False, "options": {"num_thread": 8}})
+        assert [payload["options"] for payload in server.requests] == [
+            {"num_thread": 6, "num_ctx": 4096}, {"num_thread": 6, "num_ctx": 4096}, {"num_thread": 8}
+        ]
+        assert server.requests[0]["keep_alive"] == "10m"
+    finally:
+        client.close()
+        server.stop()
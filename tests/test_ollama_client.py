@@ -0,0 +1,86 @@
+import os
+import sys
+import json
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Add parent directory to path to import services
+parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(parent_dir)
+
+from services.ollama_client import OllamaClient, ModelOverloadedError
+
+class SlowGenerateHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        self.rfile.read(int(self.headers['Content-Length']))
+        time.sleep(0.3)
+        body = json.dumps({"response": "{}"}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+def test_full_queue_fails_fast_with_retry_hint():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), SlowGenerateHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    client = OllamaClient(f"http://127.0.0.1:{server.server_port}", max_concurrency=1, max_queue=1)
+
+    outcomes = []
+
+    def call():
+        try:
+            client.generate({"model": "test", "prompt": "x"})
+            outcomes.append("ok")
+        except ModelOverloadedError as e:
+            outcomes.append(e.retry_after)
+
+    threads = [threading.Thread(target=call) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+        time.sleep(0.02)
+    for thread in threads:
+        thread.join()
+
+    client.close()
+    server.shutdown()
+
+    # One running, one waiting, the rest rejected with a retry hint
+    assert outcomes.count("ok") == 2
+    assert all(isinstance(outcome, int) and outcome >= 1 for outcome in outcomes if outcome != "ok")
+    stats = client.stats()
+    assert stats["rejected"] == 2
+    assert stats["completed"] == 2
+    assert stats["queue_depth"] == 0
+    assert stats["in_flight"] == 0
+
+def test_background_waiters_do_not_fill_the_interactive_queue():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), SlowGenerateHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    client = OllamaClient(f"http://127.0.0.1:{server.server_port}", max_concurrency=1, max_queue=1)
+
+    background = [threading.Thread(target=client.generate, args=({"model": "test", "prompt": "x"}, False))
+                  for _ in range(3)]
+    for thread in background:
+        thread.start()
+    deadline = time.monotonic() + 5
+    while client.stats()["background_waiting"] < 2:
+        assert time.monotonic() < deadline, "background calls never queued"
+        time.sleep(0.01)
+
+    # The queue is full of background work, yet an interactive call still gets a place in it
+    client.generate({"model": "test", "prompt": "x"})
+    for thread in background:
+        thread.join()
+
+    client.close()
+    server.shutdown()
+
+    stats = client.stats()
+    assert stats["rejected"] == 0
+    assert stats["completed"] == 4
+    assert stats["queue_depth"] == 0 and stats["background_waiting"] == 0
@@ -0,0 +1,92 @@
+import os
+import sys
+import time
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+
+# Add parent directory to path to import services
+parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(parent_dir)
+
+from loadtest.fake_ollama import FakeOllama, LatencyModel
+from services.ollama_client import OllamaClient, ModelClientError, parse_duration
+
+PROMPT = "1 Water\n2 Salt"
+
+def _start(count, **kwargs):
+    servers = [FakeOllama(LatencyModel("fixed", median=kwargs.pop("latency", 0.2)), max_concurrency=4, **kwargs)
+               for _ in range(count)]
+    return servers, [server.start() for server in servers]
+
+def _generate_many(client, n, model="llama3.2:3b"):
+    payload = {"model": model, "prompt": PROMPT, "stream": False}
+    with ThreadPoolExecutor(n) as pool:
+        return list(pool.map(lambda _: client.generate(payload, fail_fast=False), range(n)))
+
+def test_parse_duration():
+    assert parse_duration("30m") == 1800
+    assert parse_duration("90s") == 90
+    assert parse_duration(300) == 300
+    assert parse_duration("-1") == float("inf")
+
+def test_throughput_grows_with_endpoints():
+    """Twice the endpoints should finish the same burst in about half the time"""
+    timings = []
+    for count in (1, 2):
+        servers, urls = _start(count)
+        client = OllamaClient(urls, max_concurrency=2, max_queue=16)
+        try:
+            started = time.monotonic()
+            _generate_many(client, 8)
+            timings.append(time.monotonic() - started)
+            assert sum(server.stats["generate"] for server in servers) == 8
+            if count == 2:
+                assert [server.stats["generate"] for server in servers] == [4, 4]
+        finally:
+            client.close()
+            for server in servers:
+                server.stop()
+    assert timings[1] < timings[0] * 0.75
+
+def test_requests_stick_to_the_warm_endpoint():
+    servers, urls = _start(2, latency=0.01)
+    client = OllamaClient(urls, max_concurrency=2)
+    try:
+        for _ in range(5):
+            client.generate({"model": "deepseek-llm", "prompt": PROMPT, "stream": False})
+        # Sequential calls always find a free slot where the model is loaded
+        assert sorted(server.stats["generate"] for server in servers) == [0, 5]
+    finally:
+        client.close()
+        for server in servers:
+            server.stop()
+
+def test_per_endpoint_model_availability():
+    servers, urls = _start(2, latency=0.01)
+    servers[1].models = ["deepseek-llm:latest"]
+    client = OllamaClient(urls, max_concurrency=2, endpoint_models={urls[0]: ["llama3.2:3b"]}, health_interval=0.05)
+    try:
+        time.sleep(0.2)
+        _generate_many(client, 4, model="deepseek-llm")
+        _generate_many(client, 4, model="llama3.2:3b")
+        assert servers[0].stats["generate"] == 4
+        assert servers[1].stats["generate"] == 4
+        with pytest.raises(ModelClientError):
+            client.generate({"model": "mistral", "prompt": PROMPT, "stream": False})
+    finally:
+        client.close()
+        for server in servers:
+            server.stop()
+
+def test_unreachable_endpoint_is_skipped_until_healthy():
+    servers, urls = _start(2, latency=0.01)
+    servers[0].stop()
+    client = OllamaClient(urls, max_concurrency=2, health_interval=0.05)
+    try:
+        _generate_many(client, 4)
+        assert servers[1].stats["generate"] == 4
+        endpoints = client.stats()["endpoints"]
+        assert [endpoint["healthy"] for endpoint in endpoints] == [False, True]
+    finally:
+        client.close()
+        servers[1].stop()
@@ -0,0 +1,45 @@
+import os
+import sys
+
+# Add parent directory to path to import services
+parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(parent_dir)
+
+from services.prompt_builder import PromptBuilder, canonical_ingredients, count_tokens
+
+def test_canonical_ingredients_dedupes_and_expands_sub_lists():
+    text = "Ingredients: Sugar, Vegetable Oil (Palm, Sunflower), Cocoa Powder (2%), SUGAR, Canola Oil and/or Safflower Oil."
+    assert canonical_ingredients(text) == [
+        "sugar", "vegetable oil", "palm", "sunflower", "cocoa powder", "canola oil", "safflower oil"
+    ]
+
+def test_alternatives_are_split_only_into_complete_ingredients():
+    assert canonical_ingredients("Natural or Artificial Flavor, Sunflower and/or Canola Oil") == [
+        "natural or artificial flavor", "sunflower and/or canola oil"
+    ]
+    assert canonical_ingredients("Sugar or Honey, Palm or Sunflower Oil") == ["sugar", "honey", "palm or sunflower oil"]
+
+def test_prompt_numbers_ingredients_and_expand_maps_indices_back():
+    builder = PromptBuilder()
+    built = builder.build("Water, Salt, Red 40")
+    assert "1 water\n2 salt\n3 red 40" in built.prompt
+    assert built.tokens == count_tokens(built.prompt)
+
+    categories = builder.expand({
+        "items": [{"i": 3, "c": "C"}, {"i": 1, "c": "N"}, {"i": 9, "c": "N"}, {"i": 2, "c": "N"}]
+    }, built.names)
+    assert categories == {"water": "Natural", "salt": "Natural", "red 40": "Artificial Colors"}
+    assert list(categories) == ["water", "salt", "red 40"]
+
+def test_ingredients_answered_twice_are_left_unclassified():
+    categories = PromptBuilder.expand({
+        "items": [{"i": 1, "c": "C"}, {"i": 2, "c": "N"}, {"i": 1, "c": "N"}]
+    }, ["water", "salt"])
+    assert categories == {"salt": "Natural"}
+
+def test_token_budget_drops_trailing_ingredients():
+    text = ", ".join(f"ingredient number {i}" for i in range(200))
+    built = PromptBuilder(token_budget=300).build(text)
+    assert built.dropped > 0
+    assert built.names[0] == "ingredient number 0"
+    assert built.tokens <= 300 + 5
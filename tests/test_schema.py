@@ -0,0 +1,61 @@
+import os
+import sys
+
+# Add parent directory to path to import services
+parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(parent_dir)
+
+from services.schema import (BATCH_ANALYSIS_SCHEMA, COMPACT_ANALYSIS_SCHEMA, SchemaError, compile_schema,
+                             parse_model_json)
+from services.prompt_builder import PromptBuilder
+
+validate = compile_schema(COMPACT_ANALYSIS_SCHEMA)
+validate_batch = compile_schema(BATCH_ANALYSIS_SCHEMA)
+
+def test_valid_response_needs_no_repairs():
+    response = {"items": [{"i": 1, "c": "N"}, {"i": 2, "c": "P"}]}
+    compact, repairs = validate(response)
+    assert repairs == []
+    assert compact == response
+
+def test_partial_response_is_repaired_field_by_field():
+    compact, repairs = validate({"items": [{"i": 1, "c": "n"}, {"i": 2, "c": "dye"}, "salt", {"i": "3", "c": "C"}]})
+    assert compact == {"items": [{"i": 1, "c": "N"}, {"i": 2, "c": "A"}, {"i": 3, "c": "C"}]}
+    assert set(repairs) == {"$.items[].c", "$.items[]", "$.items[].i"}
+
+def test_missing_fields_get_defaults():
+    compact, repairs = validate({})
+    assert compact == {"items": []}
+    assert repairs == ["$.items"]
+
+def test_batch_products_are_repaired_independently():
+    response, repairs = validate_batch({"products": [
+        {"id": 1, "items": [{"i": 1, "c": "N"}, {"i": 2}]},
+        {"id": 0, "items": [{"i": 1, "c": "P"}]},
+        {"id": 2}
+    ]})
+    # A product with an impossible id cannot be matched to its label and is dropped
+    assert response == {"products": [
+        {"id": 1, "items": [{"i": 1, "c": "N"}, {"i": 2, "c": "A"}]},
+        {"id": 2, "items": []}
+    ]}
+    assert set(repairs) == {"$.products[].items[].c", "$.products[]", "$.products[].items"}
+
+def test_items_without_a_valid_index_are_dropped_not_defaulted():
+    compact, repairs = validate({"items": [{"c": "C"}, {"i": 0, "c": "P"}, {"i": "first", "c": "H"}, {"i": 1, "c": "N"}]})
+    assert compact == {"items": [{"i": 1, "c": "N"}]}
+    assert repairs == ["$.items[]"] * 3
+    # The orphaned color must not land on ingredient 1
+    assert PromptBuilder.expand(compact, ["water", "red 40"]) == {"water": "Natural"}
+
+def test_parse_model_json_handles_prose_and_truncation():
+    assert parse_model_json('Sure! ```json\n{"health_score": 40,}\n```') == {"health_score": 40}
+    truncated = '{"health_score": 40, "ingredients": [{"name": "Sal'
+    assert parse_model_json(truncated) == {"health_score": 40, "ingredients": [{"name": "Sal"}]}
+
+def test_parse_model_json_rejects_non_json():
+    try:
+        parse_model_json("I cannot analyze this.")
+        assert False, "expected SchemaError"
+    except SchemaError:
+        pass
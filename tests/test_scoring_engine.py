@@ -0,0 +1,26 @@
+import os
+import sys
+
+# Add parent directory to path to import services
+parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(parent_dir)
+
+from services.scoring_engine import ScoringEngine
+
+def test_earlier_ingredients_weigh_more():
+    """The first ingredient on the label should dominate the percentages"""
+    engine = ScoringEngine(position_decay=0.5)
+    result = engine.score(["Natural", "Artificial Colors"])
+    assert result["ingredient_percentages"]["Natural"] == 66.7
+    assert result["ingredient_percentages"]["Artificial Colors"] == 33.3
+
+    reversed_result = engine.score(["Artificial Colors", "Natural"])
+    assert reversed_result["health_score"] < result["health_score"]
+
+def test_batch_scoring_matches_single_and_skips_unclassified():
+    engine = ScoringEngine()
+    products = [["Natural", None, "Preservatives"], ["Highly Processed"], []]
+    results = engine.score_many(products)
+    assert results == [engine.score(categories) for categories in products]
+    assert results[1]["health_score"] == 15.0
+    assert sum(results[2]["ingredient_percentages"].values()) == 100.0
@@ -0,0 +1,101 @@
+import os
+import sys
+
+# Add parent directory to path to import services
+parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(parent_dir)
+
+from loadtest.fake_ollama import FakeOllama, LatencyModel
+from services.similarity_index import MinHashLSHIndex
+from services.ollama_client import OllamaClient
+from services.ingredient_service import IngredientService
+from services.config import Config
+
+ITEMS = [f"ingredient {i}" for i in range(20)]
+NAMES = ["flour", "sugar", "salt", "yeast", "water", "oats", "rice", "corn", "honey", "butter"]
+
+def test_near_duplicate_is_found_with_exact_similarity():
+    index = MinHashLSHIndex(threshold=0.9)
+    index.add("a", ITEMS, {"label": "a"})
+
+    match = index.query(ITEMS + ["ingredient 20"])
+    assert match.key == "a"
+    assert match.similarity == 20 / 21
+    assert match.data == {"label": "a"}
+
+def test_sets_below_threshold_are_not_returned():
+    index = MinHashLSHIndex(threshold=0.9)
+    index.add("a", ITEMS)
+
+    # 17 shared of 23 is about 0.74
+    assert index.query(ITEMS[:17] + ["other 1", "other 2", "other 3"]) is None
+    assert index.query([f"other {i}" for i in range(20)]) is None
+    assert index.query([]) is None
+
+def test_readding_a_key_replaces_its_entry():
+    index = MinHashLSHIndex(threshold=0.9)
+    index.add("a", ITEMS, {"version": 1})
+    index.add("a", ITEMS, {"version": 2})
+    assert index.query(ITEMS).data == {"version": 2}
+
+    other = [f"other {i}" for i in range(20)]
+    index.add("a", other)
+    assert len(index) == 1
+    assert index.query(ITEMS) is None
+    assert index.query(other).key == "a"
+
+def test_least_recently_used_sets_are_evicted():
+    index = MinHashLSHIndex(threshold=0.9, max_entries=2)
+    sets = {key: [f"{key} {i}" for i in range(20)] for key in ("a", "b", "c")}
+    index.add("a", sets["a"])
+    index.add("b", sets["b"])
+    # A match counts as a use, so "b" is now the least recently used
+    assert index.query(sets["a"]).key == "a"
+    index.add("c", sets["c"])
+
+    assert len(index) == 2 and index.evictions == 1
+    assert index.query(sets["b"]) is None
+    assert index.query(sets["a"]).key == "a"
+    assert index.query(sets["c"]).key == "c"
+    # Evicted keys leave no band entries behind
+    assert sum(len(keys) for bucket in index._buckets for keys in bucket.values()) == 2 * index.bands
+
+def test_lookups_are_not_counted_when_similarity_is_disabled(monkeypatch):
+    service = IngredientService()
+    monkeypatch.setattr(Config, "SIMILARITY_ENABLED", False)
+    assert service._find_similar(NAMES) is None
+    assert service.get_metrics()["similarity"]["lookups"] == 0
+
+def _categories(analysis):
+    return {item["name"]: item["category"] for item in analysis["ingredients"]}
+
+def test_similar_product_only_sends_new_ingredients():
+    server = FakeOllama(LatencyModel("fixed", median=0.01))
+    server.start()
+    service = IngredientService()
+    service.client = OllamaClient([server.url], max_concurrency=2, max_queue=4)
+    # "sugar" is stored as an additive so a reused category can be told apart from a fresh one
+    stored = {name: "Natural" for name in NAMES}
+    stored["sugar"] = "Additives"
+    service.index_analysis(service.build_analysis(NAMES, stored))
+    try:
+        analysis = service.analyze_ingredients(", ".join(NAMES + ["red 40"]))
+
+        assert [item["name"] for item in analysis["ingredients"]] == NAMES + ["red 40"]
+        assert _categories(analysis) == {**stored, "red 40": "Artificial Colors"}
+        prompts = [request["prompt"] for request in server.requests if request.get("prompt")]
+        assert len(prompts) == 1
+        assert "red 40" in prompts[0] and "sugar" not in prompts[0]
+        stats = service.get_metrics()["similarity"]
+        assert stats["partial_reuse"] == 1
+        assert stats["ingredients_reused"] == len(NAMES)
+        assert stats["ingredients_sent"] == 1
+
+        # The same set in another order needs no model call at all
+        reordered = service.analyze_ingredients(", ".join(reversed(NAMES)))
+        assert _categories(reordered) == stored
+        assert server.stats["generate"] == 1
+        assert service.get_metrics()["similarity"]["full_reuse"] == 1
+    finally:
+        service.client.close()
+        server.stop()
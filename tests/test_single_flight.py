@@ -0,0 +1,96 @@
+import os
+import sys
+import threading
+import time
+
+# Add parent directory to path to import services
+parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(parent_dir)
+
+from services.single_flight import SingleFlight
+
+def test_concurrent_calls_share_one_execution():
+    """Identical calls made while one is running should wait for it"""
+    flight = SingleFlight()
+    calls = []
+    started = threading.Event()
+
+    def slow_analysis():
+        calls.append(1)
+        started.set()
+        time.sleep(0.2)
+        return {"health_score": 80, "ingredients": []}
+
+    results = []
+
+    def worker():
+        results.append(flight.do("sugar, salt", slow_analysis))
+
+    leader = threading.Thread(target=worker)
+    leader.start()
+    started.wait()
+    followers = [threading.Thread(target=worker) for _ in range(4)]
+    for thread in followers:
+        thread.start()
+    for thread in [leader] + followers:
+        thread.join()
+
+    assert len(calls) == 1
+    assert len(results) == 5
+    assert all(result["health_score"] == 80 for result in results)
+
+    stats = flight.stats()
+    assert stats["executions"] == 1
+    assert stats["coalesced"] == 4
+    assert stats["in_flight"] == 0
+
+def test_waiters_receive_independent_copies():
+    flight = SingleFlight()
+    first = flight.do("water", lambda: {"ingredients": ["water"]})
+    first["ingredients"].append("mutated")
+    # Completed calls are not cached, so the next call runs again
+    second = flight.do("water", lambda: {"ingredients": ["water"]})
+    assert second == {"ingredients": ["water"]}
+    assert flight.stats()["executions"] == 2
+
+def test_errors_propagate_and_clear_key():
+    flight = SingleFlight()
+
+    def failing():
+        raise ValueError("Ollama down")
+
+    try:
+        flight.do("salt", failing)
+        assert False, "expected ValueError"
+    except ValueError as e:
+        assert "Ollama down" in str(e)
+
+    assert flight.do("salt", lambda: "ok") == "ok"
+
+def test_batch_runs_only_keys_not_already_in_flight():
+    flight = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+
+    def slow_single():
+        started.set()
+        release.wait()
+        return "single"
+
+    single = threading.Thread(target=flight.do, args=("water", slow_single))
+    single.start()
+    started.wait()
+    batched = []
+
+    def batch(keys):
+        batched.append(keys)
+        release.set()
+        return {"salt": "batch", "sugar": ValueError("left out")}
+
+    results = flight.do_many(["water", "salt", "sugar"], batch)
+    single.join()
+
+    assert batched == [["salt", "sugar"]]
+    assert results["water"] == "single" and results["salt"] == "batch"
+    assert isinstance(results["sugar"], ValueError)
+    assert flight.stats()["in_flight"] == 0
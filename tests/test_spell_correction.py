@@ -0,0 +1,76 @@
+import os
+import sys
+
+# Add parent directory to path to import services
+parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(parent_dir)
+
+from services.spell_correction import OCRCorrector, SymSpellIndex, edit_distance
+from services.prompt_builder import canonical_ingredients
+
+def test_edit_distance_counts_transpositions_and_stops_at_limit():
+    assert edit_distance("sodlum", "sodium", 2) == 1
+    assert edit_distance("suagr", "sugar", 2) == 1
+    assert edit_distance("rnaltodextrin", "maltodextrin", 2) == 2
+    assert edit_distance("water", "maltodextrin", 2) == 3
+
+def test_index_prefers_closest_then_most_frequent_word():
+    index = SymSpellIndex({"sodium": 5, "podium": 1, "benzoate": 1})
+    assert index.lookup("sodlum", 2) == ("sodium", 1)
+    assert index.lookup("xodium", 1) == ("sodium", 1)
+    assert index.lookup("quinoa", 2) is None
+
+def _low(text, confidence=30):
+    """Tesseract-style confidences giving every token of ``text`` the same value."""
+    return {token: confidence for token in text.split()}
+
+def test_corrections_fix_misreads_and_cache_keys():
+    corrector = OCRCorrector()
+    text = "INGREDIENTS: SODLUM BENZOATE, Modifled Starch, Salt, quinoa, E211"
+    corrected = corrector.correct(text, _low(text))
+    assert corrected == "INGREDIENTS: SODIUM BENZOATE, Modified Starch, Salt, quinoa, E211"
+    assert canonical_ingredients(corrected) == canonical_ingredients("Sodium Benzoate, Modified Starch, Salt, Quinoa, E211")
+
+def test_only_low_confidence_words_are_corrected():
+    corrector = OCRCorrector()
+    assert corrector.correct("sodlum") == "sodlum"
+    assert corrector.correct("sodlum", {"sodlum": 95}) == "sodlum"
+    assert corrector.correct("sodlum", {"sodlum": 75}) == "sodlum"
+    assert corrector.correct("sodlum", {"sodlum": 40}) == "sodium"
+
+def test_confidences_are_matched_to_words_without_punctuation():
+    corrector = OCRCorrector()
+    # Tesseract tokens keep the punctuation next to them
+    assert corrector.correct("SODLUM, (vegetabie)", {"SODLUM,": 95, "(vegetabie)": 75}) == "SODLUM, (vegetabie)"
+    assert corrector.correct("SODLUM, (vegetabie)", {"SODLUM,": 40, "(vegetabie)": 40}) == "SODIUM, (vegetable)"
+
+def test_valid_words_are_not_rewritten():
+    corrector = OCRCorrector()
+    text = "raisins, cultured milk, almond, peanut, walnut, apple, onions, olives, banana, spiced"
+    assert corrector.correct(text, _low(text)) == text
+
+def test_additive_names_are_not_rewritten_into_other_additives():
+    corrector = OCRCorrector()
+    text = "Sodium Citrate, Magnesium Sulfate, Mannitol"
+    assert corrector.correct(text, {"Sodium": 75, "Citrate,": 80, "Magnesium": 50, "Sulfate,": 50, "Mannitol": 50}) == text
+    text = "carbonate, sorbitan, diphosphate, lactitol"
+    assert corrector.correct(text) == text
+    assert corrector.correct(text, _low(text)) == text
+
+def test_words_in_the_dictionary_are_not_rewritten():
+    index = SymSpellIndex({"glaze": 2})
+    assert OCRCorrector(index=index).correct("glace", {"glace": 30}) == "glaze"
+    assert OCRCorrector(index=index, dictionary={"glace"}).correct("glace", {"glace": 30}) == "glace"
+
+def test_corrections_need_a_single_candidate_in_the_same_category():
+    corrector = OCRCorrector(index=SymSpellIndex({"sodium": 2, "podium": 2}))
+    assert corrector.correct("xodium", {"xodium": 30}) == "xodium"
+    # maltodextrin is highly processed, the misread has no category
+    assert OCRCorrector().correct("rnaltodextrin", {"rnaltodextrin": 30}) == "rnaltodextrin"
+    assert OCRCorrector().correct("suagr", {"suagr": 30}) == "suagr"
+
+def test_distant_corrections_need_a_frequent_word():
+    assert OCRCorrector(index=SymSpellIndex({"ingredients": 2})).correct("lngredlents", {"lngredlents": 30}) == "ingredients"
+    assert OCRCorrector(index=SymSpellIndex({"ingredients": 1})).correct("lngredlents", {"lngredlents": 30}) == "lngredlents"
+    # One edit away is still corrected towards a rare word
+    assert OCRCorrector(index=SymSpellIndex({"ingredients": 1})).correct("ingredlents", {"ingredlents": 30}) == "ingredients"
@@ -0,0 +1,88 @@
+import os
+import sys
+import datetime
+import mongomock
+from bson import ObjectId
+
+# Add parent directory to path to import services
+parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(parent_dir)
+
+from models import IngredientAnalysis
+
+USER_ID = "0123456789ab0123456789ab"
+
+class NoAggregateCollection:
+    """Wrap a collection to fail the test if a stats read aggregates it."""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    def aggregate(self, *args, **kwargs):
+        raise AssertionError("stats reads must not aggregate analyses")
+
+    def __getattr__(self, name):
+        return getattr(self.collection, name)
+
+def save(analyses, score, natural, user_id=USER_ID):
+    return analyses.save_analysis(user_id, "Water", {
+        "health_score": score,
+        "ingredient_percentages": {"Natural": natural, "Additives": 100 - natural}
+    })
+
+def test_stats_are_kept_as_analyses_are_saved():
+    analyses = IngredientAnalysis(mongomock.MongoClient().db)
+    save(analyses, 4.0, 80)
+    save(analyses, 2.0, 40)
+    save(analyses, 3.5, 50, user_id="ffffffffffffffffffffffff")
+
+    analyses.collection = NoAggregateCollection(analyses.collection)
+    stats = analyses.get_user_analysis_stats(USER_ID)
+    assert stats["total_analyses"] == 2
+    assert stats["avg_health_score"] == 3.0
+    assert stats["category_averages"] == {"Natural": 60.0, "Additives": 40.0, "Preservatives": 0,
+                                          "Artificial Colors": 0, "Highly Processed": 0}
+    assert (stats["min_health_score"], stats["max_health_score"]) == (2.0, 4.0)
+    assert analyses.get_user_daily_stats(USER_ID) == [
+        {"day": datetime.datetime.utcnow().strftime("%Y-%m-%d"), "count": 2, "avg_health_score": 3.0}
+    ]
+    assert analyses.get_user_analysis_stats("eeeeeeeeeeeeeeeeeeeeeeee")["total_analyses"] == 0
+
+def test_updated_and_deleted_results_leave_the_stats():
+    analyses = IngredientAnalysis(mongomock.MongoClient().db)
+    provisional = save(analyses, 1.0, 20)
+    kept = save(analyses, 3.0, 60)
+    assert analyses.update_analysis_result(provisional, {
+        "health_score": 5.0, "ingredient_percentages": {"Natural": 100, "Additives": 0}
+    })
+    stats = analyses.get_user_analysis_stats(USER_ID)
+    assert stats["avg_health_score"] == 4.0
+    assert (stats["category_averages"]["Natural"], stats["category_averages"]["Additives"]) == (80.0, 20.0)
+    # The old minimum is gone with the provisional result
+    assert (stats["min_health_score"], stats["max_health_score"]) == (3.0, 5.0)
+
+    assert analyses.delete_analysis(kept)
+    stats = analyses.get_user_analysis_stats(USER_ID)
+    assert stats["total_analyses"] == 1
+    assert (stats["min_health_score"], stats["max_health_score"]) == (5.0, 5.0)
+    assert not analyses.update_analysis_result(str(ObjectId()), {"health_score": 1})
+
+def test_rebuild_matches_incremental_stats():
+    db = mongomock.MongoClient().db
+    analyses = IngredientAnalysis(db)
+    save(analyses, 4.0, 80)
+    second = save(analyses, 2.0, 40)
+    analyses.update_analysis_result(second, {"health_score": 2.5, "ingredient_percentages": {"Natural": 50, "Additives": 50}})
+    db.ingredient_analyses.update_one({"_id": ObjectId(second)},
+                                      {"$set": {"created_at": datetime.datetime.utcnow() - datetime.timedelta(days=1)}})
+    save(analyses, 3.0, 30, user_id="ffffffffffffffffffffffff")
+    incremental = analyses.get_user_analysis_stats(USER_ID)
+
+    db.user_stats.insert_one({"_id": ObjectId(), "count": 7})
+    db.user_stats.update_one({"_id": ObjectId(USER_ID)}, {"$inc": {"count": 3}})
+    assert analyses.rebuild_user_stats() == 2
+    rebuilt = analyses.get_user_analysis_stats(USER_ID)
+    for field in ["total_analyses", "avg_health_score", "category_averages", "min_health_score", "max_health_score"]:
+        assert rebuilt[field] == incremental[field]
+    assert db.user_stats.count_documents({}) == 2
+    assert [bucket["count"] for bucket in analyses.get_user_daily_stats(USER_ID)] == [1, 1]
@@ -0,0 +1,59 @@
+import os
+import sys
+import mongomock
+from bson import ObjectId
+
+# Add parent directory to path to import services
+parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(parent_dir)
+
+from services.ingredient_service import IngredientService
+from models import IngredientAnalysis
+
+def test_scorer_change_rescores_in_place_and_model_change_marks_stale():
+    service = IngredientService()
+    analysis = service.build_analysis(["water", "red 40"], {"water": "Natural", "red 40": "Artificial Colors"})
+    assert service.refresh_analysis(dict(analysis)) == (False, False)
+
+    old_scorer = dict(analysis, health_score=0, fingerprint={**analysis["fingerprint"], "scorer": "old"})
+    assert service.refresh_analysis(old_scorer) == (True, False)
+    assert old_scorer["health_score"] == analysis["health_score"]
+    assert old_scorer["fingerprint"] == analysis["fingerprint"]
+
+    old_model = dict(analysis, fingerprint={**analysis["fingerprint"], "model": "old"})
+    assert service.refresh_analysis(old_model) == (False, True)
+    # Results stored before versioning count as stale
+    assert service.is_stale({"ingredients": analysis["ingredients"]})
+
+def test_stale_similar_analyses_are_not_reused():
+    service = IngredientService()
+    names = ["water", "salt", "sugar", "flour", "yeast"]
+    stale = service.build_analysis(names, {name: "Natural" for name in names})
+    stale["fingerprint"]["prompt"] = "old"
+    service.index_analysis(stale)
+
+    calls = []
+
+    def generate(payload, fail_fast=True):
+        calls.append(payload)
+        return {"response": '{"items": [{"i": 1, "c": "N"}, {"i": 2, "c": "N"}, {"i": 3, "c": "N"}, {"i": 4, "c": "N"}, {"i": 5, "c": "N"}]}'}
+
+    service.client.generate = generate
+    result = service.analyze_ingredients(", ".join(names))
+    assert len(calls) == 1
+    assert result["fingerprint"] == service.fingerprints
+    assert service.get_metrics()["similarity"]["stale_matches"] == 1
+
+def test_rescoring_a_stored_analysis_keeps_unclassified_positions():
+    service = IngredientService()
+    names = ["sugar", "mystery blend", "water", "red 40"]
+    analysis = service.build_analysis(names, {"sugar": "Natural", "water": "Natural", "red 40": "Artificial Colors"})
+    assert [item["category"] for item in analysis["ingredients"]] == ["Natural", None, "Natural", "Artificial Colors"]
+
+    analyses = IngredientAnalysis(mongomock.MongoClient().db)
+    stored = analyses.get_analysis_by_id(analyses.save_analysis(str(ObjectId()), ", ".join(names), analysis))
+    assert [item["name"] for item in stored["ingredients"]] == names
+    stored["fingerprint"]["scorer"] = "old"
+    assert service.refresh_analysis(stored) == (True, False)
+    assert stored["health_score"] == analysis["health_score"]
+    assert stored["ingredient_percentages"] == analysis["ingredient_percentages"]